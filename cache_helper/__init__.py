@@ -1 +1,5 @@
+from cache_helper.context import bypass, prefetch
+
 VERSION = (1, 0, 8)
+
+__all__ = ["bypass", "prefetch"]
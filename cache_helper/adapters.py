@@ -0,0 +1,125 @@
+from django.apps import apps
+from django.db.models import Model, QuerySet
+from django.db.models.query import ModelIterable
+
+
+class CompactModelResult:
+    """
+    The compact representation of model instances that is saved in the cache in place of the instances themselves.
+
+    :param model_label: The "app_label.ModelName" of the instances.
+    :param db: The alias of the database the instances were loaded from.
+    :param attnames: The names of the stored fields, in the order of the model's concrete fields.
+    :param rows: One tuple of field values per instance.
+    :param is_single: Whether the result was a single instance rather than a collection of them.
+    """
+
+    def __init__(self, model_label, db, attnames, rows, is_single=False):
+        self.model_label = model_label
+        self.db = db
+        self.attnames = attnames
+        self.rows = rows
+        self.is_single = is_single
+
+
+class ModelResultAdapter:
+    """
+    Saves QuerySets, lists of model instances and single model instances in the cache as rows of field values,
+    which are far smaller and faster to unpickle than the instances. QuerySets are returned as lists on hits.
+
+    :param fields: The names of the fields to store. The primary key is always stored. Defaults to every concrete
+        field of the model. On a hit, instances are rebuilt with only these fields loaded, and the others are deferred.
+        Fields deferred on the result, e.g. with `only()`, are never stored.
+    :param refetch: When True, only primary keys are stored, and the instances are fetched from the database with
+        `in_bulk` on a hit.
+    """
+
+    def __init__(self, fields=None, refetch=False):
+        self.fields = fields
+        self.refetch = refetch
+
+    def adapt(self, value):
+        """
+        :param value: The result of the function. Unevaluated QuerySets are evaluated.
+        :return: A CompactModelResult, or the value itself if it is not made of model instances.
+        """
+        is_single = False
+        if isinstance(value, QuerySet):
+            if value._iterable_class is not ModelIterable:
+                # values() / values_list() QuerySets are already compact
+                return list(value)
+            instances = list(value)
+            model = value.model
+            db = value.db
+        elif isinstance(value, Model):
+            instances = [value]
+            model = type(value)
+            db = value._state.db
+            is_single = True
+        elif isinstance(value, (list, tuple)) and value and isinstance(value[0], Model):
+            model = type(value[0])
+            if any(type(instance) is not model for instance in value):
+                return value
+            instances = value
+            db = value[0]._state.db
+        else:
+            return value
+
+        attnames = self._get_attnames(model)
+        deferred_attnames = set().union(
+            *(instance.get_deferred_fields() for instance in instances)
+        )
+        if deferred_attnames:
+            # Reading a deferred field would run one query per instance, so those fields are left deferred on hits too
+            attnames = [
+                attname
+                for attname in attnames
+                if attname not in deferred_attnames or attname == model._meta.pk.attname
+            ]
+        rows = [
+            tuple(getattr(instance, attname) for attname in attnames)
+            for instance in instances
+        ]
+        return CompactModelResult(model._meta.label, db, attnames, rows, is_single)
+
+    def restore(self, compact_result):
+        """
+        :param compact_result: A CompactModelResult produced by `adapt`.
+        :return: The model instance, or a list of them.
+        """
+        model = apps.get_model(compact_result.model_label)
+
+        if self.refetch:
+            pk_index = compact_result.attnames.index(model._meta.pk.attname)
+            pks = [row[pk_index] for row in compact_result.rows]
+            instances_by_pk = model._default_manager.db_manager(
+                compact_result.db
+            ).in_bulk(pks)
+            # Instances deleted since the result was cached are left out
+            instances = [instances_by_pk[pk] for pk in pks if pk in instances_by_pk]
+        else:
+            instances = [
+                model.from_db(compact_result.db, compact_result.attnames, row)
+                for row in compact_result.rows
+            ]
+
+        if compact_result.is_single:
+            return instances[0] if instances else None
+        return instances
+
+    def _get_attnames(self, model):
+        if self.refetch:
+            return [model._meta.pk.attname]
+
+        concrete_fields = model._meta.concrete_fields
+        if self.fields is None:
+            return [field.attname for field in concrete_fields]
+
+        selected_names = set(self.fields)
+        return [
+            field.attname
+            for field in concrete_fields
+            if field.primary_key
+            or field.name in selected_names
+            or field.attname in selected_names
+        ]
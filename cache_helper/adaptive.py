@@ -0,0 +1,22 @@
+"""
+Adaptive timeouts, for entries whose timeout depends on how expensive they are to compute and how often they change.
+
+Each entry of a function with `adaptive_timeout` is saved with its real timeout, and the digest of its value along with
+the timeout it was given are saved under a small key of their own, its adaptive state. The state is kept for up to the
+maximum timeout past the entry's expiry, and is read with the same `get_many` as the entry, so that the miss recomputing
+the value can tell whether it changed without any extra round trip. Invalidating the entry keeps its state.
+"""
+ADAPTIVE_SUFFIX = ":adaptive"
+
+
+def get_adaptive_key(cache_key_hashed):
+    return f"{cache_key_hashed}{ADAPTIVE_SUFFIX}"
+
+
+def get_adapted_key(cache_key):
+    """
+    :return: The key of the entry if the key is its adaptive state, or else the key itself.
+    """
+    if cache_key.endswith(ADAPTIVE_SUFFIX):
+        return cache_key[: -len(ADAPTIVE_SUFFIX)]
+    return cache_key
@@ -0,0 +1,317 @@
+"""
+An in-process cache backend for threaded servers, as a drop-in replacement for Django's LocMemCache:
+
+    CACHES = {
+        "default": {
+            "BACKEND": "cache_helper.backends.ShardedLocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000, "SHARDS": 16, "STORE_IMMUTABLE_VALUES": True},
+        }
+    }
+
+LocMemCache guards all of its entries with a single lock, so threads reading different keys still wait on each other.
+Here entries are spread across shards by key, each with a lock of its own. When a shard is full, it evicts the least
+recently used of a few randomly sampled entries, which approximates LRU without maintaining a global order on reads.
+
+Like LocMemCache, values are pickled so that callers can't mutate cached values. With STORE_IMMUTABLE_VALUES, values
+of immutable builtin types (numbers, strings, bytes, None, and tuples / frozensets of those) are stored as they are,
+which skips pickling entirely, as are results serialized by `cache_helper.serializers`.
+"""
+import pickle
+import random
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from cache_helper.serializers import SerializedValue
+
+# Serialized values are never mutated once created
+_IMMUTABLE_SCALAR_TYPES = frozenset(
+    (type(None), bool, int, float, complex, str, bytes, SerializedValue)
+)
+_IMMUTABLE_CONTAINER_TYPES = frozenset((tuple, frozenset))
+
+# Shards of every cache, by name and layout. Django creates a backend instance per thread, which must all share the
+# same entries, while a cache configured again with other options, e.g. with `override_settings`, gets shards of its own
+_shards = {}
+_shards_lock = threading.Lock()
+
+
+def is_immutable(value):
+    """
+    :return: Whether the value is made of immutable builtin types only.
+    """
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type in _IMMUTABLE_CONTAINER_TYPES:
+            stack.extend(item)
+        elif item_type not in _IMMUTABLE_SCALAR_TYPES:
+            return False
+    return True
+
+
+class _Entry:
+    __slots__ = ("value", "pickled", "expires_at", "accessed_at", "index")
+
+    def __init__(self, value, pickled, expires_at, accessed_at, index):
+        self.value = value
+        self.pickled = pickled
+        self.expires_at = expires_at
+        self.accessed_at = accessed_at
+        self.index = index
+
+
+class _Shard:
+    """
+    The entries of a shard are kept in a dict, with their keys also in a list so that they can be sampled in constant
+    time. Access times come from a counter rather than the clock.
+    """
+
+    def __init__(self, max_entries, eviction_samples):
+        self.max_entries = max_entries
+        self.eviction_samples = eviction_samples
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.keys = []
+        self.clock = 0
+
+    def get_live(self, key, now):
+        entry = self.entries.get(key)
+        if (
+            entry is not None
+            and entry.expires_at is not None
+            and entry.expires_at <= now
+        ):
+            self.delete(key)
+            return None
+        return entry
+
+    def access(self, entry):
+        self.clock += 1
+        entry.accessed_at = self.clock
+
+    def set(self, key, value, pickled, expires_at, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) >= self.max_entries:
+                self.evict(now)
+            entry = _Entry(value, pickled, expires_at, 0, len(self.keys))
+            self.entries[key] = entry
+            self.keys.append(key)
+        else:
+            entry.value = value
+            entry.pickled = pickled
+            entry.expires_at = expires_at
+        self.access(entry)
+
+    def delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        # Move the last key into the freed slot of the list
+        last_key = self.keys.pop()
+        if last_key != key:
+            self.keys[entry.index] = last_key
+            self.entries[last_key].index = entry.index
+        return True
+
+    def evict(self, now):
+        """
+        Evicts an expired entry if one is sampled, or else the least recently used of the sampled entries.
+        """
+        evicted_key = None
+        evicted_accessed_at = None
+        for index in random.sample(
+            range(len(self.keys)), min(self.eviction_samples, len(self.keys))
+        ):
+            key = self.keys[index]
+            entry = self.entries[key]
+            if entry.expires_at is not None and entry.expires_at <= now:
+                evicted_key = key
+                break
+            if evicted_accessed_at is None or entry.accessed_at < evicted_accessed_at:
+                evicted_key, evicted_accessed_at = key, entry.accessed_at
+        if evicted_key is not None:
+            self.delete(evicted_key)
+
+    def clear(self):
+        self.entries.clear()
+        self.keys.clear()
+
+
+class ShardedLocMemCache(BaseCache):
+    """
+    Besides the options of every backend, OPTIONS can contain:
+
+    SHARDS: The number of shards, 16 by default. MAX_ENTRIES is split evenly between them.
+    EVICTION_SAMPLES: The number of entries sampled to pick the one to evict from a full shard, 5 by default.
+    STORE_IMMUTABLE_VALUES: Whether values of immutable builtin types are stored without being pickled, False by
+        default.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        shard_count = int(options.get("SHARDS", 16))
+        eviction_samples = int(options.get("EVICTION_SAMPLES", 5))
+        self._store_immutable_values = bool(
+            options.get("STORE_IMMUTABLE_VALUES", False)
+        )
+
+        shards_key = (name, shard_count, self._max_entries, eviction_samples)
+        with _shards_lock:
+            if shards_key not in _shards:
+                max_entries_per_shard = max(1, self._max_entries // shard_count)
+                _shards[shards_key] = [
+                    _Shard(max_entries_per_shard, eviction_samples)
+                    for _ in range(shard_count)
+                ]
+            self._shards = _shards[shards_key]
+
+    def _get_shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _group_by_shard(self, keys):
+        """
+        :return: A dict mapping shards to the keys that belong to them.
+        """
+        keys_by_shard = {}
+        for key in keys:
+            keys_by_shard.setdefault(self._get_shard(key), []).append(key)
+        return keys_by_shard
+
+    def _dump(self, value):
+        """
+        :return: A tuple of the value to store, and whether it is pickled.
+        """
+        if self._store_immutable_values and is_immutable(value):
+            return value, False
+        return pickle.dumps(value, self.pickle_protocol), True
+
+    @staticmethod
+    def _load(stored_value, pickled):
+        return pickle.loads(stored_value) if pickled else stored_value
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        stored_value, pickled = self._dump(value)
+        shard = self._get_shard(key)
+        now = time.time()
+        with shard.lock:
+            if shard.get_live(key, now) is not None:
+                return False
+            shard.set(
+                key, stored_value, pickled, self.get_backend_timeout(timeout), now
+            )
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._get_shard(key)
+        with shard.lock:
+            entry = shard.get_live(key, time.time())
+            if entry is None:
+                return default
+            shard.access(entry)
+            stored_value, pickled = entry.value, entry.pickled
+        # Unpickled outside of the lock, so that other threads aren't kept waiting for it
+        return self._load(stored_value, pickled)
+
+    def get_many(self, keys, version=None):
+        keys_by_original_key = {
+            self.make_and_validate_key(key, version=version): key for key in keys
+        }
+        now = time.time()
+        stored_values = {}
+        for shard, shard_keys in self._group_by_shard(keys_by_original_key).items():
+            with shard.lock:
+                for key in shard_keys:
+                    entry = shard.get_live(key, now)
+                    if entry is not None:
+                        shard.access(entry)
+                        stored_values[key] = entry.value, entry.pickled
+        # In the order of the keys, like other backends
+        return {
+            original_key: self._load(*stored_values[key])
+            for key, original_key in keys_by_original_key.items()
+            if key in stored_values
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        stored_value, pickled = self._dump(value)
+        shard = self._get_shard(key)
+        with shard.lock:
+            shard.set(
+                key,
+                stored_value,
+                pickled,
+                self.get_backend_timeout(timeout),
+                time.time(),
+            )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        stored_values = {}
+        for key, value in data.items():
+            stored_values[
+                self.make_and_validate_key(key, version=version)
+            ] = self._dump(value)
+        expires_at = self.get_backend_timeout(timeout)
+        now = time.time()
+        for shard, shard_keys in self._group_by_shard(stored_values).items():
+            with shard.lock:
+                for key in shard_keys:
+                    stored_value, pickled = stored_values[key]
+                    shard.set(key, stored_value, pickled, expires_at, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._get_shard(key)
+        with shard.lock:
+            entry = shard.get_live(key, time.time())
+            if entry is None:
+                return False
+            entry.expires_at = self.get_backend_timeout(timeout)
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._get_shard(key)
+        with shard.lock:
+            entry = shard.get_live(key, time.time())
+            if entry is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = self._load(entry.value, entry.pickled) + delta
+            entry.value, entry.pickled = self._dump(new_value)
+            shard.access(entry)
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._get_shard(key)
+        with shard.lock:
+            return shard.get_live(key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shard = self._get_shard(key)
+        with shard.lock:
+            return shard.delete(key)
+
+    def delete_many(self, keys, version=None):
+        for shard, shard_keys in self._group_by_shard(
+            [self.make_and_validate_key(key, version=version) for key in keys]
+        ).items():
+            with shard.lock:
+                for key in shard_keys:
+                    shard.delete(key)
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.clear()
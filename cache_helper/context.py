@@ -0,0 +1,158 @@
+import contextlib
+import logging
+from contextvars import ContextVar
+
+from django.core.cache import caches
+
+from cache_helper.exceptions import GenerationUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# A tuple of (bypass_reads, bypass_writes) for the current thread / task
+_bypass_state = ContextVar("cache_helper_bypass", default=(False, False))
+
+# The Prefetch of the innermost `prefetch` block for the current thread / task
+_active_prefetch = ContextVar("cache_helper_prefetch", default=None)
+
+
+@contextlib.contextmanager
+def bypass(reads=True, writes=True):
+    """
+    Context manager that makes every cached function called within it skip the cache.
+
+    By default both reads and writes are skipped, so the decorated function is called directly without even building
+    a cache key. The variants skip only one side:
+
+        bypass(reads=False)   # read-only: serve cached values, but never write computed values to the cache
+        bypass(writes=False)  # write-only: always compute, and overwrite whatever is in the cache with the result
+
+    Nested blocks can only add to the bypass already in effect, never remove it.
+
+    :param reads: Whether to skip retrieving values from the cache.
+    :param writes: Whether to skip saving computed values to the cache.
+    """
+    outer_reads, outer_writes = _bypass_state.get()
+    token = _bypass_state.set((outer_reads or reads, outer_writes or writes))
+    try:
+        yield
+    finally:
+        _bypass_state.reset(token)
+
+
+def get_bypass_state():
+    """
+    :return: A tuple of (bypass_reads, bypass_writes) for the current context.
+    """
+    return _bypass_state.get()
+
+
+class Prefetch:
+    """
+    Collects the calls registered with `add` and retrieves all of their cached values with a single `get_many` per
+    Django cache they belong to.
+    """
+
+    def __init__(self):
+        self._pending_keys = []
+        # Maps each fetched key to its cached value, or to MISSING if there was none
+        self._fetched = {}
+
+    def add(self, func, *args, **kwargs):
+        """
+        Registers a call of a cached function that will be made within the `prefetch` block.
+
+        :param func: The cached function, method or class method, e.g. `foo`, `obj.method` or `Class.class_method`.
+        :param args: The args the function will be called with, excluding `self` and `cls`.
+        :param kwargs: The kwargs the function will be called with.
+        """
+        try:
+            cache_key_hashed, _ = func.get_cache_keys(*args, **kwargs)
+        except GenerationUnavailableError:
+            # The call will compute its result without the cache
+            return
+        # Functions with replicas are prefetched from a random one
+        fetched_key = func.cached_function.get_replica_key(cache_key_hashed)
+        self._pending_keys.append(
+            (
+                func.cached_function.get_cache_alias(fetched_key),
+                fetched_key,
+                cache_key_hashed,
+            )
+        )
+
+    def fetch(self):
+        """
+        Retrieves the cached values of every call registered so far. This happens automatically on the first call of
+        a cached function within the `prefetch` block, but calls registered after that need another `fetch`.
+        """
+        pending_keys, self._pending_keys = self._pending_keys, []
+        keys_by_alias = {}
+        for alias, fetched_key, cache_key_hashed in pending_keys:
+            keys_by_alias.setdefault(alias, {})[fetched_key] = cache_key_hashed
+
+        for alias, cache_keys in keys_by_alias.items():
+            try:
+                values = caches[alias].get_many(list(cache_keys))
+            except Exception:
+                # The calls will retrieve their values themselves
+                logger.warning(
+                    f"Error retrieving values from Cache for Keys: {list(cache_keys)}",
+                    exc_info=True,
+                )
+                continue
+
+            for fetched_key, cache_key_hashed in cache_keys.items():
+                if fetched_key in values:
+                    self._fetched[cache_key_hashed] = values[fetched_key]
+                elif fetched_key == cache_key_hashed:
+                    self._fetched[cache_key_hashed] = MISSING
+                # Or else the call falls back to the other replicas itself
+
+    def pop(self, cache_key_hashed):
+        """
+        :return: The prefetched value for the key, MISSING if it was prefetched but there was no value, or None if it
+        wasn't prefetched. Each prefetched value is only used once, so later calls see any change made since.
+        """
+        if self._pending_keys:
+            self.fetch()
+
+        return self._fetched.pop(cache_key_hashed, None)
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+@contextlib.contextmanager
+def prefetch():
+    """
+    Context manager to batch the cache lookups of many cached functions into a single `get_many`, e.g.
+
+        with cache_helper.prefetch() as batch:
+            batch.add(get_company_name, company_id)
+            batch.add(company.get_peers)
+            batch.add(Company.get_sector_average, sector)
+
+            name = get_company_name(company_id)  # The first call retrieves all three values, and uses its own
+            peers = company.get_peers()  # Served from the prefetched values
+            average = Company.get_sector_average(sector)
+
+    Calls whose values were not in the cache are computed and saved as usual.
+    """
+    batch = Prefetch()
+    token = _active_prefetch.set(batch)
+    try:
+        yield batch
+    finally:
+        _active_prefetch.reset(token)
+
+
+def get_active_prefetch():
+    """
+    :return: The Prefetch of the innermost `prefetch` block, or None outside of one.
+    """
+    return _active_prefetch.get()
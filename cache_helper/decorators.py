@@ -1,4 +1,11 @@
+import contextlib
 import logging
+import math
+import pickle
+import random
+import sqlite3
+import time
+import uuid
 from inspect import Signature, signature
 from typing import Tuple  # deprecated, but required for Python 3.8 and below
 
@@ -9,15 +16,45 @@ except ImportError:
 
 import functools
 
-from django.core.cache import cache
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
 from django.utils.functional import wraps
 
-from cache_helper import utils
+from cache_helper import dependencies, serializers, settings, streaming, tracing, utils
+from cache_helper.adaptive import get_adapted_key, get_adaptive_key
+from cache_helper.adapters import CompactModelResult
+from cache_helper.context import MISSING, get_active_prefetch, get_bypass_state
+from cache_helper.disk import (
+    get_disk_cache,
+    get_disk_timeout,
+    get_marked_key,
+    get_marker_key,
+)
+from cache_helper.exceptions import GenerationUnavailableError
+from cache_helper.hot_keys import get_hot_key_cache
+from cache_helper.key_memo import KeyMemo, get_memo_key
+from cache_helper.refresh import submit_refresh
+from cache_helper.sharding import get_hash_ring
+from cache_helper.shared_memory import (
+    get_shared_memory_cache,
+    get_shared_memory_timeout,
+)
+from cache_helper.sliding import (
+    TOUCH_INTERVAL_FRACTION,
+    SlidingEntry,
+    get_touch_limiter,
+)
+from cache_helper.stats import get_function_stats
 
 logger = logging.getLogger(__name__)
 
 
-def _get_function_cache_keys(func_name: str, func_signature: Signature, args: tuple, kwargs: dict) -> Tuple[str, str]:
+def _get_function_cache_keys(
+    func_name: str,
+    func_signature: Signature,
+    args: tuple,
+    kwargs: dict,
+    key_format_version: int = 1,
+) -> Tuple[str, str]:
     """
     Generate hashed and non-hashed function cache keys, ensuring that args and kwargs are correctly bound to function.
 
@@ -25,60 +62,1274 @@ def _get_function_cache_keys(func_name: str, func_signature: Signature, args: tu
     :param func_signature: The signature of the function to be cached.
     :param args: The positional arguments passed to the function.
     :param kwargs: The keyword arguments passed to the function.
+    :param key_format_version: One of `utils.KEY_FORMAT_VERSIONS`.
 
     :return: A tuple containing the hashed cache key and the non-hashed cache key.
     """
     bound_arguments = func_signature.bind(*args, **kwargs)
     bound_arguments.apply_defaults()
-    cache_key_string = utils.get_function_cache_key(func_name, bound_arguments.args, bound_arguments.kwargs)
+    cache_key_string = utils.get_function_cache_key(
+        func_name, bound_arguments.args, bound_arguments.kwargs, key_format_version
+    )
     cache_key_hashed = utils.get_hashed_cache_key(cache_key_string)
     return cache_key_hashed, cache_key_string
 
 
-def cached(timeout):
-    def _cached(func):
-        func_name = utils.get_function_name(func)
-        func_signature = signature(func)
+def _check_streaming_options(**options):
+    """
+    :raises ValueError: If any of the options, which the cached streams of generator functions don't support, is set.
+    """
+    names = [name for name, value in options.items() if value]
+    if names:
+        raise ValueError(f"{', '.join(names)} can't be combined with streaming")
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            cache_key_hashed, cache_key_string = _get_function_cache_keys(func_name, func_signature, args, kwargs)
 
-            # We need to determine whether the object exists in the cache, and since we may have stored a literal value
-            # None, use a sentinel object as the default
-            sentinel = object()
+def _get_routing_key(cache_key):
+    """
+    :return: The key the key is routed by across cache aliases, i.e. the key of its entry for disk markers and adaptive
+        states.
+    """
+    return get_adapted_key(get_marked_key(cache_key))
+
+
+def _get_bypass_state() -> Tuple[bool, bool]:
+    """
+    :return: A tuple of (bypass_reads, bypass_writes), taking both the global setting and `cache_helper.bypass` into
+    account.
+    """
+    if settings.BYPASS:
+        return True, True
+    return get_bypass_state()
+
+
+class _CachedFunction:
+    """
+    The caching logic shared by `cached`, `cached_class_method` and `cached_instance_method`.
+
+    :param func: The function to be cached.
+    :param timeout: The number of seconds to keep results in the cache.
+    :param ignore_first_arg: Whether the first argument (the class for class methods) is left out of the cache key.
+    :param jitter: Randomizes the timeout of each entry, either by a fraction of the timeout or by a (low, high)
+        tuple of seconds. Defaults to the CACHE_HELPER_JITTER setting.
+    :param jitter_distribution: "uniform" or "triangular". Defaults to the CACHE_HELPER_JITTER_DISTRIBUTION setting.
+    :param jitter_deterministic: Whether the jittered timeout is derived from the cache key, so that runs are
+        reproducible. Defaults to the CACHE_HELPER_JITTER_DETERMINISTIC setting.
+    :param adaptive_timeout: Optional (min_timeout, max_timeout) tuple. When given, the timeout of each entry is
+        adapted within these bounds: entries that are expensive to compute are kept longer, and the timeout grows each
+        time a recomputed value turns out to be unchanged. The chosen timeouts are recorded in `cache_helper.stats`.
+        Requires a timeout to adapt, so it can't be combined with a timeout of None. See `cache_helper.adaptive` for
+        details.
+    :param min_compute_seconds: Results that took less than this many seconds to compute are not saved.
+    :param max_value_bytes: Results larger than this many bytes when serialized, or pickled without a serializer, are
+        not saved.
+    :param admit: Optional predicate that takes a result and returns whether it should be saved.
+    :param streaming: For generator functions. Instead of the generator itself, the items it yields are cached in
+        chunks of `chunk_size` items, written as the caller consumes them and read back lazily on hits. See
+        `cache_helper.streaming` for details. Can't be combined with the options that apply to whole results:
+        `adaptive_timeout`, `min_compute_seconds`, `max_value_bytes`, `admit`, `result_adapter`, `shared_memory`,
+        `disk`, `serializer`, `sliding`, `legacy_key_names` and `replicas`. The CACHE_HELPER_SERIALIZER setting doesn't
+        apply to streams.
+    :param chunk_size: The number of items per chunk when streaming.
+    :param result_adapter: Optional adapter that converts results to a more compact representation for the cache and
+        back, e.g. `cache_helper.adapters.ModelResultAdapter` for QuerySets and model instances.
+    :param shared_memory: Whether to keep results in the host-local shared memory tier configured by the
+        CACHE_HELPER_SHARED_MEMORY setting, in front of the Django cache.
+    :param disk: Whether to keep results in the host-local disk tier configured by the CACHE_HELPER_DISK setting,
+        which is checked when the Django cache misses.
+    :param depends_on: Optional mapping of Django models (or "app_label.ModelName" strings) to functions that take a
+        saved / deleted model instance and return the arguments whose cached results it affects. See
+        `cache_helper.signals.connect_dependencies` for details.
+    :param memoize_keys: Whether to memoize the cache keys of calls whose arguments are all of immutable builtin types
+        (ints, strings, tuples of those, ...), so that repeat calls skip building the key. Either True, or the maximum
+        number of calls memoized, which defaults to 1024. Calls of instance methods are never memoized, since the
+        instance is part of the key. See `cache_helper.key_memo` for details.
+    :param serializer: The name of the serializer that turns results into bytes before they are saved, e.g. "auto",
+        or a `cache_helper.serializers.Serializer`. Defaults to the CACHE_HELPER_SERIALIZER setting. See
+        `cache_helper.serializers` for details.
+    :param sliding: Whether each hit extends the entry's timeout, so that entries stay cached for as long as they keep
+        being read. See `cache_helper.sliding` for details.
+    :param max_age: With `sliding`, the number of seconds after which an entry is recomputed however recently it was
+        read. Defaults to the CACHE_HELPER_SLIDING_MAX_AGE setting.
+    :param key_name: The name cache keys are built from, instead of the module and qualified name of the function, so
+        that the function can be moved or renamed without losing its cached results.
+    :param legacy_key_names: Names the function's keys were built from before, e.g. its previous module and qualified
+        name. When a key misses, the keys under these names and the CACHE_HELPER_LEGACY_KEY_FORMAT_VERSIONS are read,
+        and a value found there is copied forward.
+    :param key_args: The names of the parameters the cache key is built from, when the others don't affect the result.
+    :param ignore_args: The names of the parameters left out of the cache key, e.g. a request or a logger. Only one of
+        `key_args` and `ignore_args` can be given.
+    :param key: Optional callable that takes the bound arguments, as a dict mapping parameter names to values with the
+        defaults applied, and returns the string the cache key is built from, instead of walking every argument. For
+        class methods, the class is None.
+    :param shards: Optional list of Django cache aliases to spread the function's keys across with consistent hashing,
+        instead of keeping them all in the default cache. See `cache_helper.sharding` for details.
+    :param replicas: Optional number of copies of each entry, saved under derived keys that belong to different cache
+        servers, so that reads of a very hot entry are spread across them rather than all hitting the one server that
+        owns its key. Each read picks a random copy, and falls back to the others if it is missing.
+    """
+
+    def __init__(
+        self,
+        func,
+        timeout,
+        ignore_first_arg=False,
+        jitter=None,
+        jitter_distribution=None,
+        jitter_deterministic=None,
+        adaptive_timeout=None,
+        min_compute_seconds=None,
+        max_value_bytes=None,
+        admit=None,
+        streaming=False,
+        chunk_size=100,
+        result_adapter=None,
+        shared_memory=False,
+        disk=False,
+        depends_on=None,
+        memoize_keys=False,
+        serializer=None,
+        sliding=False,
+        max_age=None,
+        key_name=None,
+        legacy_key_names=(),
+        key_args=None,
+        ignore_args=None,
+        key=None,
+        shards=None,
+        replicas=None,
+    ):
+        self.func = func
+        self.func_name = utils.get_function_name(func)
+        self.key_name = key_name or self.func_name
+        self.legacy_key_names = tuple(legacy_key_names)
+        self.func_signature = signature(func)
+        self.key_parameters = self._get_key_parameters(key_args, ignore_args, key)
+        self.key = key
+        self.hash_ring = get_hash_ring(shards) if shards else None
+        if streaming:
+            _check_streaming_options(
+                adaptive_timeout=adaptive_timeout,
+                min_compute_seconds=min_compute_seconds,
+                max_value_bytes=max_value_bytes,
+                admit=admit,
+                result_adapter=result_adapter,
+                shared_memory=shared_memory,
+                disk=disk,
+                serializer=serializer,
+                sliding=sliding,
+                legacy_key_names=legacy_key_names,
+                replicas=replicas if replicas and replicas > 1 else None,
+            )
+        # A single copy is saved under the key itself
+        self.replicas = replicas if replicas and replicas > 1 else None
+        if adaptive_timeout and timeout is None:
+            raise ValueError(
+                "adaptive_timeout can't be combined with a timeout of None, which never expires"
+            )
+        self.timeout = timeout
+        self.ignore_first_arg = ignore_first_arg
+        self.jitter = jitter
+        self.jitter_distribution = jitter_distribution
+        self.jitter_deterministic = jitter_deterministic
+        self.adaptive_timeout = adaptive_timeout
+        self.min_compute_seconds = min_compute_seconds
+        self.max_value_bytes = max_value_bytes
+        self.admit = admit
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.result_adapter = result_adapter
+        self.shared_memory = shared_memory
+        self.disk = disk
+        self.serializer = serializer
+        self.sliding = sliding
+        self.max_age = max_age
+        self.stats = get_function_stats(self.func_name)
+        if memoize_keys:
+            self.key_memo = KeyMemo() if memoize_keys is True else KeyMemo(memoize_keys)
+        else:
+            self.key_memo = None
+        self.uses_generation = False
+        self.generation_key = utils.get_hashed_cache_key(
+            f"cache_helper.generation:{self.key_name}"
+        )
+
+        dependencies.register(self)
+        if depends_on:
+            from cache_helper.signals import connect_dependencies
+
+            connect_dependencies(self, depends_on)
+
+    def _get_key_parameters(self, key_args, ignore_args, key):
+        """
+        :return: The names of the parameters the cache key is built from, or None for all of them.
+        """
+        if sum(option is not None for option in (key_args, ignore_args, key)) > 1:
+            raise ValueError("Only one of key_args, ignore_args and key can be given")
+        names = key_args if key_args is not None else ignore_args
+        if names is None:
+            return None
+
+        names = (names,) if isinstance(names, str) else tuple(names)
+        parameter_names = tuple(self.func_signature.parameters)
+        for name in names:
+            if name not in parameter_names:
+                raise ValueError(f"{self.func_name} has no parameter named {name}")
+        if key_args is not None:
+            return frozenset(names)
+        return frozenset(parameter_names) - frozenset(names)
+
+    def get_cache_alias(self, cache_key):
+        """
+        :return: The alias of the Django cache the key belongs to, following the `shards` option. Disk markers and
+            adaptive states belong to the alias of their entry, so that they are read and deleted where they were saved.
+        """
+        if self.hash_ring is None:
+            return DEFAULT_CACHE_ALIAS
+        return self.hash_ring.get_alias(_get_routing_key(cache_key))
+
+    def get_cache(self, cache_key):
+        """
+        :return: The Django cache the key belongs to.
+        """
+        if self.hash_ring is None:
+            return cache
+        return caches[self.get_cache_alias(cache_key)]
+
+    def group_by_alias(self, cache_keys):
+        """
+        :return: A dict mapping the aliases of Django caches to the keys that belong to them, see `get_cache_alias`.
+        """
+        if self.hash_ring is None:
+            return {DEFAULT_CACHE_ALIAS: list(cache_keys)}
+        return self.hash_ring.group_by_alias(cache_keys, _get_routing_key)
+
+    def get_many(self, cache_keys):
+        """
+        Retrieves the values of the keys with one `get_many` per Django cache they belong to.
+        """
+        values = {}
+        for alias, alias_keys in self.group_by_alias(cache_keys).items():
+            values.update(caches[alias].get_many(alias_keys))
+        return values
+
+    def delete_many(self, cache_keys):
+        """
+        Deletes the keys with one `delete_many` per Django cache they belong to.
+        """
+        for alias, alias_keys in self.group_by_alias(cache_keys).items():
+            caches[alias].delete_many(alias_keys)
+
+    def set_many(self, data, timeout):
+        """
+        Saves the values of the keys with one `set_many` per Django cache they belong to.
+        """
+        for alias, alias_keys in self.group_by_alias(data).items():
+            caches[alias].set_many(
+                {cache_key: data[cache_key] for cache_key in alias_keys}, timeout
+            )
+
+    def get_entry_keys(self, cache_key_hashed):
+        """
+        :return: The keys the entry under the key is saved under, one per replica with the `replicas` option.
+        """
+        if self.replicas is None:
+            return [cache_key_hashed]
+        return [f"{cache_key_hashed}:replica{index}" for index in range(self.replicas)]
+
+    def get_replica_key(self, cache_key_hashed):
+        """
+        :return: The key of a random replica of the entry, or the key itself without replicas.
+        """
+        if self.replicas is None:
+            return cache_key_hashed
+        return f"{cache_key_hashed}:replica{random.randrange(self.replicas)}"
+
+    def get_entry(self, cache_key_hashed, default):
+        """
+        Retrieves the entry under the key from the Django cache. With replicas, a random one is read first, and the
+        others only if it is missing, e.g. when it was evicted.
+
+        :return: The value of the entry, or `default` if there is none.
+        """
+        replica_key = self.get_replica_key(cache_key_hashed)
+        value = self.get_cache(replica_key).get(replica_key, default)
+        if value is not default or self.replicas is None:
+            return value
+        return self._get_other_replica(cache_key_hashed, replica_key, default)
+
+    def get_adaptive_entry(self, cache_key_hashed, default):
+        """
+        Like `get_entry`, but also retrieves the adaptive state of the entry with the same `get_many`, see
+        `cache_helper.adaptive`.
+
+        :return: A tuple of the value of the entry, or `default` if there is none, and its adaptive state, or None.
+        """
+        replica_key = self.get_replica_key(cache_key_hashed)
+        adaptive_key = get_adaptive_key(cache_key_hashed)
+        values = self.get_many([replica_key, adaptive_key])
+        adaptive_state = values.get(adaptive_key)
+        if replica_key in values or self.replicas is None:
+            return values.get(replica_key, default), adaptive_state
+        return (
+            self._get_other_replica(cache_key_hashed, replica_key, default),
+            adaptive_state,
+        )
+
+    def _get_other_replica(self, cache_key_hashed, replica_key, default):
+        """
+        :return: The value of any replica of the entry other than the one already read, or `default` if there is none.
+        """
+        other_keys = [
+            entry_key
+            for entry_key in self.get_entry_keys(cache_key_hashed)
+            if entry_key != replica_key
+        ]
+        values = self.get_many(other_keys)
+        for entry_key in other_keys:
+            if entry_key in values:
+                return values[entry_key]
+        return default
+
+    def set_entry(self, cache_key_hashed, value, timeout):
+        """
+        Saves the entry under the key in the Django cache, with one `set_many` for all of its replicas.
+        """
+        if self.replicas is None:
+            self.get_cache(cache_key_hashed).set(cache_key_hashed, value, timeout)
+        else:
+            self.set_many(
+                dict.fromkeys(self.get_entry_keys(cache_key_hashed), value), timeout
+            )
+
+    def __call__(self, args, kwargs):
+        bypass_reads, bypass_writes = _get_bypass_state()
+        if bypass_reads and bypass_writes:
+            return self.func(*args, **kwargs)
+
+        if self.streaming and tracing.is_enabled():
+            return self._stream_traced(args, kwargs, bypass_reads, bypass_writes)
+
+        with tracing.span(tracing.CALL_SPAN, self.func_name) as call_tags:
+            return self._get_or_compute(
+                args, kwargs, bypass_reads, bypass_writes, call_tags
+            )
+
+    def _stream_traced(self, args, kwargs, bypass_reads, bypass_writes):
+        """
+        :return: The stream, whose call span only exits once the stream is exhausted, closed or garbage collected, so
+            that it covers the time spent iterating it.
+        """
+        with contextlib.ExitStack() as exit_stack:
+            call_tags = exit_stack.enter_context(
+                tracing.span(tracing.CALL_SPAN, self.func_name)
+            )
+            items = self._get_or_compute(
+                args, kwargs, bypass_reads, bypass_writes, call_tags
+            )
+            return streaming.within(items, exit_stack.pop_all())
+
+    def _get_or_compute(self, args, kwargs, bypass_reads, bypass_writes, call_tags):
+        # The first arg is left out for caching purposes when it is the class itself
+        key_args = args[1:] if self.ignore_first_arg else args
+        try:
+            with tracing.span(tracing.BUILD_KEY_SPAN, self.func_name):
+                cache_key_hashed, cache_key_string = self.get_cache_keys(
+                    key_args, kwargs
+                )
+        except GenerationUnavailableError:
+            # Computed like during a cache outage, since nothing could be read back from a key without the generation
+            return self.func(*args, **kwargs)
+        if settings.TRACK_DEPENDENCIES:
+            dependencies.record_read(cache_key_hashed)
+
+        if self.streaming:
+            return streaming.stream(
+                self,
+                args,
+                kwargs,
+                cache_key_hashed,
+                cache_key_string,
+                bypass_reads,
+                bypass_writes,
+            )
+
+        # We need to determine whether the object exists in the cache, and since we may have stored a literal value
+        # None, use a sentinel object as the default
+        sentinel = object()
+        with tracing.span(tracing.GET_SPAN, self.func_name) as get_tags:
+            value, adaptive_state = (
+                (sentinel, None)
+                if bypass_reads
+                else self.get_cached_value(cache_key_hashed, cache_key_string, sentinel)
+            )
+            if value is sentinel and not bypass_reads:
+                value = self.migrate_legacy_value(
+                    key_args, kwargs, cache_key_hashed, cache_key_string, sentinel
+                )
+            if self.sliding and isinstance(value, SlidingEntry):
+                value = self.slide(cache_key_hashed, cache_key_string, value, sentinel)
+            get_tags["hit"] = call_tags["hit"] = hit = (
+                value is not sentinel and value is not None
+            )
+
+        if settings.TRACK_KEY_CARDINALITY and not bypass_reads:
+            self.stats.record_read(cache_key_hashed, hit)
+
+        # If there is an issue with our cache client deserializing the value (due to memory or some other issue),
+        # we get a None response so log anytime this happens
+        if value is None:
+            logger.warning(
+                "None cache value found for cache key: {}, function cache key: {}, value: {}".format(
+                    cache_key_hashed, cache_key_string, value
+                )
+            )
+
+        if value is not sentinel and value is not None:
             try:
-                value = cache.get(cache_key_hashed, sentinel)
-            except Exception:
+                return self.from_cached_value(value)
+            except serializers.SerializationError:
                 logger.warning(
-                    f'Error retrieving value from Cache for Key: {cache_key_string}',
+                    f"Error deserializing value from Cache for Key: {cache_key_string}",
                     exc_info=True,
                 )
-                value = sentinel
 
-            # If there is an issue with our cache client deserializing the value (due to memory or some other issue),
-            # we get a None response so log anytime this happens
-            if value is None:
+        return self.compute_and_save(
+            args,
+            kwargs,
+            cache_key_hashed,
+            cache_key_string,
+            save=not bypass_writes,
+            adaptive_state=adaptive_state,
+        )
+
+    def get_cached_value(self, cache_key_hashed, cache_key_string, default):
+        """
+        Retrieves the value saved in the cache for the key, from the hot keys promoted in this process, then from the
+        shared memory tier if enabled, then from the Django cache, and then from the disk tier if enabled.
+
+        :return: A tuple of the cached value, or `default` if there is none, and with `adaptive_timeout` the adaptive
+            state of the entry if it was read from the Django cache, or else None.
+        """
+        hot_key_cache = get_hot_key_cache()
+        if hot_key_cache is not None:
+            value = hot_key_cache.get(cache_key_hashed, default)
+            if value is not default:
+                return value, None
+
+        shared_memory_cache = get_shared_memory_cache() if self.shared_memory else None
+        if shared_memory_cache is not None:
+            try:
+                value = shared_memory_cache.get(cache_key_hashed, default)
+            except Exception:
+                # E.g. a value pickled by a newer deploy sharing the file, which is read from the Django cache instead
                 logger.warning(
-                    'None cache value found for cache key: {}, function cache key: {}, value: {}'.format(
-                        cache_key_hashed, cache_key_string, value
+                    f"Error retrieving value from shared memory for Key: {cache_key_string}",
+                    exc_info=True,
+                )
+                value = default
+            if value is not default:
+                return value, None
+
+        active_prefetch = get_active_prefetch()
+        value = (
+            None if active_prefetch is None else active_prefetch.pop(cache_key_hashed)
+        )
+        if value is MISSING and self.adaptive_timeout:
+            # Read again along with the adaptive state, which the miss needs
+            value = None
+        adaptive_state = None
+        if value is MISSING:
+            value = default
+        elif value is None:
+            try:
+                if self.adaptive_timeout:
+                    value, adaptive_state = self.get_adaptive_entry(
+                        cache_key_hashed, default
                     )
+                else:
+                    value = self.get_entry(cache_key_hashed, default)
+            except Exception:
+                logger.warning(
+                    f"Error retrieving value from Cache for Key: {cache_key_string}",
+                    exc_info=True,
+                )
+                value = default
+
+        if value is not default and value is not None:
+            if hot_key_cache is not None:
+                hot_key_cache.record_read(cache_key_hashed, self.func_name, value)
+            if shared_memory_cache is not None:
+                shared_memory_cache.set(
+                    cache_key_hashed, value, get_shared_memory_timeout(self.timeout)
+                )
+            return value, adaptive_state
+
+        disk_cache = get_disk_cache() if self.disk else None
+        if disk_cache is not None:
+            value = self._get_disk_value(
+                disk_cache, cache_key_hashed, cache_key_string, value
+            )
+
+        return value, adaptive_state
+
+    def _get_disk_value(self, disk_cache, cache_key_hashed, cache_key_string, default):
+        """
+        :return: The copy of the entry on disk if its marker in the Django cache still holds its token, see
+            `cache_helper.disk`, or else `default`.
+        """
+        try:
+            entry = disk_cache.get(cache_key_hashed)
+        except sqlite3.Error:
+            logger.warning(
+                f"Error retrieving value from disk for Key: {cache_key_string}",
+                exc_info=True,
+            )
+            return default
+        if entry is None:
+            return default
+
+        token, data = entry
+        marker_key = get_marker_key(cache_key_hashed)
+        try:
+            marker = self.get_cache(marker_key).get(marker_key)
+        except Exception:
+            logger.warning(
+                f"Error retrieving value from Cache for Key: {marker_key}",
+                exc_info=True,
+            )
+            return default
+
+        if marker != token:
+            # Invalidated, or overwritten from another host
+            self._delete_disk_value(disk_cache, cache_key_hashed, cache_key_string)
+            return default
+
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # E.g. a value pickled by a deploy whose classes have since changed, which is recomputed instead
+            logger.warning(
+                f"Error unpickling value from disk for Key: {cache_key_string}",
+                exc_info=True,
+            )
+            self._delete_disk_value(disk_cache, cache_key_hashed, cache_key_string)
+            return default
+
+    def _delete_disk_value(self, disk_cache, cache_key_hashed, cache_key_string):
+        try:
+            disk_cache.delete(cache_key_hashed)
+        except sqlite3.Error:
+            logger.warning(
+                f"Error deleting value from disk for Key: {cache_key_string}",
+                exc_info=True,
+            )
+
+    def migrate_legacy_value(
+        self, args, kwargs, cache_key_hashed, cache_key_string, default
+    ):
+        """
+        Reads the legacy keys of a call whose key missed, and copies the first value found forward to its key.
+
+        :param args: The args passed into the original function, excluding the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: The value found, or `default` if there is none.
+        """
+        legacy_keys = self.get_legacy_cache_keys(args, kwargs)
+        if not legacy_keys:
+            return default
+
+        try:
+            values = self.get_many(
+                [legacy_key_hashed for legacy_key_hashed, _ in legacy_keys]
+            )
+        except Exception:
+            logger.warning(
+                f"Error retrieving legacy values from Cache for Key: {cache_key_string}",
+                exc_info=True,
+            )
+            return default
+
+        for legacy_key_hashed, _ in legacy_keys:
+            value = values.get(legacy_key_hashed)
+            if value is not None:
+                break
+        else:
+            return default
+
+        self.stats.increment("migrated_keys")
+        try:
+            # Added rather than set, so that a value computed meanwhile isn't overwritten with an older one. With
+            # replicas, the others are only saved if the first was added, with one `set_many`
+            timeout = self.get_jittered_timeout(cache_key_hashed, self.timeout)
+            first_key, *other_keys = self.get_entry_keys(cache_key_hashed)
+            if self.get_cache(first_key).add(first_key, value, timeout) and other_keys:
+                self.set_many(dict.fromkeys(other_keys, value), timeout)
+        except Exception:
+            logger.warning(
+                f"Error saving value to Cache for Key: {cache_key_string}",
+                exc_info=True,
+            )
+        return value
+
+    def slide(self, cache_key_hashed, cache_key_string, entry, default):
+        """
+        Extends the timeout of an entry that was read, unless it was extended recently by this process. With replicas,
+        only one is touched per hit, picked at random like reads are, so that each replica is extended as it is read.
+
+        :param entry: The SlidingEntry that was read.
+        :return: The entry, or `default` if it is older than its maximum age.
+        """
+        max_age = settings.SLIDING_MAX_AGE if self.max_age is None else self.max_age
+        remaining_age = entry.created_at + max_age - time.time()
+        if remaining_age <= 0:
+            return default
+
+        replica_key = self.get_replica_key(cache_key_hashed)
+        if self.timeout and get_touch_limiter().should_touch(
+            replica_key, self.timeout * TOUCH_INTERVAL_FRACTION
+        ):
+            timeout = min(
+                self.get_jittered_timeout(cache_key_hashed, self.timeout),
+                math.ceil(remaining_age),
+            )
+            try:
+                self.get_cache(replica_key).touch(replica_key, timeout)
+            except Exception:
+                logger.warning(
+                    f"Error extending timeout in Cache for Key: {cache_key_string}",
+                    exc_info=True,
+                )
+        return entry
+
+    def compute_and_save(
+        self,
+        args,
+        kwargs,
+        cache_key_hashed,
+        cache_key_string,
+        save=True,
+        adaptive_state=None,
+    ):
+        """
+        Calls the function and saves the result in the cache.
+
+        :param args: The args passed into the original function, including the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+        :param save: Whether to save the result in the cache.
+        :param adaptive_state: With `adaptive_timeout`, the adaptive state of the previous value, if any.
+
+        :return: The result of the function.
+        """
+        value, compute_seconds, dependency_keys = self.compute(args, kwargs)
+        if save:
+            self.save(
+                cache_key_hashed,
+                cache_key_string,
+                value,
+                compute_seconds,
+                dependency_keys,
+                adaptive_state,
+            )
+
+        return value
+
+    def compute(self, args, kwargs):
+        """
+        Calls the function.
+
+        :param args: The args passed into the original function, including the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: A tuple of the result of the function, how long it took to compute, and the keys of the cached calls
+            made to compute it when tracking dependencies.
+        """
+        with tracing.span(tracing.COMPUTE_SPAN, self.func_name), (
+            dependencies.track()
+            if settings.TRACK_DEPENDENCIES
+            else contextlib.nullcontext()
+        ) as dependency_keys:
+            start = time.perf_counter()
+            value = self.func(*args, **kwargs)
+            compute_seconds = time.perf_counter() - start
+        return value, compute_seconds, dependency_keys
+
+    def get_serializer(self):
+        """
+        :return: The `Serializer` of the function, following the CACHE_HELPER_SERIALIZER setting, or None.
+        """
+        return serializers.get_serializer(
+            self.serializer if self.serializer is not None else settings.SERIALIZER
+        )
+
+    def to_cached_value(self, value):
+        """
+        :param value: The result of the function.
+        :return: The value to save in the cache for the result.
+        """
+        if self.result_adapter is not None:
+            value = self.result_adapter.adapt(value)
+        serializer = self.get_serializer()
+        if serializer is not None:
+            value = serializer.serialize(value)
+        return value
+
+    def from_cached_value(self, cached_value):
+        """
+        :param cached_value: A value retrieved from the cache.
+        :return: The result of the function it represents.
+        """
+        if isinstance(cached_value, SlidingEntry):
+            cached_value = cached_value.value
+        # Whichever serializer saved them, or none is configured now. Other values, e.g. saved before the serializer was
+        # configured, are used as they are
+        if type(cached_value) is serializers.SerializedValue:
+            start = time.perf_counter()
+            cached_value = serializers.deserialize(cached_value)
+            self.stats.record_deserialization(time.perf_counter() - start)
+        if self.result_adapter is not None and isinstance(
+            cached_value, CompactModelResult
+        ):
+            cached_value = self.result_adapter.restore(cached_value)
+        return cached_value
+
+    def save(
+        self,
+        cache_key_hashed,
+        cache_key_string,
+        value,
+        compute_seconds,
+        dependency_keys=None,
+        adaptive_state=None,
+    ):
+        """
+        :param dependency_keys: The keys of the cached calls made to compute the value, when tracking dependencies.
+        :param adaptive_state: With `adaptive_timeout`, the adaptive state of the previous value, if any.
+
+        :return: Whether the value was saved in the Django cache. It isn't when it can't be serialized, an admission
+            rule rejects it, or the cache fails to save it.
+        """
+        with tracing.span(tracing.SET_SPAN, self.func_name) as set_tags:
+            return self._save(
+                cache_key_hashed,
+                cache_key_string,
+                value,
+                compute_seconds,
+                set_tags,
+                dependency_keys,
+                adaptive_state,
+            )
+
+    def _save(
+        self,
+        cache_key_hashed,
+        cache_key_string,
+        value,
+        compute_seconds,
+        set_tags,
+        dependency_keys,
+        adaptive_state,
+    ):
+        try:
+            cached_value = self.to_cached_value(value)
+        except serializers.SerializationError:
+            logger.warning(
+                f"Error serializing value for Key: {cache_key_string}", exc_info=True
+            )
+            return False
+        value_bytes = None
+        if (
+            tracing.is_enabled()
+            or self.max_value_bytes is not None
+            or self.adaptive_timeout
+        ):
+            # Measured and hashed from the same bytes, so the value is pickled once at most
+            value_bytes = utils.get_value_bytes(cached_value)
+            set_tags["value_size"] = len(value_bytes)
+
+        rejected_by = self._get_rejecting_rule(value, value_bytes, compute_seconds)
+        if rejected_by is not None:
+            self.stats.increment("skipped_writes")
+            self.stats.increment(f"skipped_writes.{rejected_by}")
+            return False
+
+        timeout = self.timeout
+        if self.adaptive_timeout:
+            digest = utils.get_value_digest(value_bytes)
+            timeout = adapted_timeout = self._get_adaptive_timeout(
+                digest, compute_seconds, adaptive_state
+            )
+        timeout = self.get_jittered_timeout(cache_key_hashed, timeout)
+        if self.sliding:
+            # Only wrapped now so that the time it was saved doesn't change the digest of adaptive timeouts
+            cached_value = SlidingEntry(cached_value, time.time())
+            if timeout is not None and timeout > 0:
+                max_age = (
+                    settings.SLIDING_MAX_AGE if self.max_age is None else self.max_age
+                )
+                timeout = min(timeout, max_age)
+
+        # Try and set the key, value pair in the cache.
+        # But if it fails on an error from the underlying
+        # cache system, handle it.
+        saved = True
+        try:
+            self.set_entry(cache_key_hashed, cached_value, timeout)
+            self.stats.record_timeout(timeout)
+            if self.adaptive_timeout:
+                adaptive_key = get_adaptive_key(cache_key_hashed)
+                # Kept past the expiry of the entry, so that the miss recomputing it can tell whether the value changed
+                self.get_cache(adaptive_key).set(
+                    adaptive_key,
+                    (digest, adapted_timeout),
+                    timeout + self.adaptive_timeout[1],
+                )
+        except CacheSetError:
+            logger.warning(
+                f"Error saving value to Cache for Key: {cache_key_string}",
+                exc_info=True,
+            )
+            saved = False
+
+        if dependency_keys and (timeout is None or timeout > 0):
+            try:
+                dependencies.save_dependencies(
+                    cache_key_hashed, self.key_name, dependency_keys, timeout
+                )
+            except Exception:
+                logger.warning(
+                    f"Error saving dependencies to Cache for Key: {cache_key_string}",
+                    exc_info=True,
+                )
+
+        self._save_to_host_tiers(
+            cache_key_hashed, cache_key_string, cached_value, timeout
+        )
+        return saved
+
+    def _save_to_host_tiers(
+        self, cache_key_hashed, cache_key_string, cached_value, timeout
+    ):
+        """
+        Saves the value in the shared memory and disk tiers, if they are enabled.
+        """
+        shared_memory_cache = get_shared_memory_cache() if self.shared_memory else None
+        if shared_memory_cache is not None:
+            shared_memory_cache.set(
+                cache_key_hashed, cached_value, get_shared_memory_timeout(timeout)
+            )
+
+        disk_cache = get_disk_cache() if self.disk else None
+        if disk_cache is not None:
+            data = pickle.dumps(cached_value, pickle.HIGHEST_PROTOCOL)
+            # Only large values are worth a trip to the disk
+            if len(data) < settings.DISK.get("MIN_SIZE", 0):
+                return
+
+            # Kept pickled within the entry, so that copies that are no longer valid are never unpickled
+            token = uuid.uuid4().hex
+            disk_timeout = get_disk_timeout(timeout)
+            try:
+                disk_cache.set(cache_key_hashed, (token, data), disk_timeout)
+            except sqlite3.Error:
+                logger.warning(
+                    f"Error saving value to disk for Key: {cache_key_string}",
+                    exc_info=True,
+                )
+                return
+
+            marker_key = get_marker_key(cache_key_hashed)
+            try:
+                self.get_cache(marker_key).set(marker_key, token, disk_timeout)
+            except CacheSetError:
+                logger.warning(
+                    f"Error saving value to Cache for Key: {marker_key}", exc_info=True
                 )
 
-            if value is sentinel or value is None:
-                value = func(*args, **kwargs)
-                # Try and set the key, value pair in the cache.
-                # But if it fails on an error from the underlying
-                # cache system, handle it.
+    def get_cache_keys(self, args, kwargs) -> Tuple[str, str]:
+        """
+        :param args: The args passed into the original function, excluding the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: A tuple containing the hashed cache key and the non-hashed cache key.
+        """
+        if self.ignore_first_arg:
+            # The class is replaced with None for consistent cache behavior with subclasses
+            args = (None, *args)
+        memo_key = None if self.key_memo is None else get_memo_key(args, kwargs)
+        keys = None if memo_key is None else self.key_memo.get(memo_key)
+        if keys is None:
+            keys = self._build_cache_keys(
+                self.key_name, args, kwargs, settings.KEY_FORMAT_VERSION
+            )
+            if memo_key is not None:
+                self.key_memo.set(memo_key, keys)
+
+        if self.uses_generation:
+            return self._add_generation(keys, self.get_generation())
+        return keys
+
+    def get_legacy_cache_keys(self, args, kwargs):
+        """
+        :param args: The args passed into the original function, excluding the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: A list of tuples of the hashed and non-hashed cache keys the result was saved under before the function
+            was renamed or the key format changed, in the order of `legacy_key_names` and of the
+            CACHE_HELPER_LEGACY_KEY_FORMAT_VERSIONS setting.
+        """
+        key_format_version = settings.KEY_FORMAT_VERSION
+        # Keys built by a `key` callable don't depend on the key format
+        legacy_key_format_versions = (
+            settings.LEGACY_KEY_FORMAT_VERSIONS if self.key is None else ()
+        )
+        names_and_versions = [
+            (key_name, legacy_key_format_version)
+            for key_name in (self.key_name, *self.legacy_key_names)
+            for legacy_key_format_version in (
+                key_format_version,
+                *legacy_key_format_versions,
+            )
+            if (key_name, legacy_key_format_version)
+            != (self.key_name, key_format_version)
+        ]
+        if not names_and_versions:
+            return []
+
+        if self.ignore_first_arg:
+            args = (None, *args)
+        generation = self.get_generation() if self.uses_generation else None
+        legacy_keys = []
+        for key_name, legacy_key_format_version in names_and_versions:
+            keys = self._build_cache_keys(
+                key_name, args, kwargs, legacy_key_format_version
+            )
+            legacy_keys.append(
+                keys if generation is None else self._add_generation(keys, generation)
+            )
+        return legacy_keys
+
+    def _build_cache_keys(self, key_name, args, kwargs, key_format_version):
+        """
+        :param args: The args passed into the original function, with None in place of the class for class methods.
+        :return: A tuple containing the hashed cache key and the non-hashed cache key, following the `key_args`,
+            `ignore_args` or `key` option.
+        """
+        if self.key is None and self.key_parameters is None:
+            return _get_function_cache_keys(
+                key_name, self.func_signature, args, kwargs, key_format_version
+            )
+
+        # Partially, so that arguments left out of the key can be left out when invalidating
+        bound_arguments = self.func_signature.bind_partial(*args, **kwargs)
+        bound_arguments.apply_defaults()
+        if self.key is not None:
+            cache_key_string = f"{key_name};key={self.key(bound_arguments.arguments)}"
+        else:
+            for name in self.key_parameters:
+                if name not in bound_arguments.arguments:
+                    raise TypeError(f"missing a required argument: '{name}'")
+            key_arguments = {
+                name: value
+                for name, value in bound_arguments.arguments.items()
+                if name in self.key_parameters
+            }
+            cache_key_string = utils.get_function_cache_key(
+                key_name, (), key_arguments, key_format_version
+            )
+        return utils.get_hashed_cache_key(cache_key_string), cache_key_string
+
+    def get_invalidation_keys(self, args, kwargs):
+        """
+        :param args: The args passed into the original function, excluding the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: The hashed keys to delete to invalidate the result, its replicas, disk marker and legacy keys
+            included.
+        """
+        cache_key_hashed, _ = self.get_cache_keys(args, kwargs)
+        return self._get_invalidation_keys(cache_key_hashed, args, kwargs)
+
+    def _get_invalidation_keys(self, cache_key_hashed, args, kwargs):
+        legacy_keys = self.get_legacy_cache_keys(args, kwargs)
+        return [
+            *self.get_stored_keys(cache_key_hashed),
+            *(legacy_key_hashed for legacy_key_hashed, _ in legacy_keys),
+        ]
+
+    def get_stored_keys(self, cache_key_hashed):
+        """
+        :return: The keys of everything saved in the Django cache for the entry under the key: the key itself, its
+            replicas, and the marker of its copies on disk.
+        """
+        # The key itself comes first even with replicas, since dependents are tracked under it, and in case a value
+        # was saved under it before replicas were enabled
+        stored_keys = [cache_key_hashed]
+        if self.replicas is not None:
+            stored_keys.extend(self.get_entry_keys(cache_key_hashed))
+        if self.disk:
+            stored_keys.append(get_marker_key(cache_key_hashed))
+        return stored_keys
+
+    @staticmethod
+    def _add_generation(keys, generation):
+        _, cache_key_string = keys
+        cache_key_string = f"{cache_key_string};generation={generation}"
+        return utils.get_hashed_cache_key(cache_key_string), cache_key_string
+
+    def _get_rejecting_rule(self, value, value_bytes, compute_seconds):
+        """
+        :param value: The result of the function.
+        :param value_bytes: The value that would be saved in the cache for the result, as bytes, if measured.
+        :param compute_seconds: How long it took to compute the result.
+
+        :return: The name of the first admission rule that rejects saving the value, or None if it should be saved.
+        """
+        if (
+            self.min_compute_seconds is not None
+            and compute_seconds < self.min_compute_seconds
+        ):
+            return "min_compute_seconds"
+        if self.admit is not None and not self.admit(value):
+            return "admit"
+        if self.max_value_bytes is not None and len(value_bytes) > self.max_value_bytes:
+            return "max_value_bytes"
+        return None
+
+    def get_jittered_timeout(self, cache_key_hashed, timeout):
+        """
+        :param cache_key_hashed: The key the entry is saved under.
+        :param timeout: The timeout before jitter is applied.
+
+        :return: The timeout with the configured jitter applied.
+        """
+        jitter = settings.JITTER if self.jitter is None else self.jitter
+        if not jitter:
+            return timeout
+
+        distribution = self.jitter_distribution or settings.JITTER_DISTRIBUTION
+        deterministic = (
+            settings.JITTER_DETERMINISTIC
+            if self.jitter_deterministic is None
+            else self.jitter_deterministic
+        )
+        seed = cache_key_hashed if deterministic else None
+        return utils.get_jittered_timeout(timeout, jitter, distribution, seed)
+
+    def _get_adaptive_timeout(self, digest, compute_seconds, adaptive_state):
+        """
+        :param digest: The digest of the value being saved.
+        :param compute_seconds: How long it took to compute the value.
+        :param adaptive_state: The adaptive state of the previous value, if any, see `cache_helper.adaptive`.
+
+        :return: The adapted timeout for the entry, before jitter is applied.
+        """
+        min_timeout, max_timeout = self.adaptive_timeout
+        # Expensive computations are kept longer
+        timeout = self.timeout * (
+            1 + compute_seconds / settings.ADAPTIVE_TIMEOUT_COST_SECONDS
+        )
+        if adaptive_state is not None and adaptive_state[0] == digest:
+            # The value did not change since it was last computed, so it could have been kept longer
+            timeout = max(timeout, adaptive_state[1] * settings.ADAPTIVE_TIMEOUT_GROWTH)
+        return int(min(max(timeout, min_timeout), max_timeout))
+
+    def invalidate(self, args, kwargs):
+        cache_key_hashed, _ = self.get_cache_keys(args, kwargs)
+        invalidation_keys = self._get_invalidation_keys(cache_key_hashed, args, kwargs)
+        if self.streaming:
+            # Or its chunks would be left behind until they expire
+            streaming.delete_streams(self, invalidation_keys)
+        elif len(invalidation_keys) == 1:
+            self.get_cache(cache_key_hashed).delete(cache_key_hashed)
+        else:
+            # Every replica, the disk marker, and the legacy keys or the legacy value would be copied forward again
+            self.delete_many(invalidation_keys)
+        self.delete_local_copies([cache_key_hashed])
+        if settings.TRACK_DEPENDENCIES:
+            self.invalidate_dependents(cache_key_hashed)
+
+    def invalidate_dependents(self, cache_key_hashed):
+        """
+        Invalidates the results computed from the entry under the key, see `cache_helper.dependencies`. Like for
+        `invalidate`, other processes and hosts keep their copies in the hot key and shared memory tiers until they
+        time out.
+        """
+        try:
+            dependents = dependencies.invalidate_dependents([cache_key_hashed])
+        except Exception:
+            logger.warning(
+                f"Error invalidating dependents in Cache for Key: {cache_key_hashed}",
+                exc_info=True,
+            )
+            return
+
+        if dependents:
+            self.stats.increment("invalidated_dependents", len(dependents))
+
+    def delete_entries(self, cache_keys):
+        """
+        Deletes the entries under the keys from the Django cache, and from the local tiers of this process and host.
+        """
+        self.delete_many(
+            [
+                stored_key
+                for cache_key_hashed in cache_keys
+                for stored_key in self.get_stored_keys(cache_key_hashed)
+            ]
+        )
+        self.delete_local_copies(cache_keys)
+
+    def delete_local_copies(self, cache_keys):
+        """
+        Deletes the entries under the keys from the hot keys promoted in this process, and from the shared memory and
+        disk tiers of this host. Other processes and hosts keep their copies in the hot key and shared memory tiers
+        until they time out, while their copies on disk are invalidated by deleting the disk markers.
+        """
+        hot_key_cache = get_hot_key_cache()
+        shared_memory_cache = get_shared_memory_cache() if self.shared_memory else None
+        disk_cache = get_disk_cache() if self.disk else None
+        for cache_key_hashed in cache_keys:
+            if hot_key_cache is not None:
+                hot_key_cache.delete(cache_key_hashed)
+            if shared_memory_cache is not None:
+                shared_memory_cache.delete(cache_key_hashed)
+            if disk_cache is not None:
                 try:
-                    cache.set(cache_key_hashed, value, timeout)
-                except CacheSetError:
+                    disk_cache.delete(cache_key_hashed)
+                except sqlite3.Error:
                     logger.warning(
-                        f'Error saving value to Cache for Key: {cache_key_string}',
+                        f"Error deleting value from disk for Key: {cache_key_hashed}",
                         exc_info=True,
                     )
 
-            return value
+    def refresh(self, args, kwargs):
+        """
+        Recomputes the result and overwrites the cached value. Unlike invalidating, the old value isn't deleted first,
+        so callers keep getting it until the new one is saved rather than all missing and recomputing at once. If the
+        new value isn't saved, e.g. because an admission rule rejects it, the old one is deleted instead.
+
+        :param args: The args passed into the original function, including the class for class methods.
+        :param kwargs: The kwargs passed into the original function.
+
+        :return: The new result, as a list of items for generator functions.
+        """
+        key_args = args[1:] if self.ignore_first_arg else args
+        try:
+            cache_key_hashed, cache_key_string = self.get_cache_keys(key_args, kwargs)
+        except GenerationUnavailableError:
+            value = self.func(*args, **kwargs)
+            return list(value) if self.streaming else value
+        _, bypass_writes = _get_bypass_state()
+
+        if self.streaming:
+            # The stream header is written last, so the old stream is replayed until the new one is complete
+            value = list(
+                streaming.stream(
+                    self,
+                    args,
+                    kwargs,
+                    cache_key_hashed,
+                    cache_key_string,
+                    True,
+                    bypass_writes,
+                )
+            )
+        else:
+            adaptive_state = None
+            if self.adaptive_timeout and not bypass_writes:
+                # So an unchanged value keeps growing its timeout
+                adaptive_key = get_adaptive_key(cache_key_hashed)
+                try:
+                    adaptive_state = self.get_cache(adaptive_key).get(adaptive_key)
+                except Exception:
+                    logger.warning(
+                        f"Error retrieving value from Cache for Key: {adaptive_key}",
+                        exc_info=True,
+                    )
+            value, compute_seconds, dependency_keys = self.compute(args, kwargs)
+            if not bypass_writes and not self.save(
+                cache_key_hashed,
+                cache_key_string,
+                value,
+                compute_seconds,
+                dependency_keys,
+                adaptive_state,
+            ):
+                # Or the old value would keep being served until it expires
+                try:
+                    self.delete_entries([cache_key_hashed])
+                except Exception:
+                    logger.warning(
+                        f"Error deleting value from Cache for Key: {cache_key_string}",
+                        exc_info=True,
+                    )
+
+        if not bypass_writes:
+            legacy_keys = self.get_legacy_cache_keys(key_args, kwargs)
+            if legacy_keys:
+                # Or the older legacy value would be copied forward once the new one expires
+                self.delete_many(
+                    [legacy_key_hashed for legacy_key_hashed, _ in legacy_keys]
+                )
+            # Other processes keep serving their promoted copy until it times out
+            if get_hot_key_cache() is not None:
+                get_hot_key_cache().delete(cache_key_hashed)
+            # The results computed from the old value are stale
+            if settings.TRACK_DEPENDENCIES:
+                self.invalidate_dependents(cache_key_hashed)
+        return value
+
+    def refresh_async(self, args, kwargs):
+        """
+        Schedules `refresh` on a background pool, see `cache_helper.refresh`.
+
+        :return: A Future of the new result.
+        """
+        return submit_refresh(self, args, kwargs)
+
+    def get_generation(self):
+        """
+        The generation is part of every cache key when a model dependency invalidates all of the function's results,
+        so bumping it orphans every entry at once. A missing generation is initialized from the clock rather than
+        from zero, so that an evicted generation can never bring back entries from an earlier one.
+
+        :raises GenerationUnavailableError: If the generation can't be retrieved, e.g. during a cache outage. Calls
+            then compute their result without saving it, like plain cached functions do when the cache is down.
+        """
+        backend = self.get_cache(self.generation_key)
+        try:
+            generation = backend.get(self.generation_key)
+            if generation is None:
+                backend.add(self.generation_key, time.time_ns(), None)
+                generation = backend.get(self.generation_key)
+        except Exception as e:
+            logger.warning(
+                f"Error retrieving generation from Cache for Key: {self.generation_key}",
+                exc_info=True,
+            )
+            raise GenerationUnavailableError(str(e)) from e
+        if generation is None:
+            raise GenerationUnavailableError(
+                f"No generation could be saved for Key: {self.generation_key}"
+            )
+        return generation
+
+    def bump_generation(self):
+        backend = self.get_cache(self.generation_key)
+        try:
+            backend.incr(self.generation_key)
+        except ValueError:
+            backend.set(self.generation_key, time.time_ns(), None)
+
+
+def cached(timeout, **options):
+    def _cached(func):
+        cached_function = _CachedFunction(func, timeout, **options)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return cached_function(args, kwargs)
 
         def invalidate(*args, **kwargs):
             """
@@ -88,62 +1339,50 @@ def cached(timeout):
             :param kwargs: The kwargs passed into the original function.
             :rtype: None
             """
-            cache_key, _ = _get_function_cache_keys(func_name, func_signature, args, kwargs)
-            cache.delete(cache_key)
+            cached_function.invalidate(args, kwargs)
+
+        def refresh(*args, **kwargs):
+            """
+            A method to recompute a result and overwrite it in the cache, without a window in which callers miss.
+            :param args: The args passed into the original function.
+            :param kwargs: The kwargs passed into the original function.
+            :return: The new result.
+            """
+            return cached_function.refresh(args, kwargs)
+
+        def refresh_async(*args, **kwargs):
+            """
+            Like `refresh`, but in a background thread.
+            :return: A Future of the new result.
+            """
+            return cached_function.refresh_async(args, kwargs)
+
+        def get_cache_keys(*args, **kwargs):
+            """
+            :return: A tuple containing the hashed and non-hashed cache keys for the given args and kwargs, which are
+            the same as for `invalidate`.
+            """
+            return cached_function.get_cache_keys(args, kwargs)
 
         wrapper.invalidate = invalidate
+        wrapper.refresh = refresh
+        wrapper.refresh_async = refresh_async
+        wrapper.get_cache_keys = get_cache_keys
+        wrapper.cached_function = cached_function
         return wrapper
 
     return _cached
 
 
-def cached_class_method(timeout):
+def cached_class_method(timeout, **options):
     def _cached(func):
-        func_name = utils.get_function_name(func)
-        func_signature = signature(func)
+        cached_function = _CachedFunction(
+            func, timeout, ignore_first_arg=True, **options
+        )
 
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # replace the first arg for caching purposes because it will be the class itself
-            cls_adjusted_args = (None, *args[1:])
-            cache_key_hashed, cache_key_string = _get_function_cache_keys(
-                func_name, func_signature, cls_adjusted_args, kwargs
-            )
-            # We need to determine whether the object exists in the cache, and since we may have stored a literal value
-            # None, use a sentinel object as the default
-            sentinel = object()
-            try:
-                value = cache.get(cache_key_hashed, sentinel)
-            except Exception:
-                logger.warning(
-                    f'Error retrieving value from Cache for Key: {cache_key_string}',
-                    exc_info=True,
-                )
-                value = sentinel
-
-            # If there is an issue with our cache client deserializing the value (due to memory or some other issue),
-            # we get a None response so log anytime this happens
-            if value is None:
-                logger.warning(
-                    'None cache value found for cache key: {}, function cache key: {}, value: {}'.format(
-                        cache_key_hashed, cache_key_string, value
-                    )
-                )
-
-            if value is sentinel or value is None:
-                value = func(*args, **kwargs)
-                # Try and set the key, value pair in the cache.
-                # But if it fails on an error from the underlying
-                # cache system, handle it.
-                try:
-                    cache.set(cache_key_hashed, value, timeout)
-                except CacheSetError:
-                    logger.warning(
-                        f'Error saving value to Cache for Key: {cache_key_string}',
-                        exc_info=True,
-                    )
-
-            return value
+            return cached_function(args, kwargs)
 
         def invalidate(*args, **kwargs):
             """
@@ -154,19 +1393,46 @@ def cached_class_method(timeout):
             :rtype: None
             """
             # note: args does not include the class itself, but because it *is* passed to wrapper() and we replaced
-            # it with None for consistent cache behavior with subclasses, we need to account for it here by updating
-            # args to include None
-            cls_adjusted_args = (None, *args)
-            cache_key, _ = _get_function_cache_keys(func_name, func_signature, cls_adjusted_args, kwargs)
-            cache.delete(cache_key)
+            # it with None for consistent cache behavior with subclasses, the cached function accounts for it when
+            # building the cache key
+            cached_function.invalidate(args, kwargs)
+
+        def refresh(cls, *args, **kwargs):
+            """
+            A method to recompute a result and overwrite it in the cache, without a window in which callers miss.
+            :param cls: The class to call the original function with. Unlike for `invalidate`, it has to be passed
+            explicitly, since `Class.method.refresh` can't know which class it was accessed through.
+            :param args: The args passed into the original function, excluding `cls`.
+            :param kwargs: The kwargs passed into the original function.
+            :return: The new result.
+            """
+            return cached_function.refresh((cls, *args), kwargs)
+
+        def refresh_async(cls, *args, **kwargs):
+            """
+            Like `refresh`, but in a background thread.
+            :return: A Future of the new result.
+            """
+            return cached_function.refresh_async((cls, *args), kwargs)
+
+        def get_cache_keys(*args, **kwargs):
+            """
+            :return: A tuple containing the hashed and non-hashed cache keys for the given args and kwargs, which are
+            the same as for `invalidate`.
+            """
+            return cached_function.get_cache_keys(args, kwargs)
 
         wrapper.invalidate = invalidate
+        wrapper.refresh = refresh
+        wrapper.refresh_async = refresh_async
+        wrapper.get_cache_keys = get_cache_keys
+        wrapper.cached_function = cached_function
         return wrapper
 
     return _cached
 
 
-def cached_instance_method(timeout):
+def cached_instance_method(timeout, **options):
     """
     Fact 1: We need to store the instance as part of the cache key
     Fact 2: To find the correct cache key to invalidate, we need to know the instance
@@ -183,6 +1449,7 @@ def cached_instance_method(timeout):
     class wrapper:
         def __init__(self, func):
             self.func = func
+            self.cached_function = _CachedFunction(func, timeout, **options)
 
         def __get__(self, obj, objtype):
             # When a user calls the instance method, this partial object is what actually gets called.
@@ -191,47 +1458,15 @@ def cached_instance_method(timeout):
             # When a user calls invalidate, this partial object is what actually gets called.
             # It behaves exactly like `_invalidate` with `obj` automatically included as the first argument.
             fn.invalidate = functools.partial(self._invalidate, obj)
+            fn.refresh = functools.partial(self._refresh, obj)
+            fn.refresh_async = functools.partial(self._refresh_async, obj)
+            fn.get_cache_keys = functools.partial(self.create_cache_key, obj)
+            fn.cached_function = self.cached_function
 
             return fn
 
         def __call__(self, *args, **kwargs):
-            cache_key_hashed, cache_key_string = self.create_cache_key(*args, **kwargs)
-
-            # We need to determine whether the object exists in the cache, and since we may have stored a literal value
-            # None, use a sentinel object as the default
-            sentinel = object()
-            try:
-                value = cache.get(cache_key_hashed, sentinel)
-            except Exception:
-                logger.warning(
-                    f'Error retrieving value from Cache for Key: {cache_key_string}',
-                    exc_info=True,
-                )
-                value = sentinel
-
-            # If there is an issue with our cache client deserializing the value (due to memory or some other issue),
-            # we get a None response so log anytime this happens
-            if value is None:
-                logger.warning(
-                    'None cache value found for cache key: {}, function cache key: {}, value: {}'.format(
-                        cache_key_hashed, cache_key_string, value
-                    )
-                )
-
-            if value is sentinel or value is None:
-                value = self.func(*args, **kwargs)
-                # Try and set the key, value pair in the cache.
-                # But if it fails on an error from the underlying
-                # cache system, handle it.
-                try:
-                    cache.set(cache_key_hashed, value, timeout)
-                except CacheSetError:
-                    logger.warning(
-                        f'Error saving value to Cache for Key: {cache_key_string}',
-                        exc_info=True,
-                    )
-
-            return value
+            return self.cached_function(args, kwargs)
 
         def _invalidate(self, *args, **kwargs):
             """
@@ -241,14 +1476,97 @@ def cached_instance_method(timeout):
             :param kwargs: The kwargs passed into the original function.
             :rtype: None
             """
-            cache_key_hashed, _ = self.create_cache_key(*args, **kwargs)
-            cache.delete(cache_key_hashed)
+            self.cached_function.invalidate(args, kwargs)
+
+        def _refresh(self, *args, **kwargs):
+            """
+            A method to recompute a result and overwrite it in the cache, without a window in which callers miss.
+            :param args: The args passed into the original function, including `self`.
+            :param kwargs: The kwargs passed into the original function.
+            :return: The new result.
+            """
+            return self.cached_function.refresh(args, kwargs)
+
+        def _refresh_async(self, *args, **kwargs):
+            """
+            Like `_refresh`, but in a background thread.
+            :return: A Future of the new result.
+            """
+            return self.cached_function.refresh_async(args, kwargs)
 
         def create_cache_key(self, *args, **kwargs):
             # Need to include the first arg (self) in the cache key
-            func_name = utils.get_function_name(self.func)
-            func_signature = signature(self.func)
-            cache_key_hashed, cache_key_string = _get_function_cache_keys(func_name, func_signature, args, kwargs)
-            return cache_key_hashed, cache_key_string
+            return self.cached_function.get_cache_keys(args, kwargs)
+
+    return wrapper
+
+
+def cached_instance_property(timeout, **options):
+    """
+    Like `cached_instance_method` for a method without arguments, accessed as a property. The result is memoized in
+    the instance's `__dict__` on first access, in front of the Django cache shared by every process, so later accesses
+    on the same instance cost a dict lookup. The cache key is built from the instance just like for
+    `cached_instance_method`.
+
+    Both layers are cleared with `del obj.prop` or `MyClass.prop.invalidate(obj)`, and refreshed with
+    `MyClass.prop.refresh(obj)`.
+    """
+
+    class wrapper:
+        def __init__(self, func):
+            self.func = func
+            self.name = func.__name__
+            self.cached_function = _CachedFunction(func, timeout, **options)
+            self.__doc__ = func.__doc__
+
+        def __set_name__(self, owner, name):
+            self.name = name
+
+        def __get__(self, obj, objtype=None):
+            if obj is None:
+                return self
+
+            instance_dict = self._get_instance_dict(obj)
+            bypass_reads, bypass_writes = _get_bypass_state()
+            if not bypass_reads and self.name in instance_dict:
+                return instance_dict[self.name]
+
+            value = self.cached_function((obj,), {})
+            if not bypass_writes:
+                instance_dict[self.name] = value
+            return value
+
+        def __delete__(self, obj):
+            self.invalidate(obj)
+
+        def invalidate(self, obj):
+            """
+            Clears the value memoized on the instance, and the one in the cache.
+            :param obj: The instance.
+            :rtype: None
+            """
+            self._get_instance_dict(obj).pop(self.name, None)
+            self.cached_function.invalidate((obj,), {})
+
+        def refresh(self, obj):
+            """
+            Recomputes the value, and overwrites the one memoized on the instance and the one in the cache.
+            :param obj: The instance.
+            :return: The new value.
+            """
+            value = self.cached_function.refresh((obj,), {})
+            self._get_instance_dict(obj)[self.name] = value
+            return value
+
+        def get_cache_keys(self, obj):
+            return self.cached_function.get_cache_keys((obj,), {})
+
+        def _get_instance_dict(self, obj):
+            try:
+                return obj.__dict__
+            except AttributeError:
+                raise TypeError(
+                    f"No __dict__ attribute on {type(obj).__name__} instance to memoize the {self.name} property in"
+                ) from None
 
     return wrapper
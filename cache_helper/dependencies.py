@@ -0,0 +1,160 @@
+"""
+Dependency tracking between nested cached calls, enabled by the CACHE_HELPER_TRACK_DEPENDENCIES setting.
+
+While a cached function computes, the keys of the cached calls it makes are collected, whether they hit or not. Once
+its result is saved, its key is added to the dependents of each of those keys, kept in the cache next to them under
+`<key>:dependents` in the default cache as a dict mapping each dependent key to when its entry expires and the key name
+of its function. Invalidating a key then also deletes its dependents, their own dependents, and so on, level by level.
+Dependents are deleted by their function, so that e.g. they are deleted from the right shard, or from the default cache
+if their function isn't defined in this process.
+
+The dependents of every key read by a call are updated with one `get_many` and one `set_many`, however many cached
+calls it made. Updates are not atomic, so concurrent saves of results that depend on the same key can lose each other's
+dependency, in which case the lost dependent just lives until its timeout as it would without tracking.
+"""
+import contextlib
+import math
+import time
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+# Invalidations cascade through at most this many levels of dependents
+MAX_CASCADE_DEPTH = 10
+
+# Past this many dependents, the ones expiring soonest are forgotten rather than growing the entry forever
+MAX_DEPENDENTS = 1000
+
+# The set of keys read by the innermost cached call computing in the current thread / task
+_dependency_keys = ContextVar("cache_helper_dependency_keys", default=None)
+
+# Every cached function, by key name
+_cached_functions = {}
+
+
+def register(cached_function):
+    """
+    Registers a cached function, so that its entries can be deleted when they are dependents of invalidated ones.
+    """
+    _cached_functions[cached_function.key_name] = cached_function
+
+
+@contextlib.contextmanager
+def track():
+    """
+    Collects the keys of the cached calls made within the block.
+
+    :return: The set of keys, filled as the calls are made.
+    """
+    dependency_keys = set()
+    token = _dependency_keys.set(dependency_keys)
+    try:
+        yield dependency_keys
+    finally:
+        _dependency_keys.reset(token)
+
+
+def record_read(cache_key_hashed):
+    """
+    Records the key of a cached call as a dependency of the cached call computing, if any.
+    """
+    dependency_keys = _dependency_keys.get()
+    if dependency_keys is not None:
+        dependency_keys.add(cache_key_hashed)
+
+
+def get_dependents_key(cache_key_hashed):
+    return f"{cache_key_hashed}:dependents"
+
+
+def save_dependencies(cache_key_hashed, key_name, dependency_keys, timeout):
+    """
+    Adds a key to the dependents of each of the keys it depends on.
+
+    :param cache_key_hashed: The key of the saved entry.
+    :param key_name: The key name of the function it's a result of.
+    :param dependency_keys: The keys of the cached calls made to compute it.
+    :param timeout: The timeout the entry was saved with.
+    """
+    now = time.time()
+    expires_at = None if timeout is None else now + timeout
+    dependents_keys = [
+        get_dependents_key(dependency_key) for dependency_key in dependency_keys
+    ]
+    all_dependents = cache.get_many(dependents_keys)
+
+    updated_dependents = {}
+    for dependents_key in dependents_keys:
+        dependents = {
+            key: (key_expires_at, key_key_name)
+            for key, (key_expires_at, key_key_name) in all_dependents.get(
+                dependents_key, {}
+            ).items()
+            if key_expires_at is None or key_expires_at > now
+        }
+        dependents[cache_key_hashed] = (expires_at, key_name)
+        if len(dependents) > MAX_DEPENDENTS:
+            latest = sorted(
+                dependents.items(),
+                key=lambda item: math.inf if item[1][0] is None else item[1][0],
+            )
+            dependents = dict(latest[-MAX_DEPENDENTS:])
+        updated_dependents[dependents_key] = dependents
+
+    # Every entry is kept as long as its longest lived dependent
+    expirations = [
+        key_expires_at
+        for dependents in updated_dependents.values()
+        for key_expires_at, _ in dependents.values()
+    ]
+    dependents_timeout = (
+        None if None in expirations else math.ceil(max(expirations) - now)
+    )
+    cache.set_many(updated_dependents, dependents_timeout)
+
+
+def get_dependents(cache_keys):
+    """
+    :param cache_keys: The keys being invalidated.
+    :return: A dict mapping the keys of every entry that depends on them, directly or through other entries, to the key
+        name of their function.
+    """
+    seen = set(cache_keys)
+    dependents = {}
+    level = list(cache_keys)
+    for _ in range(MAX_CASCADE_DEPTH):
+        if not level:
+            break
+        all_dependents = cache.get_many(
+            [get_dependents_key(cache_key) for cache_key in level]
+        )
+        now = time.time()
+        level = []
+        for level_dependents in all_dependents.values():
+            for key, (key_expires_at, key_name) in level_dependents.items():
+                if key not in seen and (key_expires_at is None or key_expires_at > now):
+                    seen.add(key)
+                    level.append(key)
+                    dependents[key] = key_name
+    return dependents
+
+
+def invalidate_dependents(cache_keys):
+    """
+    Deletes the entries that depend on the keys, and the dependents of the keys themselves.
+
+    :return: The keys of the deleted dependent entries.
+    """
+    dependents = get_dependents(cache_keys)
+    keys_by_name = {}
+    for key, key_name in dependents.items():
+        keys_by_name.setdefault(key_name, []).append(key)
+    for key_name, keys in keys_by_name.items():
+        cached_function = _cached_functions.get(key_name)
+        if cached_function is None:
+            cache.delete_many(keys)
+        else:
+            cached_function.delete_entries(keys)
+
+    cache.delete_many([get_dependents_key(cache_key) for cache_key in cache_keys])
+    return list(dependents)
@@ -0,0 +1,185 @@
+"""
+A host-local cache tier on disk, for large values that rarely change.
+
+Entries are kept in a SQLite database in WAL mode, so any number of processes on the host can read it concurrently
+while one writes. The total size of the stored values is bounded, and the least recently used entries are evicted
+first once it is exceeded.
+
+Each copy on disk is saved with a random token, which is also saved in the Django cache under the marker key of the
+entry. A copy is only used while its marker holds its token, so that deleting the marker, e.g. when the entry is
+invalidated from another host, invalidates the copies of every host rather than leaving them until they time out.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from cache_helper import settings
+
+# Reads only refresh an entry's last access time when it is older than this many seconds, to avoid a write per read
+ACCESS_TIME_RESOLUTION = 60
+
+EVICTION_BATCH_SIZE = 16
+
+# The total size is only summed up again once this fraction of the maximum size was written since the last check, as
+# summing it scans every entry. Processes can overshoot the maximum size by up to this fraction each in between
+EVICTION_CHECK_FRACTION = 1 / 16
+
+MARKER_SUFFIX = ":disk"
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class DiskCache:
+    """
+    :param path: The path of the SQLite database, which is created if it doesn't exist.
+    :param max_size: The maximum total size of the stored values in bytes.
+    """
+
+    def __init__(self, path, max_size=1024 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._written_size = 0
+
+    @property
+    def connection(self):
+        # Connections can't be shared between threads, nor survive a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key, default=None):
+        now = time.time()
+        row = self.connection.execute(
+            "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return default
+
+        value, expires_at = row
+        if expires_at < now:
+            self.connection.execute(
+                "DELETE FROM entries WHERE key = ? AND expires_at < ?", (key, now)
+            )
+            return default
+
+        self.connection.execute(
+            "UPDATE entries SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+            (now, key, now - ACCESS_TIME_RESOLUTION),
+        )
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout, data=None):
+        """
+        :param data: The value already pickled, if it was.
+        """
+        if data is None:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            return
+
+        now = time.time()
+        expires_at = float("inf") if timeout is None else now + timeout
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(data), len(data), expires_at, now),
+        )
+        self._written_size += len(data)
+        if self._written_size >= self.max_size * EVICTION_CHECK_FRACTION:
+            self._written_size = 0
+            self._evict(now)
+
+    def delete(self, key):
+        self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        self.connection.execute("DELETE FROM entries")
+
+    def _evict(self, now):
+        (total_size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total_size <= self.max_size:
+            return
+
+        self.connection.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        (total_size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        while total_size > self.max_size:
+            candidates = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT ?",
+                (EVICTION_BATCH_SIZE,),
+            ).fetchall()
+            if not candidates:
+                break
+
+            evicted_keys = []
+            for key, size in candidates:
+                if total_size <= self.max_size:
+                    break
+                evicted_keys.append((key,))
+                total_size -= size
+            self.connection.executemany(
+                "DELETE FROM entries WHERE key = ?", evicted_keys
+            )
+
+
+def get_disk_cache():
+    """
+    :return: The process-wide DiskCache configured by the CACHE_HELPER_DISK setting, or None if it isn't configured.
+    """
+    global _instance
+
+    if settings.DISK is None:
+        return None
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = DiskCache(
+                    settings.DISK.get("PATH", "/var/tmp/django_cache_helper.sqlite3"),
+                    settings.DISK.get("MAX_SIZE", 1024 * 1024 * 1024),
+                )
+    return _instance
+
+
+def get_marker_key(cache_key_hashed):
+    return f"{cache_key_hashed}{MARKER_SUFFIX}"
+
+
+def get_marked_key(cache_key):
+    """
+    :return: The key of the entry if the key is the marker of its copies on disk, or else the key itself.
+    """
+    if cache_key.endswith(MARKER_SUFFIX):
+        return cache_key[: -len(MARKER_SUFFIX)]
+    return cache_key
+
+
+def get_disk_timeout(timeout):
+    """
+    :param timeout: The timeout of the entry in the Django cache.
+    :return: The timeout for the entry on disk, capped by the TIMEOUT of the CACHE_HELPER_DISK setting if any.
+    """
+    max_timeout = settings.DISK.get("TIMEOUT")
+    if max_timeout is None:
+        return timeout
+    if timeout is None:
+        return max_timeout
+    return min(timeout, max_timeout)
@@ -4,3 +4,10 @@ class CacheHelperException(Exception):
 
 class CacheKeyCreationError(CacheHelperException):
     pass
+
+
+class GenerationUnavailableError(CacheHelperException):
+    """
+    Raised when building the cache key of a function whose keys include a generation, and the generation can't be
+    retrieved from the cache.
+    """
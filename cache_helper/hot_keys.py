@@ -0,0 +1,147 @@
+"""
+Detection of hot keys, which are promoted into a small per-process cache with a very short timeout so that their reads
+stop landing on a single cache node.
+
+Every read from the Django cache is counted in a count-min sketch, whose counts are halved every `DECAY_EVERY` reads so
+that they reflect recent traffic. A key whose estimated count reaches `THRESHOLD` is promoted along with its value.
+
+Like values read from the Django cache, promoted values are pickled, and each read gets a fresh copy, so that a caller
+mutating its result doesn't change what other callers get. Values of immutable builtin types, serialized values included,
+are kept as they are.
+"""
+import pickle
+import threading
+import time
+
+from cache_helper import settings
+from cache_helper.backends import is_immutable
+from cache_helper.sketches import CountMinSketch
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class HotKeyCache:
+    """
+    :param threshold: The estimated number of recent reads at which a key is promoted.
+    :param timeout: The number of seconds a promoted value is served locally.
+    :param max_entries: The maximum number of promoted keys.
+    :param decay_every: The number of reads after which counts are halved.
+    """
+
+    def __init__(self, threshold=100, timeout=1, max_entries=256, decay_every=10000):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.decay_every = decay_every
+        self.sketch = CountMinSketch()
+        self._reads = 0
+        # Maps each promoted key to a tuple of (expires at, function name, stored value, whether it is pickled)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, cache_key_hashed, default=None):
+        entry = self._entries.get(cache_key_hashed)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        _, _, stored_value, pickled = entry
+        return pickle.loads(stored_value) if pickled else stored_value
+
+    def record_read(self, cache_key_hashed, func_name, value):
+        """
+        Counts a read of the key from the Django cache, and promotes it if it is hot.
+        """
+        # Counts are updated without a lock, since losing the odd concurrent increment is fine for an estimate
+        estimate = self.sketch.add(cache_key_hashed)
+        self._reads += 1
+        if self._reads >= self.decay_every:
+            self._reads = 0
+            self.sketch.decay()
+
+        if estimate >= self.threshold:
+            self._promote(cache_key_hashed, func_name, value)
+
+    def _promote(self, cache_key_hashed, func_name, value):
+        pickled = not is_immutable(value)
+        stored_value = (
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL) if pickled else value
+        )
+        now = time.monotonic()
+        with self._lock:
+            if (
+                cache_key_hashed not in self._entries
+                and len(self._entries) >= self.max_entries
+            ):
+                self._evict(now)
+                if len(self._entries) >= self.max_entries:
+                    return
+            self._entries[cache_key_hashed] = (
+                now + self.timeout,
+                func_name,
+                stored_value,
+                pickled,
+            )
+
+    def _evict(self, now):
+        expired_keys = [
+            key
+            for key, (expires_at, _, _, _) in self._entries.items()
+            if expires_at < now
+        ]
+        for key in expired_keys:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            # Make room by dropping the key promoted the longest ago
+            del self._entries[next(iter(self._entries))]
+
+    def delete(self, cache_key_hashed):
+        with self._lock:
+            self._entries.pop(cache_key_hashed, None)
+
+    def get_hot_keys(self):
+        """
+        :return: A list of dicts describing the currently promoted keys, most read first.
+        """
+        now = time.monotonic()
+        hot_keys = [
+            {
+                "key": key,
+                "function": func_name,
+                "estimated_reads": self.sketch.estimate(key),
+                "expires_in": expires_at - now,
+            }
+            for key, (expires_at, func_name, _, _) in list(self._entries.items())
+            if expires_at >= now
+        ]
+        return sorted(
+            hot_keys, key=lambda hot_key: hot_key["estimated_reads"], reverse=True
+        )
+
+
+def get_hot_key_cache():
+    """
+    :return: The process-wide HotKeyCache configured by the CACHE_HELPER_HOT_KEYS setting, or None if it isn't
+    configured.
+    """
+    global _instance
+
+    if settings.HOT_KEYS is None:
+        return None
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = HotKeyCache(
+                    settings.HOT_KEYS.get("THRESHOLD", 100),
+                    settings.HOT_KEYS.get("TIMEOUT", 1),
+                    settings.HOT_KEYS.get("MAX_ENTRIES", 256),
+                    settings.HOT_KEYS.get("DECAY_EVERY", 10000),
+                )
+    return _instance
+
+
+def get_hot_keys():
+    """
+    :return: The keys currently promoted in this process, see `HotKeyCache.get_hot_keys`.
+    """
+    hot_key_cache = get_hot_key_cache()
+    return [] if hot_key_cache is None else hot_key_cache.get_hot_keys()
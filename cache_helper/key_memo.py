@@ -0,0 +1,79 @@
+"""
+A bounded LRU of the cache keys built for calls whose arguments are all of immutable builtin types, so that functions
+called over and over with the same small arguments skip binding them to the signature, walking them and hashing the
+key on repeat calls.
+
+Arguments are memoized along with their types, since e.g. `1`, `True` and `1.0` are equal and hash the same, but don't
+produce the same cache key.
+"""
+import threading
+from collections import OrderedDict
+
+_SCALAR_TYPES = frozenset((int, float, str, bytes, bool, type(None)))
+
+
+def _get_typed_value(value):
+    """
+    :return: A hashable representation of the value that includes its type and the types of any nested items, or None
+    if it isn't made of immutable builtin types only.
+    """
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES:
+        # 0.0 and -0.0 are equal but produce different cache keys
+        return value_type, repr(value) if value_type is float else value
+    if value_type is tuple:
+        items = tuple(_get_typed_value(item) for item in value)
+        if None in items:
+            return None
+        return value_type, items
+    return None
+
+
+def get_memo_key(args, kwargs):
+    """
+    :param args: The args passed into the function.
+    :param kwargs: The kwargs passed into the function.
+
+    :return: A hashable key for the call, or None if any of the arguments is mutable or not of a builtin type, in which
+    case its cache key can't be memoized.
+    """
+    typed_args = _get_typed_value(args)
+    if typed_args is None:
+        return None
+    if not kwargs:
+        return typed_args, ()
+    typed_kwargs = _get_typed_value(tuple(kwargs.items()))
+    if typed_kwargs is None:
+        return None
+    return typed_args, typed_kwargs
+
+
+class KeyMemo:
+    """
+    :param max_entries: The maximum number of memoized calls, past which the least recently used are dropped.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, memo_key):
+        """
+        :return: The memoized tuple of the hashed and non-hashed cache keys for the call, or None.
+        """
+        with self._lock:
+            keys = self._keys.get(memo_key)
+            if keys is not None:
+                self._keys.move_to_end(memo_key)
+            return keys
+
+    def set(self, memo_key, keys):
+        with self._lock:
+            self._keys[memo_key] = keys
+            self._keys.move_to_end(memo_key)
+            if len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,11 @@
+"""
+A load-test harness for the decorators, to reproduce stampedes, lock contention and backend slowness that tests
+against the local memory cache can't. See `cache_helper.loadtest.server` for the memcached stand-in and
+`cache_helper.loadtest.runner` for the load test itself, or run
+
+    python -m cache_helper.loadtest --help
+
+The harness needs a memcached client for Django, pymemcache by default, which the `loadtest` extra installs:
+
+    pip install django-cache-helper[loadtest]
+"""
@@ -0,0 +1,125 @@
+"""
+Runs a load test against a fake memcached server, e.g.
+
+    python -m cache_helper.loadtest --processes 4 --threads 16 --latency 0.001,0.005 --error-rate 0.01
+"""
+import argparse
+import importlib.util
+import json
+
+from cache_helper.loadtest.runner import (
+    PYMEMCACHE_BACKEND,
+    LoadTestConfig,
+    configure_django,
+    run_load_test,
+)
+from cache_helper.loadtest.server import (
+    FakeMemcachedServer,
+    parse_latency,
+    start_subprocess_server,
+)
+
+
+def parse_option(value):
+    """
+    :param value: A "name=value" decorator option, whose value is parsed as JSON if possible.
+    """
+    name, _, value = value.partition("=")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load tests the cache_helper decorators."
+    )
+    parser.add_argument(
+        "--server",
+        default="thread",
+        help='"thread", "subprocess", or the host:port of a server',
+    )
+    parser.add_argument("--backend", default=PYMEMCACHE_BACKEND)
+    parser.add_argument(
+        "--latency",
+        type=parse_latency,
+        default=0,
+        help='seconds per command, or a "low,high" range',
+    )
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--eviction-rate", type=float, default=0)
+    parser.add_argument(
+        "--processes", type=int, default=0, help="0 to run the threads in this process"
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=1000, help="per thread")
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--key-skew", type=float, default=1.0)
+    parser.add_argument("--compute-seconds", type=float, default=0.01)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument(
+        "--option",
+        type=parse_option,
+        action="append",
+        default=[],
+        help='a decorator option, e.g. "jitter=0.1"',
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if args.backend == PYMEMCACHE_BACKEND and not importlib.util.find_spec(
+        "pymemcache"
+    ):
+        parser.error(
+            "pymemcache is not installed, install it with `pip install django-cache-helper[loadtest]` or pick "
+            "another --backend"
+        )
+
+    server = None
+    server_process = None
+    if args.server == "thread":
+        server = FakeMemcachedServer(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            eviction_rate=args.eviction_rate,
+        ).start()
+        location = server.location
+    elif args.server == "subprocess":
+        server_process, location = start_subprocess_server(
+            args.latency, args.error_rate, args.eviction_rate
+        )
+    else:
+        location = args.server
+
+    try:
+        configure_django(args.backend, location)
+        config = LoadTestConfig(
+            location=location,
+            backend=args.backend,
+            processes=args.processes,
+            threads=args.threads,
+            calls=args.calls,
+            key_count=args.keys,
+            key_skew=args.key_skew,
+            compute_seconds=args.compute_seconds,
+            value_size=args.value_size,
+            timeout=args.timeout,
+            options=dict(args.option),
+            seed=args.seed,
+        )
+        report = run_load_test(config)
+    finally:
+        if server is not None:
+            server.stop()
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Drives a cached function from many threads and processes, and reports throughput, latency percentiles, how many times
+each key was computed, the exceptions callers saw, and the errors the decorators handled.
+
+The function under load is built by `make_workload`: it sleeps for `compute_seconds` to stand in for real work, counts
+its computations per key, and is decorated with `cached` and the given options. Keys are drawn from a Zipf
+distribution, so that a few hot keys get most of the calls, as in production traffic. Each load test uses keys of its
+own, so it starts with a cold cache.
+
+Worker processes are spawned rather than forked, and configure Django themselves with a memcached backend pointed at
+the server under test. With `processes=0`, the threads run in the current process against its own Django cache.
+"""
+import collections
+import logging
+import math
+import multiprocessing
+import queue
+import random
+import threading
+import time
+import uuid
+
+from cache_helper.loadtest.server import get_server_stats
+
+PYMEMCACHE_BACKEND = "django.core.cache.backends.memcached.PyMemcacheCache"
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LoadTestConfig:
+    """
+    :param location: The "host:port" of the memcached server that worker processes use, whose stats are included in
+        the report.
+    :param backend: The Django cache backend that worker processes use.
+    :param processes: The number of worker processes, or 0 to run the threads in the current process.
+    :param threads: The number of threads per process.
+    :param calls: The number of calls each thread makes.
+    :param key_count: The number of distinct keys.
+    :param key_skew: The exponent of the Zipf distribution of keys, 0 for uniform.
+    :param compute_seconds: How long each computation takes.
+    :param value_size: The size of the computed values in bytes.
+    :param timeout: The timeout of the cached function.
+    :param options: Options for the `cached` decorator, e.g. {"jitter": 0.1}. They must be picklable.
+    :param seed: Seeds the choice of keys.
+    """
+
+    def __init__(
+        self,
+        location=None,
+        backend=PYMEMCACHE_BACKEND,
+        processes=0,
+        threads=8,
+        calls=1000,
+        key_count=100,
+        key_skew=1.0,
+        compute_seconds=0.01,
+        value_size=100,
+        timeout=60,
+        options=None,
+        seed=None,
+    ):
+        self.location = location
+        self.backend = backend
+        self.processes = processes
+        self.threads = threads
+        self.calls = calls
+        self.key_count = key_count
+        self.key_skew = key_skew
+        self.compute_seconds = compute_seconds
+        self.value_size = value_size
+        self.timeout = timeout
+        self.options = options or {}
+        self.seed = seed
+
+
+class _WarningCounter(logging.Handler):
+    """
+    Counts the warnings cache_helper logs about the errors it handled, by message without the cache key. Being a
+    handler of the cache_helper logger, it also keeps their tracebacks from flooding stderr.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.warnings = collections.Counter()
+
+    def emit(self, record):
+        self.warnings[record.getMessage().split(":")[0]] += 1
+
+
+class LoadTestReport:
+    def __init__(
+        self, seconds, latencies, computations, errors, warnings, server_stats=None
+    ):
+        """
+        :param seconds: The wall clock duration of the load test.
+        :param latencies: The duration of every call in seconds.
+        :param computations: A Counter of the computations of each key.
+        :param errors: A Counter of the exceptions raised to callers, by exception type.
+        :param warnings: A Counter of the warnings logged about handled errors, by message.
+        :param server_stats: The stats of the memcached server, if known.
+        """
+        self.seconds = seconds
+        self.latencies = sorted(latencies)
+        self.computations = computations
+        self.errors = errors
+        self.warnings = warnings
+        self.server_stats = server_stats or {}
+
+    @property
+    def calls(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        return self.calls / self.seconds if self.seconds else 0
+
+    def get_percentile(self, percentile):
+        """
+        :return: The latency at the percentile in seconds, using the nearest rank.
+        """
+        if not self.latencies:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * len(self.latencies)))
+        return self.latencies[rank - 1]
+
+    @property
+    def duplicate_computations(self):
+        """
+        The computations beyond the first of each key, which are all wasted unless their entry expired or was evicted.
+        """
+        return sum(self.computations.values()) - len(self.computations)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "throughput": self.throughput,
+            "latency": {
+                **{
+                    f"p{percentile:g}": self.get_percentile(percentile)
+                    for percentile in PERCENTILES
+                },
+                "max": self.latencies[-1] if self.latencies else None,
+            },
+            "computations": sum(self.computations.values()),
+            "computed_keys": len(self.computations),
+            "duplicate_computations": self.duplicate_computations,
+            "most_computed_keys": self.computations.most_common(5),
+            "errors": dict(self.errors),
+            "warnings": dict(self.warnings),
+            "server": self.server_stats,
+        }
+
+    def format(self):
+        lines = [
+            f"Calls:        {self.calls} in {self.seconds:.2f}s ({self.throughput:.0f}/s)",
+            "Latency:      "
+            + ", ".join(
+                f"p{percentile:g} {self.get_percentile(percentile) * 1000:.2f}ms"
+                for percentile in PERCENTILES
+            )
+            + (f", max {self.latencies[-1] * 1000:.2f}ms" if self.latencies else ""),
+            f"Computations: {sum(self.computations.values())} of {len(self.computations)} keys, "
+            f"{self.duplicate_computations} duplicates",
+        ]
+        if self.duplicate_computations:
+            most_computed = ", ".join(
+                f"{key} x{count}" for key, count in self.computations.most_common(5)
+            )
+            lines.append(f"Most computed keys: {most_computed}")
+        errors = ", ".join(f"{name} x{count}" for name, count in self.errors.items())
+        lines.append(f"Errors raised to callers: {errors or 'none'}")
+        warnings = ", ".join(
+            f"{message} x{count}" for message, count in self.warnings.items()
+        )
+        lines.append(f"Errors handled: {warnings or 'none'}")
+        if self.server_stats:
+            server_stats = ", ".join(
+                f"{name} {self.server_stats.get(name, 0)}"
+                for name in (
+                    "cmd_get",
+                    "get_hits",
+                    "get_misses",
+                    "cmd_set",
+                    "injected_errors",
+                    "injected_evictions",
+                )
+            )
+            lines.append(f"Server:       {server_stats}")
+        return "\n".join(lines)
+
+
+def make_workload(timeout, compute_seconds, value_size, options):
+    """
+    :return: A tuple of the cached workload function, taking a key, and the Counter of its computations per key.
+    """
+    from cache_helper.decorators import cached
+
+    computations = collections.Counter()
+    lock = threading.Lock()
+
+    def compute(run_id, key):
+        with lock:
+            computations[key] += 1
+        if compute_seconds:
+            time.sleep(compute_seconds)
+        return (f"{key}:" * value_size)[:value_size]
+
+    # The same name in every process, so that they all share the same cache keys
+    compute.__module__ = __name__
+    compute.__qualname__ = "workload"
+    return cached(timeout, **options)(compute), computations
+
+
+def get_key_weights(key_count, key_skew):
+    return [1 / (rank**key_skew) for rank in range(1, key_count + 1)]
+
+
+def run_threads(config, run_id, seed_offset=0):
+    """
+    Calls the workload from `config.threads` threads of the current process.
+
+    :param run_id: Identifies the load test, and is part of every cache key.
+
+    :return: A dict of the latencies, computations, errors and warnings.
+    """
+    warning_counter = _WarningCounter()
+    logging.getLogger("cache_helper").addHandler(warning_counter)
+    workload, computations = make_workload(
+        config.timeout, config.compute_seconds, config.value_size, config.options
+    )
+    key_weights = get_key_weights(config.key_count, config.key_skew)
+    latencies = []
+    errors = collections.Counter()
+    lock = threading.Lock()
+    # Threads start calling together, to reproduce stampedes on a cold cache
+    barrier = threading.Barrier(config.threads)
+
+    def run_thread(thread_index):
+        rng = random.Random(
+            None
+            if config.seed is None
+            else f"{config.seed}:{seed_offset}:{thread_index}"
+        )
+        keys = rng.choices(range(config.key_count), key_weights, k=config.calls)
+        thread_latencies = []
+        thread_errors = collections.Counter()
+
+        barrier.wait()
+        for key in keys:
+            start = time.perf_counter()
+            try:
+                workload(run_id, key)
+            except Exception as e:
+                thread_errors[type(e).__name__] += 1
+            thread_latencies.append(time.perf_counter() - start)
+
+        with lock:
+            latencies.extend(thread_latencies)
+            errors.update(thread_errors)
+
+    threads = [
+        threading.Thread(target=run_thread, args=(index,))
+        for index in range(config.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    logging.getLogger("cache_helper").removeHandler(warning_counter)
+
+    return {
+        "latencies": latencies,
+        "computations": computations,
+        "errors": errors,
+        "warnings": warning_counter.warnings,
+    }
+
+
+def configure_django(backend, location):
+    """
+    Configures Django in a process that isn't a Django project, with a default cache using the backend.
+    """
+    import django
+    from django.conf import settings
+
+    if not settings.configured:
+        settings.configure(
+            CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+        )
+        django.setup()
+
+
+def _run_process(config, run_id, process_index, start_barrier, results):
+    configure_django(config.backend, config.location)
+    start_barrier.wait()
+    results.put(run_threads(config, run_id, seed_offset=process_index))
+
+
+def _get_results(processes, result_queue):
+    results = []
+    while len(results) < len(processes):
+        try:
+            results.append(result_queue.get(timeout=1))
+        except queue.Empty:
+            if any(process.exitcode not in (None, 0) for process in processes):
+                raise RuntimeError("A load test process failed") from None
+    return results
+
+
+def run_load_test(config):
+    """
+    :param config: A LoadTestConfig.
+    :return: A LoadTestReport.
+    """
+    run_id = uuid.uuid4().hex
+    initial_server_stats = (
+        None if config.location is None else get_server_stats(config.location)
+    )
+
+    if config.processes == 0:
+        start = time.perf_counter()
+        results = [run_threads(config, run_id)]
+        seconds = time.perf_counter() - start
+    else:
+        context = multiprocessing.get_context("spawn")
+        # Spawning is slow, so only start timing once every process is ready
+        start_barrier = context.Barrier(config.processes + 1)
+        result_queue = context.Queue()
+        processes = [
+            context.Process(
+                target=_run_process,
+                args=(config, run_id, index, start_barrier, result_queue),
+            )
+            for index in range(config.processes)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            start_barrier.wait(timeout=60)
+        except threading.BrokenBarrierError:
+            for process in processes:
+                process.kill()
+            raise RuntimeError("The load test processes failed to start") from None
+        start = time.perf_counter()
+        results = _get_results(processes, result_queue)
+        seconds = time.perf_counter() - start
+        for process in processes:
+            process.join()
+
+    latencies = []
+    computations = collections.Counter()
+    errors = collections.Counter()
+    warnings = collections.Counter()
+    for result in results:
+        latencies.extend(result["latencies"])
+        computations.update(result["computations"])
+        errors.update(result["errors"])
+        warnings.update(result["warnings"])
+
+    server_stats = None
+    if config.location is not None:
+        # Only report what happened during the load test
+        server_stats = {
+            name: value - initial_server_stats.get(name, 0)
+            if name.startswith(("cmd_", "get_", "injected_"))
+            else value
+            for name, value in get_server_stats(config.location).items()
+        }
+
+    return LoadTestReport(
+        seconds, latencies, computations, errors, warnings, server_stats
+    )
@@ -0,0 +1,418 @@
+"""
+A small server speaking the memcached text protocol, standing in for memcached in load tests. It supports the commands
+the Django memcached backends use, and can inject latency, errors and evictions.
+
+Run it in-process:
+
+    with FakeMemcachedServer(latency=(0.001, 0.005), error_rate=0.01) as server:
+        ...  # point a memcached backend at server.location
+
+or in a subprocess, printing "LISTENING <host>:<port>" once it accepts connections:
+
+    python -m cache_helper.loadtest.server --port 11311 --latency 0.002 --eviction-rate 0.05
+"""
+import argparse
+import random
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+# Expiration times larger than this many seconds are absolute Unix timestamps, as in memcached
+MAX_RELATIVE_EXPIRATION = 60 * 60 * 24 * 30
+
+STORAGE_COMMANDS = frozenset(
+    (b"set", b"add", b"replace", b"append", b"prepend", b"cas")
+)
+
+# Used by the load test itself, so never delayed nor failed
+ADMIN_COMMANDS = frozenset((b"stats", b"version", b"flush_all"))
+
+
+class _Entry:
+    __slots__ = ("flags", "expires_at", "cas", "data")
+
+    def __init__(self, flags, expires_at, cas, data):
+        self.flags = flags
+        self.expires_at = expires_at
+        self.cas = cas
+        self.data = data
+
+
+class _ClientError(Exception):
+    pass
+
+
+class FakeMemcachedServer:
+    """
+    :param host: The host to listen on.
+    :param port: The port to listen on, or 0 for any free port.
+    :param latency: Seconds to wait before replying to each command, either fixed or a (low, high) range.
+    :param error_rate: The probability of replying to a command with a SERVER_ERROR instead of running it.
+    :param eviction_rate: The probability of evicting a key when it is read, which then misses.
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=0, error_rate=0, eviction_rate=0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.eviction_rate = eviction_rate
+        self.stats = Counter()
+        self._entries = {}
+        self._cas = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = socketserver.ThreadingTCPServer(
+            (host, port), self._make_handler(), bind_and_activate=False
+        )
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    @property
+    def location(self):
+        """
+        :return: The "host:port" location of the server, as used by the LOCATION of Django memcached backends.
+        """
+        return "{}:{}".format(*self.address)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serves in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="fake_memcached", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with server._lock:
+                    server.stats["total_connections"] += 1
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    if not server._handle_line(line, self.rfile, self.wfile):
+                        return
+
+        return Handler
+
+    def _handle_line(self, line, rfile, wfile):
+        """
+        :return: Whether to keep the connection open.
+        """
+        parts = line.split()
+        if not parts:
+            wfile.write(b"ERROR\r\n")
+            return True
+        command, arguments = parts[0], parts[1:]
+        if command == b"quit":
+            return False
+
+        data = None
+        if command in STORAGE_COMMANDS:
+            try:
+                size = int(arguments[3])
+            except (IndexError, ValueError):
+                wfile.write(b"CLIENT_ERROR bad command line format\r\n")
+                return True
+            data = rfile.read(size + 2)[:size]
+
+        noreply = bool(arguments) and arguments[-1] == b"noreply"
+        if noreply:
+            arguments = arguments[:-1]
+
+        if command not in ADMIN_COMMANDS:
+            self._inject_latency()
+        if (
+            command not in ADMIN_COMMANDS
+            and self.error_rate
+            and random.random() < self.error_rate
+        ):
+            with self._lock:
+                self.stats["injected_errors"] += 1
+            reply = b"SERVER_ERROR injected error\r\n"
+        else:
+            try:
+                reply = self._run(command, arguments, data)
+            except _ClientError as e:
+                reply = b"CLIENT_ERROR " + str(e).encode() + b"\r\n"
+            except (IndexError, ValueError):
+                reply = b"CLIENT_ERROR bad command line format\r\n"
+
+        if not noreply:
+            wfile.write(reply)
+        return True
+
+    def _inject_latency(self):
+        if isinstance(self.latency, (tuple, list)):
+            delay = random.uniform(*self.latency)
+        else:
+            delay = self.latency
+        if delay:
+            time.sleep(delay)
+
+    def _run(self, command, arguments, data):
+        with self._lock:
+            self.stats["cmd_" + command.decode(errors="replace")] += 1
+            if command in (b"get", b"gets"):
+                return self._get(arguments, with_cas=command == b"gets")
+            if command in STORAGE_COMMANDS:
+                return self._store(command, arguments, data)
+            if command == b"delete":
+                return (
+                    b"DELETED\r\n"
+                    if self._pop_live(arguments[0]) is not None
+                    else b"NOT_FOUND\r\n"
+                )
+            if command in (b"incr", b"decr"):
+                return self._increment(
+                    arguments[0], int(arguments[1]) * (1 if command == b"incr" else -1)
+                )
+            if command == b"touch":
+                entry = self._get_live(arguments[0])
+                if entry is None:
+                    return b"NOT_FOUND\r\n"
+                entry.expires_at = self._get_expires_at(int(arguments[1]))
+                return b"TOUCHED\r\n"
+            if command == b"flush_all":
+                self._entries.clear()
+                return b"OK\r\n"
+            if command == b"version":
+                return b"VERSION cache_helper-fake\r\n"
+            if command == b"stats":
+                stats = {**self.stats, "curr_items": len(self._entries)}
+                lines = [
+                    f"STAT {name} {value}\r\n".encode()
+                    for name, value in sorted(stats.items())
+                ]
+                return b"".join(lines) + b"END\r\n"
+        return b"ERROR\r\n"
+
+    def _get(self, keys, with_cas):
+        reply = []
+        for key in keys:
+            entry = self._get_live(key)
+            if (
+                entry is not None
+                and self.eviction_rate
+                and random.random() < self.eviction_rate
+            ):
+                del self._entries[key]
+                self.stats["injected_evictions"] += 1
+                entry = None
+            if entry is None:
+                self.stats["get_misses"] += 1
+                continue
+
+            self.stats["get_hits"] += 1
+            header = b"VALUE %s %d %d" % (key, entry.flags, len(entry.data))
+            if with_cas:
+                header += b" %d" % entry.cas
+            reply.extend((header, b"\r\n", entry.data, b"\r\n"))
+        reply.append(b"END\r\n")
+        return b"".join(reply)
+
+    def _store(self, command, arguments, data):
+        key, flags, expiration = arguments[0], int(arguments[1]), int(arguments[2])
+        entry = self._get_live(key)
+
+        if command == b"add" and entry is not None:
+            return b"NOT_STORED\r\n"
+        if command in (b"replace", b"append", b"prepend") and entry is None:
+            return b"NOT_STORED\r\n"
+        if command == b"cas":
+            if entry is None:
+                return b"NOT_FOUND\r\n"
+            if entry.cas != int(arguments[4]):
+                return b"EXISTS\r\n"
+        if command == b"append":
+            data, flags, expires_at = entry.data + data, entry.flags, entry.expires_at
+        elif command == b"prepend":
+            data, flags, expires_at = data + entry.data, entry.flags, entry.expires_at
+        else:
+            expires_at = self._get_expires_at(expiration)
+
+        self._cas += 1
+        self._entries[key] = _Entry(flags, expires_at, self._cas, data)
+        return b"STORED\r\n"
+
+    def _increment(self, key, delta):
+        entry = self._get_live(key)
+        if entry is None:
+            return b"NOT_FOUND\r\n"
+        try:
+            value = int(entry.data)
+        except ValueError:
+            raise _ClientError(
+                "cannot increment or decrement non-numeric value"
+            ) from None
+
+        # Like memcached, decrementing never goes below 0 and incrementing wraps around at 64 bits
+        value = max(0, value + delta) % 2**64
+        self._cas += 1
+        entry.data = str(value).encode()
+        entry.cas = self._cas
+        return entry.data + b"\r\n"
+
+    def _get_live(self, key):
+        entry = self._entries.get(key)
+        if (
+            entry is not None
+            and entry.expires_at is not None
+            and entry.expires_at <= time.time()
+        ):
+            del self._entries[key]
+            return None
+        return entry
+
+    def _pop_live(self, key):
+        entry = self._get_live(key)
+        if entry is not None:
+            del self._entries[key]
+        return entry
+
+    @staticmethod
+    def _get_expires_at(expiration):
+        if expiration == 0:
+            return None
+        if expiration < 0:
+            return 0
+        if expiration > MAX_RELATIVE_EXPIRATION:
+            return expiration
+        return time.time() + expiration
+
+
+def get_server_stats(location):
+    """
+    :param location: The "host:port" of a memcached server.
+    :return: A dict of the server's stats, as returned by the `stats` command.
+    """
+    host, port = location.rsplit(":", 1)
+    with socket.create_connection((host, int(port)), timeout=10) as connection:
+        connection.sendall(b"stats\r\n")
+        data = b""
+        while not data.endswith(b"END\r\n"):
+            chunk = connection.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+
+    stats = {}
+    for line in data.decode().splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) == 3 and parts[0] == "STAT":
+            stats[parts[1]] = int(parts[2]) if parts[2].isdigit() else parts[2]
+    return stats
+
+
+def flush_server(location):
+    host, port = location.rsplit(":", 1)
+    with socket.create_connection((host, int(port)), timeout=10) as connection:
+        connection.sendall(b"flush_all\r\n")
+        connection.recv(1024)
+
+
+def start_subprocess_server(
+    latency=0, error_rate=0, eviction_rate=0, host="127.0.0.1", port=0
+):
+    """
+    Starts a FakeMemcachedServer in a subprocess, so that it doesn't compete with the load test for the GIL.
+
+    :return: A tuple of the subprocess.Popen and the "host:port" location of the server.
+    """
+    if isinstance(latency, (tuple, list)):
+        latency = "{},{}".format(*latency)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "cache_helper.loadtest.server",
+            "--host",
+            host,
+            "--port",
+            str(port),
+            "--latency",
+            str(latency),
+            "--error-rate",
+            str(error_rate),
+            "--eviction-rate",
+            str(eviction_rate),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith("LISTENING "):
+        process.kill()
+        raise RuntimeError("The fake memcached server failed to start")
+    return process, line.split()[1]
+
+
+def parse_latency(value):
+    """
+    :param value: Seconds, or a "low,high" range of seconds.
+    """
+    if "," in value:
+        low, high = value.split(",")
+        return float(low), float(high)
+    return float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Runs a fake memcached server for load tests."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11311)
+    parser.add_argument(
+        "--latency",
+        type=parse_latency,
+        default=0,
+        help='seconds per command, or a "low,high" range',
+    )
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--eviction-rate", type=float, default=0)
+    args = parser.parse_args(argv)
+
+    server = FakeMemcachedServer(
+        args.host, args.port, args.latency, args.error_rate, args.eviction_rate
+    )
+    print(f"LISTENING {server.location}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
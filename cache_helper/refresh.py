@@ -0,0 +1,68 @@
+"""
+The background pool that `refresh_async` schedules refreshes on.
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from cache_helper import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_refresh_executor():
+    """
+    :return: The process-wide pool of CACHE_HELPER_REFRESH_WORKERS threads, created on first use.
+    """
+    global _executor, _executor_pid
+
+    # Threads don't survive a fork, so a forked process needs a pool of its own
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    settings.REFRESH_WORKERS, thread_name_prefix="cache_helper_refresh"
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def submit_refresh(cached_function, args, kwargs):
+    """
+    Schedules `cached_function.refresh(args, kwargs)` on the background pool, in a copy of the current context so that
+    e.g. `cache_helper.bypass` still applies. Database connections of the worker are closed around the refresh when
+    they are unusable or past CONN_MAX_AGE, as Django does around requests.
+
+    :return: A Future of the refreshed result.
+    """
+    context = contextvars.copy_context()
+    future = get_refresh_executor().submit(
+        context.run, _refresh, cached_function, args, kwargs
+    )
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _refresh(cached_function, args, kwargs):
+    # Workers outlive any request, so nothing else closes the connections they open
+    close_old_connections()
+    try:
+        return cached_function.refresh(args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(
+            "Error refreshing cached value in the background",
+            exc_info=future.exception(),
+        )
@@ -0,0 +1,262 @@
+"""
+Serializers that turn results into bytes before they are handed to the Django cache, to control the format they are
+saved in and to skip pickling large primitive structures. Serialized values are saved in a `SerializedValue` envelope
+holding the bytes of the value prefixed with a byte identifying their serializer, so reads dispatch to the right one
+whatever the current configuration. The envelope pickles to a reference to its class and the bytes, which the backend
+copies as they are.
+
+Only envelopes are decoded, by any function: any other value, bytes included, e.g. saved before the serializer was
+configured, is returned as it is.
+
+The available serializers are:
+
+    "pickle"   Pickle with the highest protocol.
+    "marshal"  Marshal, for primitive structures: None, bools, ints, floats, complex numbers, strings, bytes, and
+               lists / tuples / dicts / sets of those.
+    "json"     JSON, for values that are shared with other languages. Tuples are read back as lists.
+    "raw"      For results that are bytes already, which are saved after their type code without any encoding.
+    "auto"     None, bools, ints, floats, strings and bytes as they are, marshal for other primitive structures, and
+               pickle for everything else.
+
+Custom serializers subclass `Serializer` with a unique `type_code`, and are registered with `register_serializer`.
+"""
+import json
+import marshal
+import pickle
+
+from cache_helper.exceptions import CacheHelperException
+
+# Fixed rather than marshal.version, so that values can be read by any Python version supported
+MARSHAL_VERSION = 4
+
+_MARSHAL_SCALAR_TYPES = frozenset((type(None), bool, int, float, complex, str, bytes))
+_MARSHAL_CONTAINER_TYPES = frozenset((list, tuple, set, frozenset))
+_JSON_SCALAR_TYPES = frozenset((type(None), bool, int, float, str))
+# Saved as they are by the auto serializer, since only envelopes are decoded
+_UNWRAPPED_TYPES = frozenset((type(None), bool, int, float, str, bytes))
+
+_serializers_by_name = {}
+_serializers_by_type_code = {}
+
+
+class SerializationError(CacheHelperException):
+    pass
+
+
+class SerializedValue:
+    """
+    The envelope of a value serialized to bytes, as saved in the cache, which can't be mistaken for a plain result.
+
+    :ivar data: The type code of the serializer, followed by the bytes it produced.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce__(self):
+        return SerializedValue, (self.data,)
+
+
+class Serializer:
+    """
+    Base class of the serializers.
+
+    :cvar type_code: The single byte that values serialized by this serializer start with.
+    """
+
+    type_code = None
+
+    def dumps(self, value):
+        """
+        :return: The value serialized to bytes.
+        :raises SerializationError: If the value can't be serialized.
+        """
+        raise NotImplementedError
+
+    def loads(self, data):
+        """
+        :param data: A memoryview of the bytes returned by `dumps`.
+        """
+        raise NotImplementedError
+
+    def serialize(self, value):
+        """
+        :return: A SerializedValue of the value serialized to bytes, after the type code of the serializer.
+        """
+        return SerializedValue(self.type_code + self.dumps(value))
+
+
+class PickleSerializer(Serializer):
+    type_code = b"p"
+
+    def dumps(self, value):
+        try:
+            return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            raise SerializationError(str(e)) from e
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class MarshalSerializer(Serializer):
+    type_code = b"m"
+
+    def dumps(self, value):
+        # Marshal silently saves subclasses (e.g. enums) and buffers (e.g. bytearrays) as the builtin types, so only
+        # accept values made of the exact builtin types
+        if not _is_primitive(
+            value, _MARSHAL_SCALAR_TYPES, _MARSHAL_CONTAINER_TYPES, any_dict_keys=True
+        ):
+            raise SerializationError(
+                f"{type(value).__name__} is not a primitive structure that marshal can save"
+            )
+        try:
+            return marshal.dumps(value, MARSHAL_VERSION)
+        except ValueError as e:
+            # e.g. nested too deeply
+            raise SerializationError(str(e)) from e
+
+    def loads(self, data):
+        return marshal.loads(data)
+
+
+class JSONSerializer(Serializer):
+    type_code = b"j"
+
+    def dumps(self, value):
+        if not _is_primitive(
+            value, _JSON_SCALAR_TYPES, (list, tuple), any_dict_keys=False
+        ):
+            raise SerializationError(
+                f"{type(value).__name__} is not a primitive structure that JSON can save"
+            )
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(bytes(data))
+
+
+class RawSerializer(Serializer):
+    type_code = b"r"
+
+    def dumps(self, value):
+        if type(value) is not bytes:
+            raise SerializationError(f"{type(value).__name__} is not bytes")
+        return value
+
+    def loads(self, data):
+        return bytes(data)
+
+
+class AutoSerializer(Serializer):
+    """
+    Picks a serializer able to save each value, or leaves the value as it is if it is a scalar of a builtin type.
+    """
+
+    def serialize(self, value):
+        """
+        :return: The value itself if it is a scalar of a builtin type, or else a SerializedValue of the value
+            serialized to bytes.
+        """
+        value_type = type(value)
+        if value_type in _UNWRAPPED_TYPES:
+            return value
+        if _is_primitive(
+            value, _MARSHAL_SCALAR_TYPES, _MARSHAL_CONTAINER_TYPES, any_dict_keys=True
+        ):
+            serializer = _serializers_by_name["marshal"]
+        else:
+            serializer = _serializers_by_name["pickle"]
+        return serializer.serialize(value)
+
+
+def _is_primitive(value, scalar_types, container_types, any_dict_keys):
+    """
+    :param any_dict_keys: Whether dict keys can be of any of the scalar types, rather than strings only.
+    :return: Whether the value is made of the exact scalar and container types given, and dicts.
+    """
+    stack = [value]
+    # The ids of the containers seen, since marshal and JSON can't save recursive structures
+    container_ids = set()
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type in scalar_types:
+            continue
+        if id(item) in container_ids:
+            return False
+        container_ids.add(id(item))
+        if item_type in container_types:
+            stack.extend(item)
+        elif item_type is dict:
+            if any_dict_keys:
+                stack.extend(item)
+            elif any(type(key) is not str for key in item):
+                return False
+            stack.extend(item.values())
+        else:
+            return False
+    return True
+
+
+def register_serializer(name, serializer):
+    """
+    :param name: The name the serializer is selected by, with the `serializer` option or the CACHE_HELPER_SERIALIZER
+        setting.
+    :param serializer: A `Serializer` instance.
+    """
+    if serializer.type_code is not None:
+        if type(serializer.type_code) is not bytes or len(serializer.type_code) != 1:
+            raise ValueError(
+                f"Serializer type code {serializer.type_code!r} is not a single byte"
+            )
+        registered = _serializers_by_type_code.get(serializer.type_code)
+        if registered is not None and registered is not _serializers_by_name.get(name):
+            raise ValueError(
+                f"Serializer type code {serializer.type_code!r} is already registered"
+            )
+        _serializers_by_type_code[serializer.type_code] = serializer
+    _serializers_by_name[name] = serializer
+
+
+def get_serializer(serializer):
+    """
+    :param serializer: A serializer name, a `Serializer` instance, or None.
+    :return: The `Serializer`, or None.
+    """
+    if serializer is None or isinstance(serializer, Serializer):
+        return serializer
+    try:
+        return _serializers_by_name[serializer]
+    except KeyError:
+        raise ValueError(f"Unknown serializer: {serializer}") from None
+
+
+def deserialize(serialized_value):
+    """
+    :param serialized_value: A SerializedValue returned by `Serializer.serialize`.
+    :return: The deserialized value.
+    :raises SerializationError: If the value was saved by a serializer that isn't registered, or can't be read.
+    """
+    data = serialized_value.data
+    serializer = _serializers_by_type_code.get(data[:1])
+    if serializer is None:
+        raise SerializationError(
+            f"No serializer is registered for type code {data[:1]!r}"
+        )
+    try:
+        return serializer.loads(memoryview(data)[1:])
+    except SerializationError:
+        raise
+    except Exception as e:
+        raise SerializationError(str(e)) from e
+
+
+register_serializer("pickle", PickleSerializer())
+register_serializer("marshal", MarshalSerializer())
+register_serializer("json", JSONSerializer())
+register_serializer("raw", RawSerializer())
+register_serializer("auto", AutoSerializer())
@@ -1,3 +1,70 @@
 from django.conf import settings
 
 MAX_DEPTH = getattr(settings, "CACHE_HELPER_MAX_DEPTH", 10)
+
+# When True, every cached function calls through to the underlying function without touching the cache
+BYPASS = getattr(settings, "CACHE_HELPER_BYPASS", False)
+
+# Default for the `jitter` option of the decorators: either a fraction of the timeout (e.g. 0.1 for +/- 10%) or a
+# (low, high) tuple of seconds added to the timeout
+JITTER = getattr(settings, "CACHE_HELPER_JITTER", None)
+
+# Either "uniform" or "triangular" (jittered timeouts concentrated around the middle of the range)
+JITTER_DISTRIBUTION = getattr(settings, "CACHE_HELPER_JITTER_DISTRIBUTION", "uniform")
+
+# When True, the jittered timeout is derived from the cache key, so the same key always gets the same timeout
+JITTER_DETERMINISTIC = getattr(settings, "CACHE_HELPER_JITTER_DETERMINISTIC", False)
+
+# With adaptive timeouts, the factor an entry's timeout grows by each time its recomputed value is unchanged
+ADAPTIVE_TIMEOUT_GROWTH = getattr(settings, "CACHE_HELPER_ADAPTIVE_TIMEOUT_GROWTH", 2)
+
+# With adaptive timeouts, an entry is kept one more timeout for each of these many seconds it took to compute
+ADAPTIVE_TIMEOUT_COST_SECONDS = getattr(
+    settings, "CACHE_HELPER_ADAPTIVE_TIMEOUT_COST_SECONDS", 1
+)
+
+# When replaying a streamed result, the number of chunks fetched with each get_many
+STREAM_PREFETCH_CHUNKS = getattr(settings, "CACHE_HELPER_STREAM_PREFETCH_CHUNKS", 4)
+
+# Configures the host-local shared memory tier used by decorators with `shared_memory=True`, e.g.
+# {"PATH": "/dev/shm/django_cache_helper", "SLOTS": 4096, "SLOT_SIZE": 4096, "TIMEOUT": 5}
+SHARED_MEMORY = getattr(settings, "CACHE_HELPER_SHARED_MEMORY", None)
+
+# Configures the host-local disk tier used by decorators with `disk=True`, e.g.
+# {"PATH": "/var/tmp/django_cache_helper.sqlite3", "MAX_SIZE": 1024 ** 3, "MIN_SIZE": 64 * 1024, "TIMEOUT": None}
+DISK = getattr(settings, "CACHE_HELPER_DISK", None)
+
+# Dotted path to a tracing hook, see `cache_helper.tracing`
+TRACE_HOOK = getattr(settings, "CACHE_HELPER_TRACE_HOOK", None)
+
+# When True, the number of calls, hits and distinct keys of each cached function are tracked in `cache_helper.stats`
+TRACK_KEY_CARDINALITY = getattr(settings, "CACHE_HELPER_TRACK_KEY_CARDINALITY", False)
+
+# Enables hot key detection, promoting frequently read keys into a small per-process cache, e.g.
+# {"THRESHOLD": 100, "TIMEOUT": 1, "MAX_ENTRIES": 256, "DECAY_EVERY": 10000}
+HOT_KEYS = getattr(settings, "CACHE_HELPER_HOT_KEYS", None)
+
+# Default for the `serializer` option of the decorators, the name of a serializer from `cache_helper.serializers` such as
+# "auto". When None, values are handed to the Django cache as they are
+SERIALIZER = getattr(settings, "CACHE_HELPER_SERIALIZER", None)
+
+# The number of threads of the background pool that `refresh_async` schedules refreshes on
+REFRESH_WORKERS = getattr(settings, "CACHE_HELPER_REFRESH_WORKERS", 4)
+
+# Default for the `max_age` option of decorators with `sliding=True`: the number of seconds after which an entry is
+# recomputed however recently it was read
+SLIDING_MAX_AGE = getattr(settings, "CACHE_HELPER_SLIDING_MAX_AGE", 24 * 60 * 60)
+
+# The format of cache keys, one of `cache_helper.utils.KEY_FORMAT_VERSIONS`. Version 2 gives different keys to arguments
+# that share a key in version 1, e.g. 1 and "1". Changing it makes every key new, see LEGACY_KEY_FORMAT_VERSIONS
+KEY_FORMAT_VERSION = getattr(settings, "CACHE_HELPER_KEY_FORMAT_VERSION", 1)
+
+# While migrating to a new KEY_FORMAT_VERSION, the previous versions whose keys are read when the new key misses. Values
+# found there are copied forward to the new key
+LEGACY_KEY_FORMAT_VERSIONS = getattr(
+    settings, "CACHE_HELPER_LEGACY_KEY_FORMAT_VERSIONS", ()
+)
+
+# When True, the keys of the cached calls made while a cached function computes are recorded as its dependencies, so
+# that invalidating one of them also invalidates its result. See `cache_helper.dependencies`
+TRACK_DEPENDENCIES = getattr(settings, "CACHE_HELPER_TRACK_DEPENDENCIES", False)
@@ -0,0 +1,73 @@
+"""
+Client-side sharding of a function's keys across several Django cache aliases, for decorators with `shards=[...]`.
+
+Keys are mapped to aliases with consistent hashing: each alias is placed at many points of a ring, and a key belongs to
+the alias of the first point after its own hash. Adding or removing an alias only remaps the keys between its points
+and the previous ones, about 1 / N of the keys for N aliases, while the others keep their alias and their cached value.
+"""
+import bisect
+import threading
+from hashlib import blake2b
+
+# The number of points of each alias on the ring. More points spread keys more evenly between aliases
+VIRTUAL_NODES = 160
+
+_rings = {}
+_rings_lock = threading.Lock()
+
+
+def _hash(value):
+    return int.from_bytes(blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    :param aliases: The Django cache aliases to spread keys across.
+    :param virtual_nodes: The number of points of each alias on the ring.
+    """
+
+    def __init__(self, aliases, virtual_nodes=VIRTUAL_NODES):
+        if not aliases:
+            raise ValueError("A hash ring needs at least one cache alias")
+        points = sorted(
+            (_hash(f"{alias}:{index}"), alias)
+            for alias in aliases
+            for index in range(virtual_nodes)
+        )
+        self.aliases = tuple(aliases)
+        self._positions = [position for position, _ in points]
+        self._point_aliases = [alias for _, alias in points]
+
+    def get_alias(self, cache_key):
+        """
+        :return: The alias the key belongs to.
+        """
+        index = bisect.bisect(self._positions, _hash(cache_key))
+        # Past the last point, the ring wraps around to the first one
+        return self._point_aliases[index % len(self._positions)]
+
+    def group_by_alias(self, cache_keys, get_routing_key=None):
+        """
+        :param get_routing_key: Optional function that takes a key and returns the key it is routed by, for keys that
+            belong with another one, e.g. the marker of an entry's copies on disk.
+        :return: A dict mapping aliases to the keys that belong to them.
+        """
+        keys_by_alias = {}
+        for cache_key in cache_keys:
+            routing_key = (
+                cache_key if get_routing_key is None else get_routing_key(cache_key)
+            )
+            keys_by_alias.setdefault(self.get_alias(routing_key), []).append(cache_key)
+        return keys_by_alias
+
+
+def get_hash_ring(aliases):
+    """
+    :return: The process-wide HashRing of the aliases, so that functions sharded across the same aliases share one.
+    """
+    aliases = tuple(aliases)
+    ring = _rings.get(aliases)
+    if ring is None:
+        with _rings_lock:
+            ring = _rings.setdefault(aliases, HashRing(aliases))
+    return ring
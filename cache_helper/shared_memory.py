@@ -0,0 +1,173 @@
+"""
+A host-local cache tier shared by every process on the host, e.g. all the workers of a gunicorn server.
+
+Values live in a fixed-size hash table in a memory-mapped file (by default under /dev/shm, so it never touches disk).
+Each key hashes to exactly one slot, and a newer value simply replaces whatever occupied the slot. Slots are written
+without locks, using a version counter that is odd while a write is in progress (a seqlock) plus a checksum of the
+data, so readers detect and ignore slots that are being written concurrently or were torn by racing writers.
+"""
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from hashlib import blake2b
+
+from cache_helper import settings
+
+# version, expires at (epoch seconds), checksum of the data, key digest, data length
+SLOT_HEADER = struct.Struct("<QdQ16sI")
+SLOT_HEADER_SIZE = 48
+KEY_DIGEST_SIZE = 16
+
+logger = logging.getLogger(__name__)
+
+# Stands for a tier that couldn't be set up, so that this process doesn't try again on every call
+_UNAVAILABLE = object()
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class SharedMemoryCache:
+    """
+    :param path: The path of the memory-mapped file, which is created if it doesn't exist.
+    :param slot_count: The number of slots in the hash table.
+    :param slot_size: The size of each slot in bytes, including a 48 byte header. Larger values are not cached.
+    """
+
+    def __init__(self, path, slot_count=4096, slot_size=4096):
+        self.path = path
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - SLOT_HEADER_SIZE
+
+        size = slot_count * slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(
+                fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE
+            )
+        finally:
+            os.close(fd)
+
+    def _locate(self, key):
+        key_digest = blake2b(key.encode("utf-8"), digest_size=KEY_DIGEST_SIZE).digest()
+        slot_index = int.from_bytes(key_digest[:8], "little") % self.slot_count
+        return slot_index * self.slot_size, key_digest
+
+    def get(self, key, default=None):
+        offset, key_digest = self._locate(key)
+        (
+            version,
+            expires_at,
+            checksum,
+            slot_key_digest,
+            length,
+        ) = SLOT_HEADER.unpack_from(self._map, offset)
+        if (
+            version % 2
+            or slot_key_digest != key_digest
+            or expires_at < time.time()
+            or length > self.max_value_size
+        ):
+            return default
+
+        data_offset = offset + SLOT_HEADER_SIZE
+        data = self._map[data_offset : data_offset + length]
+        if (
+            struct.unpack_from("<Q", self._map, offset)[0] != version
+            or zlib.crc32(data) != checksum
+        ):
+            # The slot was written to while it was being read
+            return default
+
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout):
+        """
+        :return: Whether the value was saved, which it isn't if it is larger than a slot.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_value_size:
+            return False
+
+        offset, key_digest = self._locate(key)
+        self._write(offset, key_digest, time.time() + timeout, data)
+        return True
+
+    def delete(self, key):
+        offset, key_digest = self._locate(key)
+        if SLOT_HEADER.unpack_from(self._map, offset)[3] == key_digest:
+            self._write(offset, key_digest, 0, b"")
+
+    def clear(self):
+        for slot_index in range(self.slot_count):
+            offset = slot_index * self.slot_size
+            self._write(offset, bytes(KEY_DIGEST_SIZE), 0, b"")
+
+    def _write(self, offset, key_digest, expires_at, data):
+        version = struct.unpack_from("<Q", self._map, offset)[0]
+        # Round up to the next odd version, marking the slot as being written
+        writing_version = version + 1 if version % 2 == 0 else version + 2
+        struct.pack_into("<Q", self._map, offset, writing_version)
+
+        data_offset = offset + SLOT_HEADER_SIZE
+        self._map[data_offset : data_offset + len(data)] = data
+        SLOT_HEADER.pack_into(
+            self._map,
+            offset,
+            writing_version,
+            expires_at,
+            zlib.crc32(data),
+            key_digest,
+            len(data),
+        )
+        struct.pack_into("<Q", self._map, offset, writing_version + 1)
+
+
+def get_shared_memory_cache():
+    """
+    :return: The process-wide SharedMemoryCache configured by the CACHE_HELPER_SHARED_MEMORY setting, or None if it
+    isn't configured, or if its file can't be opened, in which case the tier is disabled for the process.
+    """
+    global _instance
+
+    if settings.SHARED_MEMORY is None:
+        return None
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                path = settings.SHARED_MEMORY.get(
+                    "PATH", "/dev/shm/django_cache_helper"
+                )
+                try:
+                    _instance = SharedMemoryCache(
+                        path,
+                        settings.SHARED_MEMORY.get("SLOTS", 4096),
+                        settings.SHARED_MEMORY.get("SLOT_SIZE", 4096),
+                    )
+                except OSError:
+                    logger.warning(
+                        f"Error opening shared memory at {path}, disabling the shared memory tier",
+                        exc_info=True,
+                    )
+                    _instance = _UNAVAILABLE
+    return None if _instance is _UNAVAILABLE else _instance
+
+
+def get_shared_memory_timeout(timeout):
+    """
+    :param timeout: The timeout of the entry in the Django cache.
+    :return: The timeout for the entry in shared memory, which is capped so that hosts don't serve stale values for
+    long after an entry is invalidated elsewhere.
+    """
+    max_timeout = settings.SHARED_MEMORY.get("TIMEOUT", 5)
+    if timeout is None:
+        return max_timeout
+    return min(timeout, max_timeout)
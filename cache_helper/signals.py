@@ -0,0 +1,320 @@
+import logging
+import threading
+from functools import partial
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from cache_helper import dependencies, settings, streaming
+from cache_helper.exceptions import GenerationUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Invalidations waiting for the surrounding transaction to commit, keyed by database alias
+_pending = threading.local()
+
+# The pks related to instances whose relation is being cleared, from `pre_clear` until `post_clear`
+_clearing = threading.local()
+
+M2M_ACTIONS = {"post_add", "post_remove", "post_clear"}
+
+# Maps each (through model, dependency model) pair to the (cached function, get_affected_args) pairs depending on it
+_m2m_dependents = {}
+
+# The m2m_changed connections waiting for the app registry to be ready, see `_connect_deferred_m2m_changed`
+_deferred_m2m_dependencies = []
+_m2m_lock = threading.Lock()
+
+
+class _PendingInvalidations:
+    def __init__(self, using):
+        # Hashed cache keys to delete, by cached function
+        self.cache_keys = {}
+        # Cached functions whose generation should be bumped
+        self.generations = set()
+        # The on_commit callback flushing the invalidations, registered once for all of them
+        self.flush = partial(_flush, using)
+        self.scheduled = False
+        # The list of on_commit callbacks of the connection in which the flush was last seen
+        self.run_on_commit = None
+
+    def is_scheduled(self, connection):
+        """
+        :return: Whether the flush is still registered to run on commit. Django drops the callbacks of a rolled back
+            transaction or savepoint, along with the changes the invalidations were for.
+        """
+        if not self.scheduled:
+            return False
+        # Django replaces the list whenever it drops callbacks, so it only needs to be searched then
+        if connection.run_on_commit is self.run_on_commit:
+            return True
+        self.run_on_commit = connection.run_on_commit
+        return any(callback[1] is self.flush for callback in self.run_on_commit)
+
+
+def connect_dependencies(cached_function, depends_on):
+    """
+    Connects `post_save`, `post_delete` and `m2m_changed` handlers that invalidate the results of `cached_function`
+    affected by a changed model instance.
+
+    `depends_on` maps each model (or "app_label.ModelName" string) to a function that takes the changed instance and
+    returns the arguments of the affected results, as an iterable whose items are either a tuple of args or a dict of
+    kwargs. The args are the same as those passed to `invalidate`. Map a model to None instead to invalidate every
+    result of the function whenever any instance of it changes, e.g.
+
+        @cached(60 * 60, depends_on={
+            Company: lambda company: [(company.pk,)],
+            "markets.Exchange": None,
+        })
+        def get_company_summary(company_id):
+            ...
+
+    Invalidations are batched per transaction and applied once it commits, by a single on_commit callback. Those of a
+    rolled back transaction or savepoint are dropped on the next change.
+    """
+    for model, get_affected_args in depends_on.items():
+        if get_affected_args is None:
+            cached_function.uses_generation = True
+
+        receiver = partial(_handle_instance_changed, cached_function, get_affected_args)
+        post_save.connect(receiver, sender=model, weak=False)
+        post_delete.connect(receiver, sender=model, weak=False)
+        with _m2m_lock:
+            if apps.models_ready:
+                _connect_m2m_changed(cached_function, model, get_affected_args)
+            else:
+                if not _deferred_m2m_dependencies:
+                    m2m_changed.connect(_connect_deferred_m2m_changed, weak=False)
+                _deferred_m2m_dependencies.append(
+                    (cached_function, model, get_affected_args)
+                )
+
+
+def _get_m2m_fields(model):
+    """
+    :return: A dict mapping the through models of the many-to-many relations of the model, from either side, to their
+        ManyToManyField.
+    """
+    fields = {}
+    for field in model._meta.get_fields(include_hidden=True):
+        if field.many_to_many and field.is_relation:
+            m2m_field = field if field.concrete else field.field
+            through = getattr(m2m_field.remote_field, "through", None)
+            if through is not None:
+                fields[through] = m2m_field
+    return fields
+
+
+def _connect_m2m_changed(cached_function, dependency_model, get_affected_args):
+    """
+    Registers the function as depending on the many-to-many relations of the model, with one m2m_changed receiver per
+    through model and dependency model, whatever the number of functions depending on them.
+
+    :return: A list of tuples of the through models and receivers that were connected.
+    """
+    if isinstance(dependency_model, str):
+        dependency_model = apps.get_model(dependency_model)
+    connected = []
+    for through, m2m_field in _get_m2m_fields(dependency_model).items():
+        key = (through, dependency_model)
+        if key not in _m2m_dependents:
+            _m2m_dependents[key] = []
+            receiver = partial(_handle_m2m_changed, dependency_model, m2m_field)
+            m2m_changed.connect(receiver, sender=through, weak=False)
+            connected.append((through, receiver))
+        _m2m_dependents[key].append((cached_function, get_affected_args))
+    return connected
+
+
+def _connect_deferred_m2m_changed(sender, **kwargs):
+    """
+    Relations can only be listed once every model is loaded, so functions decorated before, e.g. in a models module,
+    have their m2m_changed receivers connected on the first m2m change, which is then passed on to them.
+    """
+    with _m2m_lock:
+        if not _deferred_m2m_dependencies:
+            return
+        m2m_changed.disconnect(_connect_deferred_m2m_changed)
+        connected = []
+        for (
+            cached_function,
+            dependency_model,
+            get_affected_args,
+        ) in _deferred_m2m_dependencies:
+            connected.extend(
+                _connect_m2m_changed(
+                    cached_function, dependency_model, get_affected_args
+                )
+            )
+        _deferred_m2m_dependencies.clear()
+
+    for through, receiver in connected:
+        if through is sender:
+            receiver(sender=sender, **kwargs)
+
+
+def _handle_instance_changed(
+    cached_function, get_affected_args, sender, instance, using, **kwargs
+):
+    _schedule_invalidation(cached_function, get_affected_args, [instance], using)
+
+
+def _handle_m2m_changed(
+    dependency_model,
+    m2m_field,
+    sender,
+    instance,
+    action,
+    reverse,
+    model,
+    pk_set,
+    using,
+    **kwargs,
+):
+    if model is dependency_model and action == "pre_clear":
+        # Clearing sends no pk_set, so the instances on the other side are looked up before they are unlinked
+        by_instance = getattr(_clearing, "by_instance", None)
+        if by_instance is None:
+            by_instance = _clearing.by_instance = {}
+        by_instance[(sender, dependency_model, id(instance))] = _get_related_pks(
+            m2m_field, instance, reverse, using
+        )
+        return
+    if action not in M2M_ACTIONS:
+        return
+    if model is dependency_model and action == "post_clear":
+        pk_set = getattr(_clearing, "by_instance", {}).pop(
+            (sender, dependency_model, id(instance)), None
+        )
+
+    dependents = _m2m_dependents.get((sender, dependency_model), [])
+    instances = []
+    if isinstance(instance, dependency_model):
+        instances.append(instance)
+    if (
+        model is dependency_model
+        and pk_set
+        and any(args is not None for _, args in dependents)
+    ):
+        # The relation was changed from the other side, so the affected instances are the ones added or removed.
+        # They are fetched once for every function depending on them
+        instances.extend(
+            dependency_model._default_manager.using(using).filter(pk__in=pk_set)
+        )
+
+    if instances or (model is dependency_model and pk_set):
+        for cached_function, get_affected_args in dependents:
+            _schedule_invalidation(cached_function, get_affected_args, instances, using)
+
+
+def _get_related_pks(m2m_field, instance, reverse, using):
+    """
+    :return: The pks of the instances related to the instance through the many-to-many field.
+    """
+    through = m2m_field.remote_field.through
+    source_field = through._meta.get_field(m2m_field.m2m_field_name())
+    target_field = through._meta.get_field(m2m_field.m2m_reverse_field_name())
+    if reverse:
+        source_field, target_field = target_field, source_field
+    return set(
+        through._default_manager.using(using)
+        .filter(**{source_field.attname: instance.pk})
+        .values_list(target_field.attname, flat=True)
+    )
+
+
+def _schedule_invalidation(cached_function, get_affected_args, instances, using):
+    pending_by_alias = getattr(_pending, "by_alias", None)
+    if pending_by_alias is None:
+        pending_by_alias = _pending.by_alias = {}
+    connection = transaction.get_connection(using)
+    pending = pending_by_alias.get(using)
+    if pending is None or not pending.is_scheduled(connection):
+        pending = pending_by_alias[using] = _PendingInvalidations(using)
+
+    if get_affected_args is None:
+        pending.generations.add(cached_function)
+    else:
+        for instance in instances:
+            for affected_args in get_affected_args(instance):
+                try:
+                    if isinstance(affected_args, dict):
+                        cache_keys = cached_function.get_invalidation_keys(
+                            (), affected_args
+                        )
+                    else:
+                        cache_keys = cached_function.get_invalidation_keys(
+                            tuple(affected_args), {}
+                        )
+                except GenerationUnavailableError:
+                    # Logged already, and the results can't be invalidated without their keys
+                    continue
+                pending.cache_keys.setdefault(cached_function, set()).update(cache_keys)
+
+    if not pending.scheduled:
+        pending.scheduled = True
+        # Runs right away outside of a transaction, so only once the invalidations are added
+        transaction.on_commit(pending.flush, using=using)
+        pending.run_on_commit = connection.run_on_commit
+
+
+def _flush(using):
+    pending = getattr(_pending, "by_alias", {}).pop(using, None)
+    if pending is None:
+        return
+
+    for cached_function in pending.generations:
+        try:
+            cached_function.bump_generation()
+        except Exception:
+            logger.warning(
+                f"Error invalidating cache for function: {cached_function.func_name}",
+                exc_info=True,
+            )
+
+    # One delete_many per cache for the keys of every function
+    keys_by_alias = {}
+    for cached_function, cache_keys in pending.cache_keys.items():
+        if cached_function.streaming:
+            # Their chunks are found from their headers
+            try:
+                streaming.delete_streams(cached_function, cache_keys)
+            except Exception:
+                logger.warning(
+                    f"Error invalidating cache for keys: {cache_keys}", exc_info=True
+                )
+            continue
+        for alias, alias_keys in cached_function.group_by_alias(cache_keys).items():
+            keys_by_alias.setdefault(alias, []).extend(alias_keys)
+    for alias, cache_keys in keys_by_alias.items():
+        try:
+            caches[alias].delete_many(cache_keys)
+        except Exception:
+            logger.warning(
+                f"Error invalidating cache for keys: {cache_keys}", exc_info=True
+            )
+
+    # Keys that aren't in the local tiers, like replica and disk marker keys, are just skipped
+    for cached_function, cache_keys in pending.cache_keys.items():
+        try:
+            cached_function.delete_local_copies(cache_keys)
+        except Exception:
+            logger.warning(
+                f"Error invalidating local copies for keys: {cache_keys}", exc_info=True
+            )
+
+    if pending.cache_keys and settings.TRACK_DEPENDENCIES:
+        cache_keys = [
+            cache_key
+            for function_keys in pending.cache_keys.values()
+            for cache_key in function_keys
+        ]
+        try:
+            dependencies.invalidate_dependents(cache_keys)
+        except Exception:
+            logger.warning(
+                f"Error invalidating dependents in Cache for Keys: {cache_keys}",
+                exc_info=True,
+            )
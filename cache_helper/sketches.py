@@ -0,0 +1,108 @@
+"""
+Fixed-size probabilistic sketches used to collect stats about cache keys without storing the keys themselves.
+"""
+import math
+from array import array
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+
+def hash_from_cache_key(cache_key_hashed):
+    """
+    :param cache_key_hashed: A hashed cache key, i.e. a sha256 hex digest.
+    :return: A 64 bit integer hash of the key, taken from the digest itself since it is already uniformly distributed.
+    """
+    return int(cache_key_hashed[:16], 16)
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct keys added to it, using 2 ** precision bytes of memory no matter how many keys
+    are added. The standard error of the estimate is about 1.04 / sqrt(2 ** precision), e.g. 3% for a precision of 10.
+    """
+
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.register_count = 1 << precision
+        self.registers = bytearray(self.register_count)
+        self._alpha = 0.7213 / (1 + 1.079 / self.register_count)
+
+    def add(self, key_hash):
+        """
+        :param key_hash: A 64 bit integer hash of the key, e.g. from `hash_from_cache_key`.
+        """
+        index = key_hash >> (HASH_BITS - self.precision)
+        remaining_bits = (key_hash << self.precision) & HASH_MASK
+        # The position of the first set bit in the remaining bits
+        rank = (
+            HASH_BITS - self.precision + 1
+            if remaining_bits == 0
+            else HASH_BITS - remaining_bits.bit_length() + 1
+        )
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        estimate = (
+            self._alpha
+            * self.register_count**2
+            / sum(2.0**-register for register in self.registers)
+        )
+        empty_registers = self.registers.count(0)
+        if estimate <= 2.5 * self.register_count and empty_registers:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.register_count * math.log(
+                self.register_count / empty_registers
+            )
+        return int(round(estimate))
+
+    def clear(self):
+        self.registers = bytearray(self.register_count)
+
+
+class CountMinSketch:
+    """
+    Estimates how many times each key was added to it, using a fixed `width * depth` counters. Estimates are never
+    lower than the true count, and are higher by at most a small fraction of the total count with high probability.
+
+    Counts can be halved with `decay`, so that the sketch tracks recent rather than all-time frequencies.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [
+            array("L", bytes(array("L").itemsize * width)) for _ in range(depth)
+        ]
+
+    def _get_indexes(self, cache_key_hashed):
+        # Double hashing from two independent parts of the digest
+        first_hash = int(cache_key_hashed[:16], 16)
+        second_hash = int(cache_key_hashed[16:32], 16) | 1
+        return [
+            (first_hash + row_index * second_hash) % self.width
+            for row_index in range(self.depth)
+        ]
+
+    def add(self, cache_key_hashed):
+        """
+        :param cache_key_hashed: A hashed cache key, i.e. a sha256 hex digest.
+        :return: The estimated count of the key, including this addition.
+        """
+        estimate = None
+        for row, index in zip(self.rows, self._get_indexes(cache_key_hashed)):
+            count = row[index] + 1
+            row[index] = count
+            estimate = count if estimate is None else min(estimate, count)
+        return estimate
+
+    def estimate(self, cache_key_hashed):
+        return min(
+            row[index]
+            for row, index in zip(self.rows, self._get_indexes(cache_key_hashed))
+        )
+
+    def decay(self):
+        for row_index, row in enumerate(self.rows):
+            self.rows[row_index] = array("L", (count >> 1 for count in row))
@@ -0,0 +1,71 @@
+"""
+Sliding expiration, for entries that should stay cached for as long as they keep being read.
+
+Entries of functions with `sliding=True` are saved in a `SlidingEntry` envelope recording when they were computed.
+Every hit extends the entry's timeout with `cache.touch`, at most once per key per process every half timeout, so that
+constant reads don't double the traffic to the backend. An entry older than its maximum age is treated as a miss
+however recently it was read, so that its value is recomputed eventually.
+"""
+import threading
+import time
+
+# A key is touched again by the same process once this fraction of the timeout has passed since its last touch
+TOUCH_INTERVAL_FRACTION = 0.5
+
+# Past this many keys, the last touch times are forgotten rather than growing forever
+MAX_TRACKED_KEYS = 10000
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class SlidingEntry:
+    __slots__ = ("value", "created_at")
+
+    def __init__(self, value, created_at):
+        self.value = value
+        self.created_at = created_at
+
+    def __getstate__(self):
+        return self.value, self.created_at
+
+    def __setstate__(self, state):
+        self.value, self.created_at = state
+
+
+class TouchLimiter:
+    """
+    Tracks when this process last touched each key.
+    """
+
+    def __init__(self, max_tracked_keys=MAX_TRACKED_KEYS):
+        self.max_tracked_keys = max_tracked_keys
+        # Maps each key to the monotonic time from which it can be touched again
+        self._next_touches = {}
+
+    def should_touch(self, cache_key_hashed, interval):
+        """
+        :param interval: The minimum number of seconds between touches of the key.
+        :return: Whether the key should be touched now, in which case it is recorded as touched.
+        """
+        now = time.monotonic()
+        if self._next_touches.get(cache_key_hashed, 0) > now:
+            return False
+        if len(self._next_touches) >= self.max_tracked_keys:
+            # Races between threads can only cause the odd extra touch
+            self._next_touches.clear()
+        self._next_touches[cache_key_hashed] = now + interval
+        return True
+
+
+def get_touch_limiter():
+    """
+    :return: The process-wide TouchLimiter.
+    """
+    global _instance
+
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = TouchLimiter()
+    return _instance
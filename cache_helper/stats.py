@@ -0,0 +1,164 @@
+import threading
+from collections import Counter
+
+from cache_helper.sketches import HyperLogLog, hash_from_cache_key
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class FunctionStats:
+    """
+    Counters and observations collected for a single cached function. Updates are cheap, and they only happen where
+    the decorators already do comparatively expensive work, e.g. on misses.
+    """
+
+    def __init__(self, func_name):
+        self.func_name = func_name
+        self.counters = Counter()
+        self.timeouts = _Summary()
+        self.deserialize_seconds = _Summary()
+        self.distinct_keys = HyperLogLog()
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_timeout(self, timeout):
+        """
+        :param timeout: The timeout an entry was saved with, in seconds.
+        """
+        if timeout is not None:
+            with self._lock:
+                self.timeouts.add(timeout)
+
+    def record_deserialization(self, seconds):
+        """
+        :param seconds: How long it took to deserialize a value read from the cache.
+        """
+        with self._lock:
+            self.deserialize_seconds.add(seconds)
+
+    def record_read(self, cache_key_hashed, hit):
+        """
+        Tracks calls, hits and distinct keys, which are compared in `get_cardinality_report`.
+        """
+        key_hash = hash_from_cache_key(cache_key_hashed)
+        with self._lock:
+            self.counters["calls"] += 1
+            if hit:
+                self.counters["hits"] += 1
+            self.distinct_keys.add(key_hash)
+
+    def reset(self):
+        with self._lock:
+            self.counters = Counter()
+            self.timeouts = _Summary()
+            self.deserialize_seconds = _Summary()
+            self.distinct_keys.clear()
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "timeouts": self.timeouts.as_dict(),
+                "deserialize_seconds": self.deserialize_seconds.as_dict(),
+                "distinct_keys": self.distinct_keys.count(),
+            }
+
+
+class _Summary:
+    """
+    Running count / min / max / mean / last of a series of observations.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, observation):
+        self.count += 1
+        self.total += observation
+        self.min = observation if self.min is None else min(self.min, observation)
+        self.max = observation if self.max is None else max(self.max, observation)
+        self.last = observation
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "last": self.last,
+        }
+
+
+def get_function_stats(func_name):
+    """
+    :param func_name: The fully specified name of a cached function.
+    :return: The FunctionStats for the function, created on first use.
+    """
+    try:
+        return _registry[func_name]
+    except KeyError:
+        with _registry_lock:
+            return _registry.setdefault(func_name, FunctionStats(func_name))
+
+
+def get_stats():
+    """
+    :return: A dict mapping the name of every cached function with recorded stats to a dict of its stats.
+    """
+    return {
+        func_name: function_stats.as_dict()
+        for func_name, function_stats in list(_registry.items())
+    }
+
+
+def reset_stats():
+    for function_stats in list(_registry.values()):
+        function_stats.reset()
+
+
+def get_cardinality_report(min_calls=100, max_distinct_ratio=0.9, min_hit_ratio=0.1):
+    """
+    Compares the number of distinct keys each cached function was called with to its number of calls, to find
+    functions called with effectively unique arguments, whose caching does more harm than good. Requires the
+    CACHE_HELPER_TRACK_KEY_CARDINALITY setting.
+
+    :param min_calls: Functions with fewer calls are left out of the report.
+    :param max_distinct_ratio: Functions with a higher ratio of distinct keys to calls are flagged...
+    :param min_hit_ratio: ...if their hit ratio is also lower than this.
+
+    :return: A list of dicts, one per function, with the most distinct keys per call first.
+    """
+    report = []
+    for func_name, function_stats in list(_registry.items()):
+        with function_stats._lock:
+            calls = function_stats.counters["calls"]
+            hits = function_stats.counters["hits"]
+            distinct_keys = function_stats.distinct_keys.count()
+        if calls == 0 or calls < min_calls:
+            continue
+
+        # The estimate can slightly exceed the number of calls
+        distinct_ratio = min(distinct_keys / calls, 1.0)
+        hit_ratio = hits / calls
+        report.append(
+            {
+                "function": func_name,
+                "calls": calls,
+                "hits": hits,
+                "distinct_keys": min(distinct_keys, calls),
+                "distinct_ratio": distinct_ratio,
+                "hit_ratio": hit_ratio,
+                "flagged": distinct_ratio > max_distinct_ratio
+                and hit_ratio < min_hit_ratio,
+            }
+        )
+
+    return sorted(report, key=lambda row: row["distinct_ratio"], reverse=True)
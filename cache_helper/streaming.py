@@ -0,0 +1,216 @@
+"""
+Caching for generator functions.
+
+A streamed result is saved as a `StreamHeader` under the function's cache key, plus one entry per chunk of items. The
+header is only written once the whole stream was consumed and every chunk was saved, so a partially written or
+abandoned stream is never read back. Each write uses its own token in the chunk keys, so concurrent writers of the
+same stream can't mix their chunks.
+"""
+import itertools
+import logging
+import uuid
+import weakref
+
+from django.core.cache import caches
+
+from cache_helper import settings
+
+try:
+    from _pylibmc import Error as CacheSetError
+except ImportError:
+    from cache_helper.exceptions import CacheHelperException as CacheSetError
+
+logger = logging.getLogger(__name__)
+
+
+class StreamHeader:
+    def __init__(self, token, chunk_count):
+        self.token = token
+        self.chunk_count = chunk_count
+
+
+def get_chunk_key(cache_key_hashed, token, index):
+    return f"{cache_key_hashed}:{token}:{index}"
+
+
+def delete_streams(cached_function, cache_keys):
+    """
+    Deletes the streams saved under the keys along with their chunks, which are found from their headers, with one
+    `get_many` and one `delete_many` per Django cache they belong to.
+    """
+    for alias, alias_keys in cached_function.group_by_alias(cache_keys).items():
+        backend = caches[alias]
+        headers = backend.get_many(alias_keys)
+        # Chunks are kept with their header
+        chunk_keys = [
+            get_chunk_key(cache_key_hashed, header.token, index)
+            for cache_key_hashed, header in headers.items()
+            if isinstance(header, StreamHeader)
+            for index in range(header.chunk_count)
+        ]
+        backend.delete_many([*alias_keys, *chunk_keys])
+
+
+def stream(
+    cached_function,
+    args,
+    kwargs,
+    cache_key_hashed,
+    cache_key_string,
+    bypass_reads,
+    bypass_writes,
+):
+    """
+    :return: A generator yielding the items of the cached stream on a hit, or of the function on a miss.
+    """
+    header = None
+    if not bypass_reads:
+        try:
+            header = cached_function.get_cache(cache_key_hashed).get(cache_key_hashed)
+        except Exception:
+            logger.warning(
+                f"Error retrieving value from Cache for Key: {cache_key_string}",
+                exc_info=True,
+            )
+
+    if isinstance(header, StreamHeader):
+        return _replay(
+            cached_function, args, kwargs, cache_key_hashed, cache_key_string, header
+        )
+    if bypass_writes:
+        return cached_function.func(*args, **kwargs)
+    return _compute_and_save(
+        cached_function, args, kwargs, cache_key_hashed, cache_key_string
+    )
+
+
+def within(items, exit_stack):
+    """
+    :param items: An iterable.
+    :param exit_stack: A `contextlib.ExitStack` of contexts that were already entered.
+
+    :return: A generator yielding the items, which exits the contexts once it is exhausted, closed, or garbage
+        collected.
+    """
+
+    def iterate():
+        with exit_stack:
+            try:
+                yield from items
+            except GeneratorExit:
+                # Closing a stream before it is exhausted isn't an error
+                return
+
+    generator = iterate()
+    # Closing a generator that never started doesn't run its body. Closing the stack again once exited does nothing
+    weakref.finalize(generator, exit_stack.close)
+    return generator
+
+
+def _compute_and_save(
+    cached_function, args, kwargs, cache_key_hashed, cache_key_string
+):
+    token = uuid.uuid4().hex
+    timeout = cached_function.get_jittered_timeout(
+        cache_key_hashed, cached_function.timeout
+    )
+    # Chunks are kept with the header, so that they can be fetched together
+    backend = cached_function.get_cache(cache_key_hashed)
+    chunk = []
+    chunk_count = 0
+    saving = True
+
+    for item in cached_function.func(*args, **kwargs):
+        yield item
+
+        if not saving:
+            continue
+        chunk.append(item)
+        if len(chunk) == cached_function.chunk_size:
+            saving = _save_chunk(
+                backend,
+                cache_key_hashed,
+                cache_key_string,
+                token,
+                chunk_count,
+                chunk,
+                timeout,
+            )
+            chunk = []
+            chunk_count += 1
+
+    if not saving:
+        return
+    if chunk:
+        if not _save_chunk(
+            backend,
+            cache_key_hashed,
+            cache_key_string,
+            token,
+            chunk_count,
+            chunk,
+            timeout,
+        ):
+            return
+        chunk_count += 1
+
+    try:
+        backend.set(cache_key_hashed, StreamHeader(token, chunk_count), timeout)
+    except CacheSetError:
+        logger.warning(
+            f"Error saving value to Cache for Key: {cache_key_string}", exc_info=True
+        )
+
+
+def _save_chunk(
+    backend, cache_key_hashed, cache_key_string, token, index, chunk, timeout
+):
+    """
+    :return: Whether the chunk was saved.
+    """
+    try:
+        backend.set(get_chunk_key(cache_key_hashed, token, index), chunk, timeout)
+    except CacheSetError:
+        logger.warning(
+            f"Error saving value to Cache for Key: {cache_key_string}", exc_info=True
+        )
+        return False
+    return True
+
+
+def _replay(cached_function, args, kwargs, cache_key_hashed, cache_key_string, header):
+    items_yielded = 0
+    backend = cached_function.get_cache(cache_key_hashed)
+
+    for batch_start in range(0, header.chunk_count, settings.STREAM_PREFETCH_CHUNKS):
+        batch_end = min(
+            batch_start + settings.STREAM_PREFETCH_CHUNKS, header.chunk_count
+        )
+        chunk_keys = [
+            get_chunk_key(cache_key_hashed, header.token, index)
+            for index in range(batch_start, batch_end)
+        ]
+        try:
+            chunks = backend.get_many(chunk_keys)
+        except Exception:
+            logger.warning(
+                f"Error retrieving value from Cache for Key: {cache_key_string}",
+                exc_info=True,
+            )
+            chunks = {}
+
+        for chunk_key in chunk_keys:
+            chunk = chunks.get(chunk_key)
+            if chunk is None:
+                # A chunk was evicted, so the rest of the stream has to come from the function itself, skipping the
+                # items that were already yielded
+                logger.warning(
+                    f"Missing stream chunk in Cache for Key: {cache_key_string}"
+                )
+                yield from itertools.islice(
+                    cached_function.func(*args, **kwargs), items_yielded, None
+                )
+                return
+
+            yield from chunk
+            items_yielded += len(chunk)
@@ -0,0 +1,197 @@
+"""
+Tracing spans around the work the decorators do, emitted through a pluggable hook so that there is no dependency on
+any tracing library.
+
+A hook is a callable taking a span name and a dict of tags, and returning a context manager that covers the span. The
+tags dict may still be updated by the decorators until the span exits, e.g. with whether the call was a hit, so read
+it on exit. For example, with OpenTelemetry:
+
+    @contextlib.contextmanager
+    def opentelemetry_hook(name, tags):
+        with tracer.start_as_current_span(name) as span:
+            yield
+            span.set_attributes(tags)
+
+    cache_helper.tracing.set_trace_hook(opentelemetry_hook)
+
+The hook can also be set with the CACHE_HELPER_TRACE_HOOK setting, as a dotted path. When no hook is set, spans cost a
+single function call.
+"""
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+from cache_helper import settings
+
+CALL_SPAN = "cache_helper.call"
+BUILD_KEY_SPAN = "cache_helper.build_key"
+GET_SPAN = "cache_helper.get"
+COMPUTE_SPAN = "cache_helper.compute"
+SET_SPAN = "cache_helper.set"
+
+_hook = None
+_hook_loaded = False
+
+
+class _Span:
+    __slots__ = ("tags", "_context")
+
+    def __init__(self, hook, name, tags):
+        self.tags = tags
+        self._context = hook(name, tags)
+
+    def __enter__(self):
+        self._context.__enter__()
+        return self.tags
+
+    def __exit__(self, *exc_info):
+        return self._context.__exit__(*exc_info)
+
+
+class _NoOpSpan:
+    def __enter__(self):
+        # Tags set on a span that isn't traced are simply discarded
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+def set_trace_hook(hook):
+    """
+    :param hook: The hook to emit spans through, or None to stop tracing.
+    """
+    global _hook, _hook_loaded
+    _hook = hook
+    _hook_loaded = True
+
+
+def get_trace_hook():
+    global _hook, _hook_loaded
+    if not _hook_loaded:
+        _hook = import_string(settings.TRACE_HOOK) if settings.TRACE_HOOK else None
+        _hook_loaded = True
+    return _hook
+
+
+def is_enabled():
+    return get_trace_hook() is not None
+
+
+def span(name, func_name):
+    """
+    :param name: The name of the span, one of the *_SPAN constants.
+    :param func_name: The fully specified name of the cached function.
+
+    :return: A context manager covering the span, whose value is the dict of tags of the span.
+    """
+    hook = _hook if _hook_loaded else get_trace_hook()
+    if hook is None:
+        return _NO_OP_SPAN
+    return _Span(hook, name, {"function": func_name})
+
+
+class SlowCallRecorder:
+    """
+    A hook that keeps the slowest calls of each cached function, with the duration of each of their spans, and dumps
+    them to a JSON file. e.g.
+
+        recorder = SlowCallRecorder("/tmp/cache_helper_slow_calls.json", slowest=20, sample_rate=0.1)
+        cache_helper.tracing.set_trace_hook(recorder)
+        atexit.register(recorder.dump)
+
+    :param path: The path of the JSON file written by `dump`.
+    :param slowest: The number of calls to keep per function.
+    :param sample_rate: The fraction of calls to record.
+    :param hook: Another hook to pass every span on to.
+    """
+
+    def __init__(self, path, slowest=10, sample_rate=1.0, hook=None):
+        self.path = path
+        self.slowest = slowest
+        self.sample_rate = sample_rate
+        self.hook = hook
+        self._local = threading.local()
+        # Maps each function name to a min-heap of (duration, sequence number, call)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    @contextlib.contextmanager
+    def __call__(self, name, tags):
+        # Every call being recorded on this thread has a tuple of whether it is sampled and the list of its child spans,
+        # and calls can be nested when a cached function calls another one
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        if name == CALL_SPAN:
+            call = (random.random() < self.sample_rate, [])
+            stack.append(call)
+
+        start = time.perf_counter()
+        try:
+            if self.hook is None:
+                yield
+            else:
+                with self.hook(name, tags):
+                    yield
+        finally:
+            duration = time.perf_counter() - start
+            if name == CALL_SPAN:
+                # Not necessarily the last one, since streams are only done once they have been iterated
+                for index in range(len(stack) - 1, -1, -1):
+                    if stack[index] is call:
+                        del stack[index]
+                        break
+                sampled, spans = call
+                if sampled:
+                    self._record(tags, duration, spans)
+            elif stack and stack[-1][0]:
+                stack[-1][1].append({"name": name, "duration": duration, **tags})
+
+    def _record(self, tags, duration, spans):
+        call = {"duration": duration, "tags": tags, "spans": spans}
+        with self._lock:
+            calls = self._calls.setdefault(tags["function"], [])
+            entry = (duration, next(self._sequence), call)
+            if len(calls) < self.slowest:
+                heapq.heappush(calls, entry)
+            elif duration > calls[0][0]:
+                heapq.heapreplace(calls, entry)
+
+    def get_slowest_calls(self):
+        """
+        :return: A dict mapping each function name to its slowest recorded calls, slowest first.
+        """
+        with self._lock:
+            return {
+                func_name: [
+                    call
+                    for _, _, call in sorted(
+                        calls, key=lambda entry: entry[0], reverse=True
+                    )
+                ]
+                for func_name, calls in self._calls.items()
+            }
+
+    def dump(self):
+        """
+        Writes the slowest calls to the file, replacing it atomically.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, delete=False, suffix=".tmp"
+        ) as temp_file:
+            json.dump(self.get_slowest_calls(), temp_file, indent=2, default=str)
+        os.replace(temp_file.name, self.path)
@@ -1,16 +1,44 @@
-from hashlib import sha256
+import pickle
+import random
+from hashlib import blake2b, sha256
 
 from cache_helper import settings
 from cache_helper.exceptions import CacheKeyCreationError
 from cache_helper.interfaces import CacheHelperCacheable
+from cache_helper.serializers import SerializedValue
 
+# The versions of the format of cache keys, see the CACHE_HELPER_KEY_FORMAT_VERSION setting
+KEY_FORMAT_VERSIONS = (1, 2)
 
-def get_function_cache_key(func_name, func_args, func_kwargs):
-    args_string = build_args_string(*func_args, **func_kwargs)
-    key = "{func_name}{args_string}".format(
-        func_name=func_name, args_string=args_string
+# Builtin types whose values are tagged with their type in version 2 keys, so that e.g. 1 and "1" get different keys
+_TYPED_SCALAR_TYPES = frozenset((int, float, bool, complex, bytes, type(None)))
+
+# Marks the end of a collection in the DFS of version 2 keys
+_END_OF_COLLECTION = object()
+
+
+def get_function_cache_key(func_name, func_args, func_kwargs, key_format_version=1):
+    """
+    :param key_format_version: One of KEY_FORMAT_VERSIONS. Version 1 builds keys from the string representation of
+        each argument, so that arguments can share a key when e.g. they are equal as strings, or when a string contains
+        the separators. Version 2 escapes the separators, marks where collections end and tags builtin scalars with
+        their type.
+    """
+    if key_format_version not in KEY_FORMAT_VERSIONS:
+        raise CacheKeyCreationError(
+            "Unknown key format version: {version}".format(version=key_format_version)
+        )
+
+    args_string = build_args_string(
+        *func_args, key_format_version=key_format_version, **func_kwargs
+    )
+    if key_format_version == 1:
+        return "{func_name}{args_string}".format(
+            func_name=func_name, args_string=args_string
+        )
+    return "{func_name}:v{version}{args_string}".format(
+        func_name=func_name, version=key_format_version, args_string=args_string
     )
-    return key
 
 
 def get_hashed_cache_key(key):
@@ -22,14 +50,69 @@ def get_hashed_cache_key(key):
     return key_hash
 
 
-def build_args_string(*args, **kwargs):
+def get_jittered_timeout(timeout, jitter, distribution="uniform", seed=None):
+    """
+    Randomizes a timeout so that entries set at the same time do not all expire at the same time.
+
+    :param timeout: The timeout in seconds. None (never expire), and 0 or less (expire immediately), are returned
+        unchanged.
+    :param jitter: Either a fraction of the timeout, e.g. 0.1 for a timeout within +/- 10%, or a (low, high) tuple of
+        seconds to add to the timeout.
+    :param distribution: "uniform" or "triangular".
+    :param seed: Makes the result deterministic, e.g. the cache key so that a key always gets the same timeout.
+
+    :return: The jittered timeout, never less than 1 second for a positive timeout.
+    """
+    if timeout is None or timeout <= 0 or not jitter:
+        return timeout
+
+    if isinstance(jitter, (tuple, list)):
+        low, high = timeout + jitter[0], timeout + jitter[1]
+    else:
+        low, high = timeout * (1 - jitter), timeout * (1 + jitter)
+
+    rng = random if seed is None else random.Random(seed)
+    if distribution == "uniform":
+        jittered_timeout = rng.uniform(low, high)
+    elif distribution == "triangular":
+        jittered_timeout = rng.triangular(low, high)
+    else:
+        raise ValueError(
+            "Unknown jitter distribution: {distribution}".format(
+                distribution=distribution
+            )
+        )
+
+    return max(1, int(round(jittered_timeout)))
+
+
+def get_value_bytes(value):
+    """
+    :return: The bytes a value is measured and hashed by. The bytes of serialized values, and bytes, are used as they
+        are; anything else is pickled.
+    """
+    if type(value) is SerializedValue:
+        return value.data
+    if isinstance(value, bytes):
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def get_value_digest(value):
+    """
+    A cheap digest of a value, used to tell whether a recomputed value changed.
+    """
+    return blake2b(get_value_bytes(value), digest_size=16).hexdigest()
+
+
+def build_args_string(*args, key_format_version=1, **kwargs):
     """
     Deterministically builds a string from the args and kwargs. Checks if an instance
     of `CacheHelperCacheable` is nested anywhere within the args and kwargs, and gets
     the proper cache key if so.
     """
-    args_key = build_cache_key_using_dfs(args)
-    kwargs_key = build_cache_key_using_dfs(kwargs)
+    args_key = build_cache_key_using_dfs(args, key_format_version)
+    kwargs_key = build_cache_key_using_dfs(kwargs, key_format_version)
 
     return ";{args_key};{kwargs_key}".format(args_key=args_key, kwargs_key=kwargs_key)
 
@@ -53,11 +136,26 @@ def _get_object_cache_key(obj):
         return str(obj)
 
 
-def build_cache_key_using_dfs(input_item):
+def _get_escaped_object_cache_key(obj):
+    """
+    The version 2 key of an object, in which the separators of the DFS can't appear unescaped.
+    """
+    object_key = _get_object_cache_key(obj)
+    for character in "\\,():":
+        object_key = object_key.replace(character, "\\" + character)
+    if type(obj) in _TYPED_SCALAR_TYPES:
+        return "{type_name}:{object_key}".format(
+            type_name=type(obj).__name__, object_key=object_key
+        )
+    return object_key
+
+
+def build_cache_key_using_dfs(input_item, key_format_version=1):
     """
     Iterates down a tree of collections (e.g. a list of dicts), and uses the elements to build a deterministic cache key
 
     :param input_item: args or kwargs
+    :param key_format_version: One of KEY_FORMAT_VERSIONS.
     :return: A deterministic cache key
     """
     return_string = ""
@@ -68,17 +166,29 @@ def build_cache_key_using_dfs(input_item):
 
     while stack:
         current_item, depth = stack.pop()
+        if current_item is _END_OF_COLLECTION:
+            return_string += "),"
+            continue
         if settings.MAX_DEPTH is not None and depth > settings.MAX_DEPTH:
             raise CacheKeyCreationError(
                 "Function args / kwargs have too many nested collections"
                 " for MAX_DEPTH {max_depth}".format(max_depth=settings.MAX_DEPTH)
             )
 
-        if hasattr(current_item, "__iter__") and not isinstance(current_item, str):
-            return_string += ","
+        if key_format_version == 1:
+            if hasattr(current_item, "__iter__") and not isinstance(current_item, str):
+                return_string += ","
+                stack.extend(_get_deterministic_iterable(current_item, depth))
+            else:
+                return_string += "{},".format(_get_object_cache_key(current_item))
+        elif hasattr(current_item, "__iter__") and not isinstance(
+            current_item, (str, bytes)
+        ):
+            return_string += "("
+            stack.append((_END_OF_COLLECTION, depth))
             stack.extend(_get_deterministic_iterable(current_item, depth))
         else:
-            return_string += "{},".format(_get_object_cache_key(current_item))
+            return_string += "{},".format(_get_escaped_object_cache_key(current_item))
 
     return return_string
 
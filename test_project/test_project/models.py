@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class Exchange(models.Model):
+    name = models.CharField(max_length=32)
+
+
+class Company(models.Model):
+    name = models.CharField(max_length=64)
+    exchange = models.ForeignKey(Exchange, null=True, on_delete=models.SET_NULL)
+    peers = models.ManyToManyField("self", symmetrical=False)
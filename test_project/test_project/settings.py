@@ -10,4 +10,6 @@ SECRET_KEY = "12345"
 
 MIDDLEWARE_CLASSES = ()
 
-INSTALLED_APPS = ()
+INSTALLED_APPS = ("test_project",)
+
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
@@ -1,13 +1,66 @@
+import contextlib
+import importlib.util
+import json
 import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import tempfile
+import time
 from datetime import datetime
+from http import HTTPStatus
+from unittest import skipUnless
 from unittest.mock import patch
 
-from django.core.cache import cache
-from django.test import TestCase
-
-from cache_helper.decorators import cached, cached_class_method, cached_instance_method
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cache_helper import bypass, prefetch, sliding, utils
+from cache_helper.adapters import CompactModelResult, ModelResultAdapter
+from cache_helper.adaptive import get_adaptive_key
+from cache_helper.backends import ShardedLocMemCache, is_immutable
+from cache_helper.decorators import (
+    cached,
+    cached_class_method,
+    cached_instance_method,
+    cached_instance_property,
+)
+from cache_helper.dependencies import get_dependents_key
+from cache_helper.disk import DiskCache, get_marked_key, get_marker_key
 from cache_helper.exceptions import CacheHelperException, CacheKeyCreationError
+from cache_helper.hot_keys import HotKeyCache, get_hot_keys
 from cache_helper.interfaces import CacheHelperCacheable
+from cache_helper.key_memo import KeyMemo, get_memo_key
+from cache_helper.loadtest.runner import LoadTestConfig, run_load_test
+from cache_helper.loadtest.server import FakeMemcachedServer, get_server_stats
+from cache_helper.serializers import (
+    SerializationError,
+    SerializedValue,
+    Serializer,
+    deserialize,
+    get_serializer,
+    register_serializer,
+)
+from cache_helper.sharding import HashRing
+from cache_helper.shared_memory import (
+    SLOT_HEADER_SIZE,
+    SharedMemoryCache,
+    get_shared_memory_cache,
+)
+from cache_helper.sketches import CountMinSketch, HyperLogLog, hash_from_cache_key
+from cache_helper.sliding import SlidingEntry
+from cache_helper.stats import (
+    get_cardinality_report,
+    get_function_stats,
+    get_stats,
+    reset_stats,
+)
+from cache_helper.streaming import get_chunk_key
+from cache_helper.tracing import SlowCallRecorder, set_trace_hook
+from test_project.models import Company, Exchange
 
 DISABLE_LOGGING_BELOW = logging.ERROR
 GLOBAL_COUNTER = 200
@@ -49,7 +102,7 @@ class Incrementer:
     @staticmethod
     @cached(60 * 60)
     def func_with_multiple_args_and_kwargs(
-            arg_1, arg_2, kwarg_1=None, kwarg_2="a string"
+        arg_1, arg_2, kwarg_1=None, kwarg_2="a string"
     ):
         return datetime.utcnow()
 
@@ -124,7 +177,6 @@ class CacheableIfSumsAreEqual(CacheHelperCacheable):
 
 
 class CachedInstanceMethodTests(TestCase):
-
     def setUp(self):
         logging.disable(DISABLE_LOGGING_BELOW)
         super().setUp()
@@ -141,7 +193,7 @@ class CachedInstanceMethodTests(TestCase):
         self.assertEqual(incrementer.instance_increment_by(1), 101)
         self.assertEqual(incrementer.instance_increment_by(2), 103)
 
-        with patch('django.core.cache.cache.get') as cache_get:
+        with patch("django.core.cache.cache.get") as cache_get:
             cache_get.side_effect = Exception
 
             # Because there is an exception thrown when trying to retrieve the
@@ -155,7 +207,7 @@ class CachedInstanceMethodTests(TestCase):
         # Hasn't been computed before, so the function actually gets called
         self.assertEqual(incrementer.instance_increment_by(1), 101)
 
-        with patch('django.core.cache.cache.set') as cache_set:
+        with patch("django.core.cache.cache.set") as cache_set:
             cache_set.side_effect = CacheHelperException
 
             # Because there is an exception raised when trying to set the
@@ -298,27 +350,43 @@ class CachedInstanceMethodTests(TestCase):
 
         # 0 0 / 0 1
         inc_1 = incrementer.instance_increment_by_with_kwargs(2, datetime(2025, 4, 28))
-        inc_2 = incrementer.instance_increment_by_with_kwargs(2, useless_kwarg=datetime(2025, 4, 28))
+        inc_2 = incrementer.instance_increment_by_with_kwargs(
+            2, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 0 / 1 1
         inc_1 = incrementer.instance_increment_by_with_kwargs(3, datetime(2025, 4, 28))
-        inc_2 = incrementer.instance_increment_by_with_kwargs(num=3, useless_kwarg=datetime(2025, 4, 28))
+        inc_2 = incrementer.instance_increment_by_with_kwargs(
+            num=3, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 1 / 0 1
-        inc_1 = incrementer.instance_increment_by_with_kwargs(4, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = incrementer.instance_increment_by_with_kwargs(4, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = incrementer.instance_increment_by_with_kwargs(
+            4, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = incrementer.instance_increment_by_with_kwargs(
+            4, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 1 / 1 1
-        inc_1 = incrementer.instance_increment_by_with_kwargs(5, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = incrementer.instance_increment_by_with_kwargs(num=5, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = incrementer.instance_increment_by_with_kwargs(
+            5, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = incrementer.instance_increment_by_with_kwargs(
+            num=5, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 1 1  / 1 1
-        inc_1 = incrementer.instance_increment_by_with_kwargs(num=6, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = incrementer.instance_increment_by_with_kwargs(num=6, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = incrementer.instance_increment_by_with_kwargs(
+            num=6, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = incrementer.instance_increment_by_with_kwargs(
+            num=6, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
     def test_cache_key_consistency_mismatched_instance_args_with_default(self):
@@ -338,7 +406,6 @@ class CachedInstanceMethodTests(TestCase):
 
 
 class CachedClassMethodTests(TestCase):
-
     def setUp(self):
         logging.disable(DISABLE_LOGGING_BELOW)
         super().setUp()
@@ -359,7 +426,7 @@ class CachedClassMethodTests(TestCase):
         self.assertEqual(Incrementer.class_increment_by(1), 501)
         self.assertEqual(Incrementer.class_increment_by(2), 503)
 
-        with patch('django.core.cache.cache.get') as cache_get:
+        with patch("django.core.cache.cache.get") as cache_get:
             cache_get.side_effect = Exception
 
             # Because there is an exception thrown when trying to retrieve the
@@ -371,7 +438,7 @@ class CachedClassMethodTests(TestCase):
         # Hasn't been computed before, so the function actually gets called
         self.assertEqual(Incrementer.class_increment_by(1), 501)
 
-        with patch('django.core.cache.cache.set') as cache_set:
+        with patch("django.core.cache.cache.set") as cache_set:
             cache_set.side_effect = CacheHelperException
 
             # Because there is an exception raised when trying to set the
@@ -491,27 +558,43 @@ class CachedClassMethodTests(TestCase):
 
         # 0 0 / 0 1
         inc_1 = Incrementer.class_increment_by_with_kwargs(2, datetime(2025, 4, 28))
-        inc_2 = Incrementer.class_increment_by_with_kwargs(2, useless_kwarg=datetime(2025, 4, 28))
+        inc_2 = Incrementer.class_increment_by_with_kwargs(
+            2, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 0 / 1 1
         inc_1 = Incrementer.class_increment_by_with_kwargs(3, datetime(2025, 4, 28))
-        inc_2 = Incrementer.class_increment_by_with_kwargs(num=3, useless_kwarg=datetime(2025, 4, 28))
+        inc_2 = Incrementer.class_increment_by_with_kwargs(
+            num=3, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 1 / 0 1
-        inc_1 = Incrementer.class_increment_by_with_kwargs(4, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = Incrementer.class_increment_by_with_kwargs(4, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = Incrementer.class_increment_by_with_kwargs(
+            4, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = Incrementer.class_increment_by_with_kwargs(
+            4, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 0 1 / 1 1
-        inc_1 = Incrementer.class_increment_by_with_kwargs(5, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = Incrementer.class_increment_by_with_kwargs(num=5, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = Incrementer.class_increment_by_with_kwargs(
+            5, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = Incrementer.class_increment_by_with_kwargs(
+            num=5, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
         # 1 1  / 1 1
-        inc_1 = Incrementer.class_increment_by_with_kwargs(num=6, useless_kwarg=datetime(2025, 4, 28))
-        inc_2 = Incrementer.class_increment_by_with_kwargs(num=6, useless_kwarg=datetime(2025, 4, 28))
+        inc_1 = Incrementer.class_increment_by_with_kwargs(
+            num=6, useless_kwarg=datetime(2025, 4, 28)
+        )
+        inc_2 = Incrementer.class_increment_by_with_kwargs(
+            num=6, useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(inc_1, inc_2)
 
     def test_cache_key_consistency_mismatched_class_args_with_default(self):
@@ -545,7 +628,7 @@ class CachedStaticMethodTests(TestCase):
         datetime_1 = Incrementer.get_datetime(1)
         datetime_2 = Incrementer.get_datetime(1)
 
-        with patch('django.core.cache.cache.get') as cache_get:
+        with patch("django.core.cache.cache.get") as cache_get:
             cache_get.side_effect = Exception
 
             datetime_3 = Incrementer.get_datetime(1)
@@ -554,7 +637,7 @@ class CachedStaticMethodTests(TestCase):
         self.assertNotEqual(datetime_1, datetime_3)
 
     def test_exception_during_cache_set(self):
-        with patch('django.core.cache.cache.set') as cache_set:
+        with patch("django.core.cache.cache.set") as cache_set:
             cache_set.side_effect = CacheHelperException
 
             datetime_1 = Incrementer.get_datetime(1)
@@ -676,46 +759,54 @@ class CachedStaticMethodTests(TestCase):
 
     def test_cache_key_consistency_mismatched_static_args(self):
         # 0 0 / 0 0
-        dt_1 = Incrementer.get_datetime('test', datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime('test', datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime("test", datetime(2025, 4, 28))
+        dt_2 = Incrementer.get_datetime("test", datetime(2025, 4, 28))
         self.assertEqual(dt_1, dt_2)
 
         # 0 0 / 0 1
-        dt_1 = Incrementer.get_datetime('test', datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime('test', useless_kwarg=datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime("test", datetime(2025, 4, 28))
+        dt_2 = Incrementer.get_datetime("test", useless_kwarg=datetime(2025, 4, 28))
         self.assertEqual(dt_1, dt_2)
 
         # 0 0 / 1 1
-        dt_1 = Incrementer.get_datetime('test', datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime(useless_arg='test', useless_kwarg=datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime("test", datetime(2025, 4, 28))
+        dt_2 = Incrementer.get_datetime(
+            useless_arg="test", useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(dt_1, dt_2)
 
         # 0 1 / 0 1
-        dt_1 = Incrementer.get_datetime('test', useless_kwarg=datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime('test', useless_kwarg=datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime("test", useless_kwarg=datetime(2025, 4, 28))
+        dt_2 = Incrementer.get_datetime("test", useless_kwarg=datetime(2025, 4, 28))
         self.assertEqual(dt_1, dt_2)
 
         # 0 1 / 1 1
-        dt_1 = Incrementer.get_datetime('test', useless_kwarg=datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime(useless_arg='test', useless_kwarg=datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime("test", useless_kwarg=datetime(2025, 4, 28))
+        dt_2 = Incrementer.get_datetime(
+            useless_arg="test", useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(dt_1, dt_2)
 
         # 1 1  / 1 1
-        dt_1 = Incrementer.get_datetime(useless_arg='test', useless_kwarg=datetime(2025, 4, 28))
-        dt_2 = Incrementer.get_datetime(useless_arg='test', useless_kwarg=datetime(2025, 4, 28))
+        dt_1 = Incrementer.get_datetime(
+            useless_arg="test", useless_kwarg=datetime(2025, 4, 28)
+        )
+        dt_2 = Incrementer.get_datetime(
+            useless_arg="test", useless_kwarg=datetime(2025, 4, 28)
+        )
         self.assertEqual(dt_1, dt_2)
 
     def test_cache_key_consistency_mismatched_static_args_with_default(self):
-        dt_1 = Incrementer.get_datetime('test')
-        dt_2 = Incrementer.get_datetime('test', None)
+        dt_1 = Incrementer.get_datetime("test")
+        dt_2 = Incrementer.get_datetime("test", None)
         self.assertEqual(dt_1, dt_2)
 
-        dt_1 = Incrementer.get_datetime('test')
-        dt_2 = Incrementer.get_datetime('test', useless_kwarg=None)
+        dt_1 = Incrementer.get_datetime("test")
+        dt_2 = Incrementer.get_datetime("test", useless_kwarg=None)
         self.assertEqual(dt_1, dt_2)
 
-        dt_1 = Incrementer.get_datetime('test', None)
-        dt_2 = Incrementer.get_datetime('test', useless_kwarg=None)
+        dt_1 = Incrementer.get_datetime("test", None)
+        dt_2 = Incrementer.get_datetime("test", useless_kwarg=None)
         self.assertEqual(dt_1, dt_2)
 
 
@@ -1123,3 +1214,2706 @@ class MaxDepthTests(TestCase):
         self.assertEqual(complex_datetime, equivalent_datetime)
         self.assertNotEqual(complex_datetime, different_cacheable_datetime)
         self.assertNotEqual(complex_datetime, different_structure_datetime)
+
+
+class BypassTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_bypass_skips_cache_entirely(self):
+        incrementer = Incrementer(100)
+
+        with patch("django.core.cache.cache.get") as cache_get, patch(
+            "django.core.cache.cache.set"
+        ) as cache_set:
+            with bypass():
+                self.assertEqual(incrementer.instance_increment_by(1), 101)
+                self.assertEqual(incrementer.instance_increment_by(1), 102)
+                self.assertEqual(
+                    Incrementer.class_increment_by(1),
+                    Incrementer.class_increment_by(0) + 0,
+                )
+                Incrementer.get_datetime(1)
+
+        cache_get.assert_not_called()
+        cache_set.assert_not_called()
+
+        # Outside of the block caching works as usual
+        self.assertEqual(incrementer.instance_increment_by(1), 103)
+        self.assertEqual(incrementer.instance_increment_by(1), 103)
+
+    @patch("cache_helper.settings.BYPASS", True)
+    def test_bypass_setting(self):
+        incrementer = Incrementer(100)
+        self.assertEqual(incrementer.instance_increment_by(1), 101)
+        self.assertEqual(incrementer.instance_increment_by(1), 102)
+
+    def test_read_only_bypass(self):
+        incrementer = Incrementer(100)
+        self.assertEqual(incrementer.instance_increment_by(1), 101)
+
+        with bypass(reads=False):
+            # Cached values are still served
+            self.assertEqual(incrementer.instance_increment_by(1), 101)
+            # Computed values are not saved
+            self.assertEqual(incrementer.instance_increment_by(2), 103)
+            self.assertEqual(incrementer.instance_increment_by(2), 105)
+
+    def test_write_only_bypass(self):
+        self.assertEqual(Incrementer.get_datetime(1), Incrementer.get_datetime(1))
+        initial_datetime = Incrementer.get_datetime(1)
+
+        with bypass(writes=False):
+            refreshed_datetime = Incrementer.get_datetime(1)
+        self.assertNotEqual(initial_datetime, refreshed_datetime)
+
+        # The recomputed value overwrote the cached one
+        self.assertEqual(Incrementer.get_datetime(1), refreshed_datetime)
+
+    def test_nested_bypass_does_not_remove_outer_bypass(self):
+        incrementer = Incrementer(100)
+
+        with bypass():
+            with bypass(reads=False, writes=False):
+                self.assertEqual(incrementer.instance_increment_by(1), 101)
+                self.assertEqual(incrementer.instance_increment_by(1), 102)
+
+
+class CompanyReport:
+    @staticmethod
+    @cached(60 * 60, depends_on={Company: lambda company: [(company.pk,)]})
+    def get_name(company_id):
+        return Company.objects.get(pk=company_id).name
+
+    @classmethod
+    @cached_class_method(
+        60 * 60, depends_on={Company: lambda company: [{"company_id": company.pk}]}
+    )
+    def get_peer_count(cls, company_id):
+        return Company.objects.get(pk=company_id).peers.count()
+
+    @staticmethod
+    @cached(60 * 60, depends_on={"test_project.Exchange": None})
+    def get_exchange_names():
+        return sorted(Exchange.objects.values_list("name", flat=True))
+
+
+class ModelDependencyTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_save_invalidates_affected_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+            google = Company.objects.create(name="Google")
+        self.assertEqual(CompanyReport.get_name(apple.pk), "Apple")
+        self.assertEqual(CompanyReport.get_name(google.pk), "Google")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apple.name = "Apple Inc."
+            apple.save()
+            # Invalidation waits for the transaction to commit
+            self.assertEqual(CompanyReport.get_name(apple.pk), "Apple")
+
+        self.assertEqual(CompanyReport.get_name(apple.pk), "Apple Inc.")
+
+        # Unrelated results are left alone
+        Company.objects.filter(pk=google.pk).update(name="Alphabet")
+        self.assertEqual(CompanyReport.get_name(google.pk), "Google")
+
+    def test_invalidations_are_batched_per_transaction(self):
+        # Also flushes the invalidations left pending by earlier tests
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+            google = Company.objects.create(name="Google")
+
+        with patch("django.core.cache.cache.delete_many") as cache_delete_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                apple.save()
+                google.save()
+                apple.delete()
+
+        # One call for the results of both functions depending on Company
+        cache_delete_many.assert_called_once()
+        self.assertEqual(len(cache_delete_many.call_args[0][0]), 4)
+
+    def test_one_callback_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            companies = [Company.objects.create(name=str(index)) for index in range(5)]
+            for company in companies:
+                company.save()
+            Exchange.objects.create(name="NYSE")
+        self.assertEqual(len(callbacks), 1)
+
+    def test_invalidations_of_rolled_back_savepoints_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+        self.assertEqual(CompanyReport.get_name(apple.pk), "Apple")
+
+        with self.assertRaises(ValueError), transaction.atomic():
+            Company.objects.create(name="Google")
+            raise ValueError
+
+        with patch("django.core.cache.cache.delete_many") as cache_delete_many:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                apple.name = "Apple Inc."
+                apple.save()
+        # The rolled back flush is registered again, for the invalidations made since only
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(cache_delete_many.call_args[0][0]), 2)
+
+    def test_m2m_changed_invalidates_affected_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+            google = Company.objects.create(name="Google")
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apple.peers.add(google)
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 1)
+
+        # Changing the relation from the other side invalidates the results of the added instances
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            google.company_set.remove(apple)
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 0)
+
+    def test_generation_invalidates_all_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Exchange.objects.create(name="NYSE")
+        self.assertEqual(CompanyReport.get_exchange_names(), ["NYSE"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Exchange.objects.create(name="NASDAQ")
+        self.assertEqual(CompanyReport.get_exchange_names(), ["NASDAQ", "NYSE"])
+
+    def test_generation_survives_eviction(self):
+        Exchange.objects.create(name="NYSE")
+        self.assertEqual(CompanyReport.get_exchange_names(), ["NYSE"])
+
+        cache.delete(
+            utils.get_hashed_cache_key(
+                "cache_helper.generation:test_project.tests.CompanyReport.get_exchange_names"
+            )
+        )
+        Exchange.objects.filter(name="NYSE").update(name="LSE")
+        self.assertEqual(CompanyReport.get_exchange_names(), ["LSE"])
+
+    def test_generation_read_errors_compute_the_result(self):
+        Exchange.objects.create(name="NYSE")
+        self.assertEqual(CompanyReport.get_exchange_names(), ["NYSE"])
+
+        with patch("django.core.cache.cache.get", side_effect=ConnectionError), patch(
+            "django.core.cache.cache.set"
+        ) as cache_set:
+            Exchange.objects.filter(name="NYSE").update(name="LSE")
+            self.assertEqual(CompanyReport.get_exchange_names(), ["LSE"])
+            self.assertEqual(CompanyReport.get_exchange_names.refresh(), ["LSE"])
+        # Nothing could be read back from the keys of the calls, so nothing was saved
+        cache_set.assert_not_called()
+
+        # The generation didn't change, so the entry saved before is still used
+        self.assertEqual(CompanyReport.get_exchange_names(), ["NYSE"])
+
+    def test_clear_from_the_other_side_invalidates_affected_results(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+            google = Company.objects.create(name="Google")
+            apple.peers.add(google)
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            google.company_set.clear()
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 0)
+
+    def test_changed_instances_are_fetched_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Apple")
+            google = Company.objects.create(name="Google")
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(
+            connection
+        ) as queries:
+            google.company_set.add(apple)
+        # Both get_name and get_peer_count depend on the added company
+        fetches = [
+            query for query in queries if 'FROM "test_project_company"' in query["sql"]
+        ]
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(CompanyReport.get_peer_count(apple.pk), 1)
+
+    def test_dependencies_declared_before_models_are_loaded(self):
+        def get_affected_args(company):
+            # The function stays connected once the test is over, so it ignores the companies of other tests
+            return [(company.pk,)] if company.name.startswith("Deferred") else []
+
+        with patch("django.apps.apps.models_ready", False):
+
+            @cached(60 * 60, depends_on={Company: get_affected_args})
+            def get_peer_names(company_id):
+                return sorted(
+                    Company.objects.get(pk=company_id).peers.values_list(
+                        "name", flat=True
+                    )
+                )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apple = Company.objects.create(name="Deferred Apple")
+            google = Company.objects.create(name="Deferred Google")
+        self.assertEqual(get_peer_names(apple.pk), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apple.peers.add(google)
+        self.assertEqual(get_peer_names(apple.pk), ["Deferred Google"])
+
+
+@cached(60 * 60, jitter=0.1)
+def jittered_echo(value):
+    return value
+
+
+@cached(
+    60 * 60,
+    jitter=(-60, 0),
+    jitter_distribution="triangular",
+    jitter_deterministic=True,
+)
+def deterministically_jittered_echo(value):
+    return value
+
+
+class JitterTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def _get_timeouts(self, func, values):
+        with patch("django.core.cache.cache.set") as cache_set:
+            for value in values:
+                func(value)
+        return [call[0][2] for call in cache_set.call_args_list]
+
+    def test_fractional_jitter(self):
+        timeouts = self._get_timeouts(jittered_echo, range(50))
+        for timeout in timeouts:
+            self.assertGreaterEqual(timeout, 60 * 54)
+            self.assertLessEqual(timeout, 60 * 66)
+        self.assertGreater(len(set(timeouts)), 1)
+
+    def test_deterministic_range_jitter(self):
+        timeouts = self._get_timeouts(deterministically_jittered_echo, range(50))
+        for timeout in timeouts:
+            self.assertGreaterEqual(timeout, 60 * 59)
+            self.assertLessEqual(timeout, 60 * 60)
+
+        # The same keys get the same timeouts
+        self.assertEqual(
+            self._get_timeouts(deterministically_jittered_echo, range(50)), timeouts
+        )
+
+    @patch("cache_helper.settings.JITTER", 0.5)
+    def test_global_default(self):
+        for timeout in self._get_timeouts(Incrementer.get_datetime, range(20)):
+            self.assertGreaterEqual(timeout, 60 * 30)
+            self.assertLessEqual(timeout, 60 * 90)
+
+    def test_no_jitter_by_default(self):
+        self.assertEqual(
+            self._get_timeouts(Incrementer.get_datetime, range(5)), [60 * 60] * 5
+        )
+
+    def test_timeouts_that_are_not_jittered(self):
+        self.assertIsNone(utils.get_jittered_timeout(None, 0.1))
+        self.assertEqual(utils.get_jittered_timeout(0, 0.1), 0)
+        self.assertEqual(utils.get_jittered_timeout(-5, 0.1), -5)
+        self.assertEqual(utils.get_jittered_timeout(-5, (1, 10)), -5)
+        self.assertEqual(utils.get_jittered_timeout(1, (-10, -5)), 1)
+
+    def test_unknown_distribution(self):
+        with self.assertRaises(ValueError):
+            utils.get_jittered_timeout(60, 0.1, distribution="normal")
+
+
+ADAPTIVE_RESULTS = {}
+
+
+@cached(60, adaptive_timeout=(30, 600))
+def get_adaptive_result(key):
+    return ADAPTIVE_RESULTS.get(key)
+
+
+class AdaptiveTimeoutTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        ADAPTIVE_RESULTS.clear()
+
+    def _recompute(self, key):
+        # Like once the entry expires, the adaptive state of its value is kept
+        get_adaptive_result.invalidate(key)
+        get_adaptive_result(key)
+        return get_function_stats(
+            "test_project.tests.get_adaptive_result"
+        ).timeouts.last
+
+    def test_timeout_grows_while_value_is_unchanged(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        self.assertEqual(self._recompute("a"), 60)
+        self.assertEqual(self._recompute("a"), 120)
+        self.assertEqual(self._recompute("a"), 240)
+        self.assertEqual(self._recompute("a"), 480)
+        # Capped at the maximum timeout
+        self.assertEqual(self._recompute("a"), 600)
+
+        # A changed value resets the timeout
+        ADAPTIVE_RESULTS["a"] = 2
+        self.assertEqual(self._recompute("a"), 60)
+
+        # Timeouts are tracked per entry
+        self.assertEqual(self._recompute("b"), 60)
+
+    @patch("cache_helper.settings.ADAPTIVE_TIMEOUT_COST_SECONDS", 1e-9)
+    def test_expensive_computations_are_kept_longer(self):
+        self.assertEqual(self._recompute("a"), 600)
+
+    def test_timeouts_are_observable(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        self._recompute("a")
+        self._recompute("a")
+
+        timeouts = get_stats()["test_project.tests.get_adaptive_result"]["timeouts"]
+        self.assertEqual(timeouts["count"], 2)
+        self.assertEqual(timeouts["min"], 60)
+        self.assertEqual(timeouts["max"], 120)
+        self.assertEqual(timeouts["mean"], 90)
+
+    def test_only_the_adaptive_state_is_kept_past_the_timeout(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        cache_key_hashed, _ = get_adaptive_result.get_cache_keys("a")
+        with patch("django.core.cache.cache.set") as cache_set:
+            get_adaptive_result("a")
+        self.assertEqual(cache_set.call_count, 2)
+        self.assertEqual(cache_set.call_args_list[0][0], (cache_key_hashed, 1, 60))
+        adaptive_key, adaptive_state, timeout = cache_set.call_args_list[1][0]
+        self.assertEqual(adaptive_key, get_adaptive_key(cache_key_hashed))
+        self.assertEqual(adaptive_state[1], 60)
+        self.assertEqual(timeout, 60 + 600)
+
+    def test_adaptive_state_is_read_with_the_value(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        get_adaptive_result("a")
+        get_adaptive_result.invalidate("a")
+        with patch.object(
+            caches["default"], "get_many", wraps=caches["default"].get_many
+        ) as get_many:
+            get_adaptive_result("a")
+        get_many.assert_called_once()
+        self.assertEqual(
+            get_function_stats("test_project.tests.get_adaptive_result").timeouts.last,
+            120,
+        )
+
+    def test_unexpired_entry_is_a_hit(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        get_adaptive_result("a")
+        ADAPTIVE_RESULTS["a"] = 2
+        self.assertEqual(get_adaptive_result("a"), 1)
+
+    def test_refresh_keeps_growing_the_timeout(self):
+        ADAPTIVE_RESULTS["a"] = 1
+        get_adaptive_result("a")
+        get_adaptive_result.refresh("a")
+        self.assertEqual(
+            get_function_stats("test_project.tests.get_adaptive_result").timeouts.last,
+            120,
+        )
+
+    def test_timeout_of_none_is_rejected(self):
+        with self.assertRaises(ValueError):
+            cached(None, adaptive_timeout=(30, 600))(lambda key: key)
+
+
+@cached(
+    60 * 60,
+    min_compute_seconds=0.5,
+    max_value_bytes=1024,
+    admit=lambda result: result != [],
+)
+def get_admitted_result(key, size=1):
+    return [key] * size
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def _get_counters(self):
+        return get_stats()["test_project.tests.get_admitted_result"]
+
+    def test_expensive_results_are_saved(self):
+        with patch("cache_helper.decorators.time.perf_counter") as perf_counter:
+            perf_counter.side_effect = [0, 1]
+            get_admitted_result("a")
+
+        with patch("django.core.cache.cache.set") as cache_set:
+            self.assertEqual(get_admitted_result("a"), ["a"])
+        cache_set.assert_not_called()
+        self.assertNotIn("skipped_writes", self._get_counters())
+
+    def test_cheap_results_are_not_saved(self):
+        with patch("django.core.cache.cache.set") as cache_set:
+            get_admitted_result("a")
+        cache_set.assert_not_called()
+
+        counters = self._get_counters()
+        self.assertEqual(counters["skipped_writes"], 1)
+        self.assertEqual(counters["skipped_writes.min_compute_seconds"], 1)
+
+    def test_oversized_and_rejected_results_are_not_saved(self):
+        with patch("cache_helper.decorators.time.perf_counter") as perf_counter:
+            perf_counter.side_effect = [0, 1, 0, 1]
+            get_admitted_result("a", size=1000)
+            get_admitted_result("a", size=0)
+
+        counters = self._get_counters()
+        self.assertEqual(counters["skipped_writes"], 2)
+        self.assertEqual(counters["skipped_writes.max_value_bytes"], 1)
+        self.assertEqual(counters["skipped_writes.admit"], 1)
+
+
+STREAM_CALLS = []
+
+
+@cached(60 * 60, streaming=True, chunk_size=3)
+def stream_numbers(count):
+    STREAM_CALLS.append(count)
+    for number in range(count):
+        yield number
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        logging.disable(DISABLE_LOGGING_BELOW)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        STREAM_CALLS.clear()
+        logging.disable(logging.NOTSET)
+
+    def test_stream_is_cached(self):
+        self.assertEqual(list(stream_numbers(10)), list(range(10)))
+        self.assertEqual(list(stream_numbers(10)), list(range(10)))
+        self.assertEqual(STREAM_CALLS, [10])
+
+        # Empty streams are cached too
+        self.assertEqual(list(stream_numbers(0)), [])
+        self.assertEqual(list(stream_numbers(0)), [])
+        self.assertEqual(STREAM_CALLS, [10, 0])
+
+    def test_chunks_are_fetched_lazily(self):
+        list(stream_numbers(30))
+
+        with patch("cache_helper.settings.STREAM_PREFETCH_CHUNKS", 2):
+            with patch(
+                "django.core.cache.cache.get_many", wraps=cache.get_many
+            ) as cache_get_many:
+                numbers = stream_numbers(30)
+                self.assertEqual(next(numbers), 0)
+                self.assertEqual(cache_get_many.call_count, 1)
+                # Two chunks of three items per get_many
+                self.assertEqual([next(numbers) for _ in range(6)], [1, 2, 3, 4, 5, 6])
+                self.assertEqual(cache_get_many.call_count, 2)
+                self.assertEqual(list(numbers), list(range(7, 30)))
+                self.assertEqual(cache_get_many.call_count, 5)
+
+    def test_abandoned_stream_is_not_cached(self):
+        numbers = stream_numbers(10)
+        self.assertEqual([next(numbers) for _ in range(5)], list(range(5)))
+        numbers.close()
+
+        self.assertEqual(list(stream_numbers(10)), list(range(10)))
+        self.assertEqual(STREAM_CALLS, [10, 10])
+
+    def test_invalidate_deletes_the_chunks(self):
+        list(stream_numbers(10))
+        cache_key_hashed, _ = stream_numbers.get_cache_keys(10)
+        header = cache.get(cache_key_hashed)
+        self.assertEqual(header.chunk_count, 4)
+        chunk_keys = [
+            get_chunk_key(cache_key_hashed, header.token, index) for index in range(4)
+        ]
+        self.assertEqual(len(cache.get_many(chunk_keys)), 4)
+
+        stream_numbers.invalidate(10)
+        self.assertIsNone(cache.get(cache_key_hashed))
+        self.assertEqual(cache.get_many(chunk_keys), {})
+        self.assertEqual(list(stream_numbers(10)), list(range(10)))
+        self.assertEqual(STREAM_CALLS, [10, 10])
+
+    def test_missing_chunk_falls_back_to_function(self):
+        list(stream_numbers(10))
+
+        with patch("django.core.cache.cache.get_many", side_effect=[{}]):
+            self.assertEqual(list(stream_numbers(10)), list(range(10)))
+        self.assertEqual(STREAM_CALLS, [10, 10])
+
+    def test_options_for_whole_results_are_rejected(self):
+        def numbers():
+            yield 1
+
+        for options in (
+            {"admit": bool},
+            {"serializer": "pickle"},
+            {"shared_memory": True},
+            {"disk": True},
+            {"replicas": 3},
+        ):
+            with self.assertRaises(ValueError):
+                cached(60, streaming=True, **options)(numbers)
+
+    def test_stream_with_read_only_bypass(self):
+        with bypass(reads=False):
+            self.assertEqual(list(stream_numbers(5)), list(range(5)))
+        self.assertEqual(list(stream_numbers(5)), list(range(5)))
+        self.assertEqual(STREAM_CALLS, [5, 5])
+
+
+class CompanyQueries:
+    @staticmethod
+    @cached(60 * 60, result_adapter=ModelResultAdapter(fields=["name"]))
+    def get_companies(name_prefix):
+        return Company.objects.filter(name__startswith=name_prefix).order_by("name")
+
+    @staticmethod
+    @cached(60 * 60, result_adapter=ModelResultAdapter(refetch=True))
+    def get_company_list(name_prefix):
+        return list(
+            Company.objects.filter(name__startswith=name_prefix).order_by("name")
+        )
+
+    @staticmethod
+    @cached(60 * 60, result_adapter=ModelResultAdapter())
+    def get_company(company_id):
+        return Company.objects.get(pk=company_id)
+
+    @staticmethod
+    @cached(60 * 60, result_adapter=ModelResultAdapter())
+    def get_company_names_only(name_prefix):
+        return (
+            Company.objects.filter(name__startswith=name_prefix)
+            .order_by("name")
+            .only("name")
+        )
+
+    @staticmethod
+    @cached(60 * 60, result_adapter=ModelResultAdapter())
+    def get_company_names(name_prefix):
+        return (
+            Company.objects.filter(name__startswith=name_prefix)
+            .order_by("name")
+            .values_list("name", flat=True)
+        )
+
+
+class ModelResultAdapterTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.exchange = Exchange.objects.create(name="NYSE")
+        self.apple = Company.objects.create(name="Apple", exchange=self.exchange)
+        self.amazon = Company.objects.create(name="Amazon", exchange=self.exchange)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_queryset_is_stored_compactly(self):
+        with self.assertNumQueries(1):
+            companies = CompanyQueries.get_companies("A")
+            self.assertEqual(list(companies), [self.amazon, self.apple])
+
+        with patch("django.core.cache.cache.set") as cache_set:
+            CompanyQueries.get_companies.invalidate("A")
+            CompanyQueries.get_companies("A")
+        cached_value = cache_set.call_args[0][1]
+        self.assertIsInstance(cached_value, CompactModelResult)
+        self.assertEqual(cached_value.attnames, ["id", "name"])
+        self.assertEqual(
+            cached_value.rows, [(self.amazon.pk, "Amazon"), (self.apple.pk, "Apple")]
+        )
+
+    def test_queryset_is_rebuilt_on_hit(self):
+        CompanyQueries.get_companies("A")
+
+        with self.assertNumQueries(0):
+            companies = CompanyQueries.get_companies("A")
+            self.assertEqual(companies, [self.amazon, self.apple])
+            self.assertEqual(
+                [company.name for company in companies], ["Amazon", "Apple"]
+            )
+
+        # Fields that were not stored are deferred
+        with self.assertNumQueries(1):
+            self.assertEqual(companies[0].exchange_id, self.exchange.pk)
+
+    def test_refetch_on_hit(self):
+        CompanyQueries.get_company_list("A")
+        self.amazon.name = "Amazon.com"
+        self.amazon.save()
+        self.apple.delete()
+
+        with self.assertNumQueries(1):
+            companies = CompanyQueries.get_company_list("A")
+        self.assertEqual(companies, [self.amazon])
+        self.assertEqual(companies[0].name, "Amazon.com")
+
+    def test_single_instance(self):
+        CompanyQueries.get_company(self.apple.pk)
+
+        with self.assertNumQueries(0):
+            company = CompanyQueries.get_company(self.apple.pk)
+        self.assertEqual(company, self.apple)
+        self.assertEqual(company.exchange_id, self.exchange.pk)
+
+    def test_deferred_fields_are_not_loaded(self):
+        with self.assertNumQueries(1):
+            companies = CompanyQueries.get_company_names_only("A")
+        self.assertEqual([company.name for company in companies], ["Amazon", "Apple"])
+
+        with self.assertNumQueries(0):
+            companies = CompanyQueries.get_company_names_only("A")
+            self.assertEqual(
+                [company.name for company in companies], ["Amazon", "Apple"]
+            )
+        self.assertEqual(companies[0].get_deferred_fields(), {"exchange_id"})
+
+    def test_values_list_queryset(self):
+        self.assertEqual(
+            list(CompanyQueries.get_company_names("A")), ["Amazon", "Apple"]
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(CompanyQueries.get_company_names("A"), ["Amazon", "Apple"])
+
+
+@cached(60 * 60, shared_memory=True)
+def get_shared_datetime(useless_arg):
+    return datetime.utcnow()
+
+
+class SharedMemoryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache_helper")
+        self.shared_memory_cache = SharedMemoryCache(
+            self.path, slot_count=16, slot_size=256
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        self.temp_dir.cleanup()
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.shared_memory_cache.get("a"))
+        self.assertTrue(self.shared_memory_cache.set("a", {"b": 1}, 60))
+        self.assertEqual(self.shared_memory_cache.get("a"), {"b": 1})
+
+        self.shared_memory_cache.delete("a")
+        self.assertIsNone(self.shared_memory_cache.get("a"))
+
+    def test_expiry(self):
+        self.shared_memory_cache.set("a", 1, 60)
+        with patch(
+            "cache_helper.shared_memory.time.time", return_value=time.time() + 61
+        ):
+            self.assertIsNone(self.shared_memory_cache.get("a"))
+
+    def test_oversized_values_are_not_saved(self):
+        self.assertFalse(self.shared_memory_cache.set("a", "x" * 256, 60))
+        self.assertIsNone(self.shared_memory_cache.get("a"))
+
+    def test_torn_slot_is_ignored(self):
+        self.shared_memory_cache.set("a", "value", 60)
+        offset, _ = self.shared_memory_cache._locate("a")
+        self.shared_memory_cache._map[offset + SLOT_HEADER_SIZE] ^= 0xFF
+        self.assertIsNone(self.shared_memory_cache.get("a"))
+
+    def test_values_are_shared_across_processes(self):
+        def set_value():
+            SharedMemoryCache(self.path, slot_count=16, slot_size=256).set(
+                "a", "from child", 60
+            )
+
+        process = multiprocessing.get_context("fork").Process(target=set_value)
+        process.start()
+        process.join()
+        self.assertEqual(self.shared_memory_cache.get("a"), "from child")
+
+    def test_decorator_reads_through_shared_memory(self):
+        with patch(
+            "cache_helper.settings.SHARED_MEMORY",
+            {"PATH": self.path, "SLOTS": 16, "SLOT_SIZE": 256},
+        ), patch("cache_helper.shared_memory._instance", None):
+            initial_datetime = get_shared_datetime(1)
+
+            # Served from shared memory without going to the Django cache
+            with patch("django.core.cache.cache.get") as cache_get:
+                self.assertEqual(get_shared_datetime(1), initial_datetime)
+            cache_get.assert_not_called()
+
+            get_shared_datetime.invalidate(1)
+            self.assertNotEqual(get_shared_datetime(1), initial_datetime)
+
+    def test_unreadable_slot_is_a_miss(self):
+        with patch(
+            "cache_helper.settings.SHARED_MEMORY",
+            {"PATH": self.path, "SLOTS": 16, "SLOT_SIZE": 256},
+        ), patch("cache_helper.shared_memory._instance", self.shared_memory_cache):
+            initial_datetime = get_shared_datetime(1)
+
+            # Like a value pickled by a newer deploy, which refers to a module this one doesn't have
+            cache_key_hashed, _ = get_shared_datetime.get_cache_keys(1)
+            offset, key_digest = self.shared_memory_cache._locate(cache_key_hashed)
+            self.shared_memory_cache._write(
+                offset, key_digest, time.time() + 60, b"cnew_module\nValue\n."
+            )
+
+            with self.assertLogs("cache_helper.decorators", logging.WARNING):
+                self.assertEqual(get_shared_datetime(1), initial_datetime)
+
+    def test_unopenable_file_disables_the_tier(self):
+        path = os.path.join(self.temp_dir.name, "missing", "cache_helper")
+        with patch("cache_helper.settings.SHARED_MEMORY", {"PATH": path}), patch(
+            "cache_helper.shared_memory._instance", None
+        ):
+            with self.assertLogs("cache_helper.shared_memory", logging.WARNING):
+                initial_datetime = get_shared_datetime(1)
+            self.assertEqual(get_shared_datetime(1), initial_datetime)
+            self.assertIsNone(get_shared_memory_cache())
+
+
+@cached(60 * 60, disk=True)
+def get_large_result(size):
+    return "x" * size
+
+
+@cached(60 * 60, disk=True, depends_on={Exchange: lambda exchange: [(exchange.pk,)]})
+def get_exchange_name_on_disk(exchange_id):
+    return Exchange.objects.get(pk=exchange_id).name
+
+
+class DiskCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache_helper.sqlite3")
+        self.disk_cache = DiskCache(self.path, max_size=1000)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        self.temp_dir.cleanup()
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.disk_cache.get("a"))
+        self.disk_cache.set("a", {"b": 1}, 60)
+        self.assertEqual(self.disk_cache.get("a"), {"b": 1})
+        self.disk_cache.set("c", 1, None)
+        self.assertEqual(self.disk_cache.get("c"), 1)
+
+        self.disk_cache.delete("a")
+        self.assertIsNone(self.disk_cache.get("a"))
+
+    def test_expiry(self):
+        self.disk_cache.set("a", 1, 60)
+        with patch("cache_helper.disk.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.disk_cache.get("a"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.disk_cache.set("a", "x" * 400, 600)
+        with patch("cache_helper.disk.time.time", return_value=time.time() + 1):
+            self.disk_cache.set("b", "x" * 400, 600)
+        with patch("cache_helper.disk.time.time", return_value=time.time() + 120):
+            # Reading "a" makes "b" the least recently used entry
+            self.disk_cache.get("a")
+            self.disk_cache.set("c", "x" * 400, 600)
+
+        self.assertIsNotNone(self.disk_cache.get("a"))
+        self.assertIsNone(self.disk_cache.get("b"))
+        self.assertIsNotNone(self.disk_cache.get("c"))
+
+    def test_total_size_is_checked_after_enough_writes(self):
+        disk_cache = DiskCache(self.path, max_size=16000)
+        with patch.object(disk_cache, "_evict", wraps=disk_cache._evict) as evict:
+            for index in range(10):
+                disk_cache.set(str(index), "x" * 50, 600)
+            evict.assert_not_called()
+
+            disk_cache.set("large", "x" * 1000, 600)
+            evict.assert_called_once()
+
+    def test_shared_across_connections(self):
+        self.disk_cache.set("a", 1, 60)
+        self.assertEqual(DiskCache(self.path).get("a"), 1)
+
+    def test_decorator_falls_back_to_disk(self):
+        with patch(
+            "cache_helper.settings.DISK", {"PATH": self.path, "MIN_SIZE": 100}
+        ), patch("cache_helper.disk._instance", None):
+            get_large_result(500)
+            get_large_result(50)
+
+            # The Django cache lost the entries, e.g. to eviction, but the large one is still on disk
+            cache.delete_many(
+                [get_large_result.get_cache_keys(size)[0] for size in (500, 50)]
+            )
+            with patch(
+                "cache_helper.decorators._CachedFunction.compute_and_save"
+            ) as compute_and_save:
+                self.assertEqual(get_large_result(500), "x" * 500)
+                compute_and_save.assert_not_called()
+                get_large_result(50)
+                compute_and_save.assert_called_once()
+
+            get_large_result.invalidate(500)
+            cache_key = utils.get_hashed_cache_key(
+                utils.get_function_cache_key(
+                    "test_project.tests.get_large_result", (500,), {}
+                )
+            )
+            self.assertIsNone(DiskCache(self.path).get(cache_key))
+
+    def test_unreadable_disk_copy_is_recomputed(self):
+        with patch(
+            "cache_helper.settings.DISK", {"PATH": self.path, "MIN_SIZE": 100}
+        ), patch("cache_helper.disk._instance", self.disk_cache):
+            get_large_result(500)
+            cache_key_hashed, _ = get_large_result.get_cache_keys(500)
+            cache.delete(cache_key_hashed)
+
+            # Like a value pickled by a deploy with a class this one no longer has
+            token, _ = self.disk_cache.get(cache_key_hashed)
+            self.disk_cache.set(
+                cache_key_hashed, (token, b"ctest_project.tests\nRemovedClass\n."), 60
+            )
+
+            with self.assertLogs("cache_helper.decorators", logging.WARNING):
+                self.assertEqual(get_large_result(500), "x" * 500)
+            token, data = self.disk_cache.get(cache_key_hashed)
+            self.assertEqual(pickle.loads(data), "x" * 500)
+
+    def test_invalidating_from_another_host_invalidates_the_disk(self):
+        with patch("cache_helper.settings.DISK", {"PATH": self.path}), patch(
+            "cache_helper.disk._instance", None
+        ):
+            self.assertEqual(get_large_result(500), "x" * 500)
+            cache_key_hashed, _ = get_large_result.get_cache_keys(500)
+
+            # Another host only reaches the Django cache
+            cache.delete_many(
+                get_large_result.cached_function.get_invalidation_keys((500,), {})
+            )
+            with patch(
+                "cache_helper.decorators._CachedFunction.compute_and_save"
+            ) as compute_and_save:
+                get_large_result(500)
+                compute_and_save.assert_called_once()
+            self.assertIsNone(DiskCache(self.path).get(cache_key_hashed))
+
+    def test_model_changes_invalidate_the_disk(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            exchange = Exchange.objects.create(name="NYSE")
+        with patch("cache_helper.settings.DISK", {"PATH": self.path}), patch(
+            "cache_helper.disk._instance", None
+        ):
+            self.assertEqual(get_exchange_name_on_disk(exchange.pk), "NYSE")
+            cache_key_hashed, _ = get_exchange_name_on_disk.get_cache_keys(exchange.pk)
+            self.assertIsNotNone(DiskCache(self.path).get(cache_key_hashed))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                exchange.name = "LSE"
+                exchange.save()
+            self.assertIsNone(DiskCache(self.path).get(cache_key_hashed))
+            self.assertEqual(get_exchange_name_on_disk(exchange.pk), "LSE")
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.spans = []
+
+        @contextlib.contextmanager
+        def hook(name, tags):
+            yield
+            self.spans.append((name, dict(tags)))
+
+        self.hook = hook
+        set_trace_hook(hook)
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        set_trace_hook(None)
+
+    def test_spans_on_miss_and_hit(self):
+        Incrementer.get_datetime(1)
+        function = "test_project.tests.Incrementer.get_datetime"
+        self.assertEqual(
+            [name for name, _ in self.spans],
+            [
+                "cache_helper.build_key",
+                "cache_helper.get",
+                "cache_helper.compute",
+                "cache_helper.set",
+                "cache_helper.call",
+            ],
+        )
+        self.assertEqual(self.spans[1][1], {"function": function, "hit": False})
+        self.assertEqual(self.spans[3][1]["function"], function)
+        self.assertGreater(self.spans[3][1]["value_size"], 0)
+        self.assertEqual(self.spans[4][1], {"function": function, "hit": False})
+
+        self.spans.clear()
+        Incrementer.get_datetime(1)
+        self.assertEqual(
+            [name for name, _ in self.spans],
+            [
+                "cache_helper.build_key",
+                "cache_helper.get",
+                "cache_helper.call",
+            ],
+        )
+        self.assertEqual(self.spans[2][1], {"function": function, "hit": True})
+
+    def test_value_size_of_serialized_values(self):
+        get_serialized_result("numbers")
+        # Measured from the bytes of the serializer, without pickling them again
+        set_tags = next(tags for name, tags in self.spans if name == "cache_helper.set")
+        cache_key_hashed, _ = get_serialized_result.get_cache_keys("numbers")
+        self.assertEqual(set_tags["value_size"], len(cache.get(cache_key_hashed).data))
+
+    def test_slow_call_recorder(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "slow_calls.json")
+            recorder = SlowCallRecorder(path, slowest=2)
+            set_trace_hook(recorder)
+
+            for num in range(5):
+                Incrementer.get_datetime(num)
+            Incrementer.get_datetime(1)
+            recorder.dump()
+
+            with open(path) as slow_calls_file:
+                slow_calls = json.load(slow_calls_file)
+
+        calls = slow_calls["test_project.tests.Incrementer.get_datetime"]
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(calls[0]["duration"], calls[1]["duration"])
+        self.assertEqual(
+            [span["name"] for span in calls[0]["spans"]],
+            [
+                "cache_helper.build_key",
+                "cache_helper.get",
+                "cache_helper.compute",
+                "cache_helper.set",
+            ],
+        )
+
+    def test_call_span_covers_iterating_streams(self):
+        stream = stream_numbers(5)
+        self.assertNotIn("cache_helper.call", [name for name, _ in self.spans])
+        self.assertEqual(list(stream), [0, 1, 2, 3, 4])
+        self.assertEqual(self.spans[-1][0], "cache_helper.call")
+
+        # Closed early
+        self.spans.clear()
+        stream = stream_numbers(6)
+        next(stream)
+        stream.close()
+        self.assertEqual(self.spans[-1][0], "cache_helper.call")
+
+        # Never started
+        self.spans.clear()
+        stream_numbers(7)
+        self.assertEqual(self.spans[-1][0], "cache_helper.call")
+        STREAM_CALLS.clear()
+
+    def test_slow_call_recorder_with_streams(self):
+        recorder = SlowCallRecorder("unused.json")
+        set_trace_hook(recorder)
+
+        # Another call made while a stream is open
+        stream = stream_numbers(5)
+        Incrementer.get_datetime(1)
+        self.assertEqual(list(stream), [0, 1, 2, 3, 4])
+        STREAM_CALLS.clear()
+
+        slowest_calls = recorder.get_slowest_calls()
+        self.assertEqual(len(slowest_calls["test_project.tests.stream_numbers"]), 1)
+        self.assertEqual(
+            len(slowest_calls["test_project.tests.Incrementer.get_datetime"]), 1
+        )
+        self.assertEqual(recorder._local.stack, [])
+
+    def test_slow_call_recorder_sampling(self):
+        recorder = SlowCallRecorder("unused.json", sample_rate=0, hook=self.hook)
+        set_trace_hook(recorder)
+        Incrementer.get_datetime(1)
+        self.assertEqual(recorder.get_slowest_calls(), {})
+        # Spans are still passed on to the wrapped hook
+        self.assertEqual(len(self.spans), 5)
+
+
+class KeyCardinalityTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_hyperloglog_estimate(self):
+        for distinct_count in [10, 1000, 20000]:
+            sketch = HyperLogLog()
+            for _ in range(2):
+                for num in range(distinct_count):
+                    sketch.add(
+                        hash_from_cache_key(utils.get_hashed_cache_key(str(num)))
+                    )
+            self.assertAlmostEqual(
+                sketch.count(), distinct_count, delta=distinct_count * 0.1
+            )
+        self.assertEqual(len(sketch.registers), 1024)
+
+    @patch("cache_helper.settings.TRACK_KEY_CARDINALITY", True)
+    def test_cardinality_report(self):
+        for num in range(200):
+            jittered_echo(datetime.utcnow())
+            Incrementer.get_datetime(num % 5)
+        Incrementer.func_with_multiple_args_and_kwargs(1, 2)
+
+        report = get_cardinality_report(min_calls=100)
+        # Functions with too few calls are left out, and the most distinct keys per call come first
+        self.assertEqual(
+            [row["function"] for row in report],
+            [
+                "test_project.tests.jittered_echo",
+                "test_project.tests.Incrementer.get_datetime",
+            ],
+        )
+
+        unique_args, repeated_args = report
+        self.assertTrue(unique_args["flagged"])
+        self.assertEqual(unique_args["calls"], 200)
+        self.assertEqual(unique_args["hits"], 0)
+        self.assertGreater(unique_args["distinct_ratio"], 0.9)
+
+        self.assertFalse(repeated_args["flagged"])
+        self.assertEqual(repeated_args["hits"], 195)
+        self.assertEqual(repeated_args["distinct_keys"], 5)
+
+    def test_not_tracked_by_default(self):
+        Incrementer.get_datetime(1)
+        self.assertEqual(get_cardinality_report(min_calls=0), [])
+
+
+@cached(60 * 60)
+def get_hot_list(key):
+    return [key]
+
+
+class HotKeyTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_count_min_sketch(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        hot_key = utils.get_hashed_cache_key("hot")
+        for num in range(1000):
+            sketch.add(hot_key)
+            sketch.add(utils.get_hashed_cache_key(str(num)))
+
+        # Never underestimated
+        self.assertGreaterEqual(sketch.estimate(hot_key), 1000)
+        self.assertLess(sketch.estimate(utils.get_hashed_cache_key("0")), 1000)
+
+        sketch.decay()
+        self.assertGreaterEqual(sketch.estimate(hot_key), 500)
+        self.assertLess(sketch.estimate(hot_key), 1000)
+
+    def test_promotion(self):
+        hot_key_cache = HotKeyCache(threshold=3, timeout=1, max_entries=2)
+        for _ in range(2):
+            hot_key_cache.record_read("a" * 64, "func", 1)
+        self.assertIsNone(hot_key_cache.get("a" * 64))
+
+        hot_key_cache.record_read("a" * 64, "func", 1)
+        self.assertEqual(hot_key_cache.get("a" * 64), 1)
+
+        with patch(
+            "cache_helper.hot_keys.time.monotonic", return_value=time.monotonic() + 2
+        ):
+            self.assertIsNone(hot_key_cache.get("a" * 64))
+
+    def test_max_entries(self):
+        hot_key_cache = HotKeyCache(threshold=1, max_entries=2)
+        for key in ["a", "b", "c"]:
+            hot_key_cache.record_read(key * 64, "func", key)
+        self.assertEqual(
+            sorted(hot_key["key"] for hot_key in hot_key_cache.get_hot_keys()),
+            ["b" * 64, "c" * 64],
+        )
+        self.assertIsNone(hot_key_cache.get("a" * 64))
+
+    def test_decorator_serves_hot_keys_locally(self):
+        with patch("cache_helper.settings.HOT_KEYS", {"THRESHOLD": 5}), patch(
+            "cache_helper.hot_keys._instance", None
+        ):
+            initial_datetime = Incrementer.get_datetime(1)
+            Incrementer.get_datetime(2)
+            for _ in range(5):
+                Incrementer.get_datetime(1)
+
+            with patch("django.core.cache.cache.get") as cache_get:
+                self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+            cache_get.assert_not_called()
+
+            hot_keys = get_hot_keys()
+            self.assertEqual(len(hot_keys), 1)
+            self.assertEqual(
+                hot_keys[0]["function"], "test_project.tests.Incrementer.get_datetime"
+            )
+            self.assertGreaterEqual(hot_keys[0]["estimated_reads"], 5)
+
+            Incrementer.get_datetime.invalidate(1)
+            self.assertEqual(get_hot_keys(), [])
+            self.assertNotEqual(Incrementer.get_datetime(1), initial_datetime)
+
+    def test_mutating_hot_results_does_not_leak(self):
+        with patch("cache_helper.settings.HOT_KEYS", {"THRESHOLD": 2}), patch(
+            "cache_helper.hot_keys._instance", None
+        ):
+            for _ in range(3):
+                get_hot_list("a")
+            self.assertEqual(len(get_hot_keys()), 1)
+
+            get_hot_list("a").append("mutated")
+            self.assertEqual(get_hot_list("a"), ["a"])
+
+    def test_immutable_values_are_not_pickled(self):
+        hot_key_cache = HotKeyCache(threshold=1)
+        value = ("a", 1)
+        hot_key_cache.record_read("a" * 64, "func", value)
+        self.assertIs(hot_key_cache.get("a" * 64), value)
+
+        hot_key_cache.record_read("b" * 64, "func", ["b"])
+        self.assertEqual(hot_key_cache.get("b" * 64), ["b"])
+        self.assertIsNot(hot_key_cache.get("b" * 64), hot_key_cache.get("b" * 64))
+
+
+class PrefetchTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        Incrementer.class_counter = 500
+
+    def test_prefetch_batches_lookups(self):
+        incrementer = Incrementer(100)
+        initial_datetime = Incrementer.get_datetime(1)
+        self.assertEqual(incrementer.instance_increment_by(1), 101)
+        self.assertEqual(Incrementer.class_increment_by(1), 501)
+
+        with prefetch() as batch:
+            batch.add(Incrementer.get_datetime, 1)
+            batch.add(incrementer.instance_increment_by, 1)
+            batch.add(Incrementer.class_increment_by, 1)
+            with patch(
+                "django.core.cache.cache.get_many", wraps=cache.get_many
+            ) as cache_get_many:
+                batch.fetch()
+
+            # The local memory backend implements get_many with get, so only patch it once the batch is fetched
+            with patch("django.core.cache.cache.get") as cache_get:
+                self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+                self.assertEqual(incrementer.instance_increment_by(1), 101)
+                self.assertEqual(Incrementer.class_increment_by(1), 501)
+
+        cache_get.assert_not_called()
+        cache_get_many.assert_called_once()
+        self.assertEqual(len(cache_get_many.call_args[0][0]), 3)
+
+    def test_prefetched_misses_are_computed(self):
+        incrementer = Incrementer(100)
+
+        with prefetch() as batch:
+            batch.add(incrementer.instance_increment_by, 1)
+            batch.add(incrementer.instance_increment_by, 2)
+            batch.fetch()
+
+            with patch("django.core.cache.cache.get") as cache_get:
+                self.assertEqual(incrementer.instance_increment_by(1), 101)
+            cache_get.assert_not_called()
+
+            # Once computed, the value is retrieved from the cache as usual
+            self.assertEqual(incrementer.instance_increment_by(1), 101)
+            self.assertEqual(incrementer.instance_increment_by(2), 103)
+
+        self.assertEqual(incrementer.instance_increment_by(2), 103)
+
+    def test_calls_that_were_not_prefetched(self):
+        with prefetch() as batch:
+            batch.add(Incrementer.get_datetime, 1)
+            initial_datetime = Incrementer.get_datetime(2)
+            self.assertEqual(Incrementer.get_datetime(2), initial_datetime)
+
+
+@cached(60 * 60, memoize_keys=2)
+def get_memoized_type_name(value, suffix=""):
+    return type(value).__name__ + suffix
+
+
+class KeyMemoTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_repeat_calls_skip_building_the_key(self):
+        with patch(
+            "cache_helper.utils.build_cache_key_using_dfs",
+            wraps=utils.build_cache_key_using_dfs,
+        ) as dfs:
+            self.assertEqual(get_memoized_type_name("a", suffix="!"), "str!")
+            built_count = dfs.call_count
+            self.assertEqual(get_memoized_type_name("a", suffix="!"), "str!")
+
+        self.assertGreater(built_count, 0)
+        self.assertEqual(dfs.call_count, built_count)
+
+    def test_memoized_keys_match_built_keys(self):
+        built_keys = get_memoized_type_name.get_cache_keys((1, "a"), suffix="?")
+        self.assertEqual(
+            get_memoized_type_name.get_cache_keys((1, "a"), suffix="?"), built_keys
+        )
+
+        with patch("cache_helper.decorators.get_memo_key", return_value=None):
+            self.assertEqual(
+                get_memoized_type_name.get_cache_keys((1, "a"), suffix="?"), built_keys
+            )
+
+    def test_equal_values_of_different_types(self):
+        self.assertEqual(get_memoized_type_name(1), "int")
+        self.assertEqual(get_memoized_type_name(True), "bool")
+        self.assertEqual(get_memoized_type_name(1.0), "float")
+        self.assertEqual(get_memoized_type_name((1,)), "tuple")
+        self.assertEqual(get_memoized_type_name((True,)), "tuple")
+
+        self.assertNotEqual(get_memo_key((1,), {}), get_memo_key((True,), {}))
+        self.assertNotEqual(get_memo_key(((1,),), {}), get_memo_key(((1.0,),), {}))
+        self.assertNotEqual(get_memo_key((0.0,), {}), get_memo_key((-0.0,), {}))
+
+    def test_mutable_arguments_are_not_memoized(self):
+        self.assertIsNone(get_memo_key(([1],), {}))
+        self.assertIsNone(get_memo_key(((1, {}),), {}))
+        self.assertIsNone(get_memo_key((), {"value": {1}}))
+        self.assertIsNone(get_memo_key((Incrementer(1),), {}))
+
+        with patch(
+            "cache_helper.utils.build_cache_key_using_dfs",
+            wraps=utils.build_cache_key_using_dfs,
+        ) as dfs:
+            self.assertEqual(get_memoized_type_name([1, 2]), "list")
+            built_count = dfs.call_count
+            self.assertEqual(get_memoized_type_name([1, 2]), "list")
+
+        self.assertEqual(dfs.call_count, built_count * 2)
+
+    def test_memo_is_bounded(self):
+        key_memo = KeyMemo(max_entries=2)
+        key_memo.set("a", ("hashed_a", "a"))
+        key_memo.set("b", ("hashed_b", "b"))
+        self.assertEqual(key_memo.get("a"), ("hashed_a", "a"))
+
+        # 'b' is now the least recently used
+        key_memo.set("c", ("hashed_c", "c"))
+        self.assertEqual(len(key_memo), 2)
+        self.assertIsNone(key_memo.get("b"))
+        self.assertEqual(key_memo.get("a"), ("hashed_a", "a"))
+        self.assertEqual(key_memo.get("c"), ("hashed_c", "c"))
+
+
+@cached(60 * 60, serializer="auto")
+def get_serialized_result(kind):
+    if kind == "bytes":
+        return b"\x00\x01"
+    if kind == "numbers":
+        return [1, 2.5, (3, "four"), {"five": None}]
+    return {"created": datetime(2020, 1, 1), "kind": kind}
+
+
+@cached(60 * 60, serializer="raw")
+def get_raw_result(value):
+    return value
+
+
+@cached(60 * 60)
+def get_bytes_result(data):
+    return data
+
+
+class SerializerTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+        reset_stats()
+
+    def _get_saved_value(self, func, *args):
+        cache_key_hashed, _ = func.get_cache_keys(*args)
+        return cache.get(cache_key_hashed)
+
+    def test_auto_serializer(self):
+        for kind, type_code in (("numbers", b"m"), ("objects", b"p")):
+            value = get_serialized_result(kind)
+            saved_value = self._get_saved_value(get_serialized_result, kind)
+            self.assertEqual(saved_value.data[:1], type_code)
+            self.assertEqual(get_serialized_result(kind), value)
+
+        # Scalars, bytes included, are saved as they are
+        self.assertEqual(get_serialized_result("bytes"), b"\x00\x01")
+        self.assertEqual(
+            self._get_saved_value(get_serialized_result, "bytes"), b"\x00\x01"
+        )
+        self.assertEqual(get_serialized_result("bytes"), b"\x00\x01")
+        for value in (None, True, 1, 2.5, "text", b"data"):
+            self.assertIs(get_serializer("auto").serialize(value), value)
+
+        self.assertEqual(
+            get_serialized_result("numbers"), [1, 2.5, (3, "four"), {"five": None}]
+        )
+
+    def test_serializers_round_trip(self):
+        value = {"a": [1, 2.5, None, True], "b": "text"}
+        for name in ("pickle", "marshal", "json", "auto"):
+            serialized = get_serializer(name).serialize(value)
+            self.assertIs(type(serialized), SerializedValue)
+            self.assertEqual(
+                pickle.loads(pickle.dumps(serialized)).data, serialized.data
+            )
+            self.assertEqual(deserialize(serialized), value)
+
+        self.assertEqual(deserialize(get_serializer("raw").serialize(b"data")), b"data")
+        # JSON reads tuples back as lists
+        self.assertEqual(deserialize(get_serializer("json").serialize((1, 2))), [1, 2])
+
+    def test_fast_paths_only_accept_primitive_structures(self):
+        recursive_list = []
+        recursive_list.append(recursive_list)
+
+        for value in (
+            bytearray(b"data"),
+            HTTPStatus.OK,
+            recursive_list,
+            [datetime(2020, 1, 1)],
+        ):
+            with self.assertRaises(SerializationError):
+                get_serializer("marshal").serialize(value)
+        with self.assertRaises(SerializationError):
+            get_serializer("json").serialize({1: "a"})
+        with self.assertRaises(SerializationError):
+            get_serializer("raw").serialize("text")
+
+        # Auto falls back to pickle, which keeps the exact type
+        self.assertIs(
+            deserialize(get_serializer("auto").serialize(HTTPStatus.OK)), HTTPStatus.OK
+        )
+
+    def test_type_codes_are_single_bytes(self):
+        class LongTypeCodeSerializer(Serializer):
+            type_code = b"long"
+
+        with self.assertRaises(ValueError):
+            register_serializer("long", LongTypeCodeSerializer())
+
+    def test_values_saved_without_serializer_are_read_through(self):
+        cache_key_hashed, _ = get_serialized_result.get_cache_keys("legacy")
+        cache.set(cache_key_hashed, {"kind": "saved before"})
+        self.assertEqual(get_serialized_result("legacy"), {"kind": "saved before"})
+
+    def test_bytes_saved_without_serializer_are_read_through(self):
+        # Starting with the type code of the raw serializer
+        cache_key_hashed, _ = get_serialized_result.get_cache_keys("legacy")
+        cache.set(cache_key_hashed, b"raw-data")
+        self.assertEqual(get_serialized_result("legacy"), b"raw-data")
+
+    def test_serializer_setting(self):
+        with patch("cache_helper.settings.SERIALIZER", "pickle"):
+            initial_datetime = Incrementer.get_datetime(1)
+            saved_value = self._get_saved_value(Incrementer.get_datetime, 1)
+            self.assertEqual(saved_value.data[:1], b"p")
+            self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+
+        # Values are still read when the function picks another serializer, or none
+        with patch("cache_helper.settings.SERIALIZER", "json"):
+            self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+        with patch("cache_helper.settings.SERIALIZER", None):
+            self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+
+    def test_values_that_cannot_be_serialized_are_not_saved(self):
+        with self.assertLogs("cache_helper.decorators", level="WARNING"):
+            self.assertEqual(get_raw_result("text"), "text")
+        self.assertIsNone(self._get_saved_value(get_raw_result, "text"))
+
+    def test_unreadable_values_are_recomputed(self):
+        cache_key_hashed, _ = get_raw_result.get_cache_keys(b"data")
+        cache.set(cache_key_hashed, SerializedValue(b"?data"))
+        with self.assertLogs("cache_helper.decorators", level="WARNING"):
+            self.assertEqual(get_raw_result(b"data"), b"data")
+        self.assertEqual(cache.get(cache_key_hashed).data, b"rdata")
+
+    def test_bytes_results_are_never_deserialized(self):
+        # Bytes that look like serialized values, e.g. from an upload, come back as they are
+        for data in (b"p" + pickle.dumps(HTTPStatus.OK), b"rPAYLOAD"):
+            with patch("cache_helper.settings.SERIALIZER", None):
+                self.assertEqual(get_bytes_result(data), data)
+                self.assertEqual(get_bytes_result(data), data)
+            self.assertEqual(self._get_saved_value(get_bytes_result, data), data)
+
+    def test_deserialization_time_is_recorded(self):
+        get_serialized_result("objects")
+        get_serialized_result("objects")
+        get_serialized_result("objects")
+
+        stats = get_stats()["test_project.tests.get_serialized_result"]
+        self.assertEqual(stats["deserialize_seconds"]["count"], 2)
+        self.assertGreaterEqual(stats["deserialize_seconds"]["min"], 0)
+
+
+REFRESH_RESULTS = {}
+
+
+@cached(60 * 60, admit=lambda result: result != [])
+def get_admitted_refresh_result(key):
+    return REFRESH_RESULTS[key]
+
+
+@cached(60 * 60, serializer="json")
+def get_json_refresh_result(key):
+    return REFRESH_RESULTS[key]
+
+
+class RefreshTests(TestCase):
+    def setUp(self):
+        logging.disable(DISABLE_LOGGING_BELOW)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        logging.disable(logging.NOTSET)
+        cache.clear()
+        Incrementer.class_counter = 500
+        STREAM_CALLS.clear()
+        REFRESH_RESULTS.clear()
+
+    def test_refresh_function(self):
+        initial_datetime = Incrementer.get_datetime(1)
+
+        with patch("django.core.cache.cache.delete") as cache_delete:
+            refreshed_datetime = Incrementer.get_datetime.refresh(1)
+        cache_delete.assert_not_called()
+
+        self.assertNotEqual(refreshed_datetime, initial_datetime)
+        self.assertEqual(Incrementer.get_datetime(1), refreshed_datetime)
+
+    def test_refresh_instance_method(self):
+        incrementer = Incrementer(100)
+        self.assertEqual(incrementer.instance_increment_by(1), 101)
+        self.assertEqual(incrementer.instance_increment_by.refresh(1), 102)
+        self.assertEqual(incrementer.instance_increment_by(1), 102)
+
+    def test_refresh_class_method(self):
+        self.assertEqual(Incrementer.class_increment_by(1), 501)
+        self.assertEqual(Incrementer.class_increment_by.refresh(Incrementer, 1), 502)
+        self.assertEqual(Incrementer.class_increment_by(1), 502)
+
+    def test_refresh_generator_function(self):
+        self.assertEqual(list(stream_numbers(5)), [0, 1, 2, 3, 4])
+        self.assertEqual(stream_numbers.refresh(5), [0, 1, 2, 3, 4])
+        self.assertEqual(list(stream_numbers(5)), [0, 1, 2, 3, 4])
+        self.assertEqual(STREAM_CALLS, [5, 5])
+
+    def test_refresh_deletes_old_value_when_new_one_is_rejected(self):
+        REFRESH_RESULTS["a"] = [1]
+        self.assertEqual(get_admitted_refresh_result("a"), [1])
+
+        REFRESH_RESULTS["a"] = []
+        self.assertEqual(get_admitted_refresh_result.refresh("a"), [])
+        cache_key_hashed, _ = get_admitted_refresh_result.get_cache_keys("a")
+        self.assertIsNone(cache.get(cache_key_hashed))
+        self.assertEqual(get_admitted_refresh_result("a"), [])
+
+    def test_refresh_deletes_old_value_when_new_one_is_unserializable(self):
+        REFRESH_RESULTS["a"] = [1]
+        self.assertEqual(get_json_refresh_result("a"), [1])
+
+        REFRESH_RESULTS["a"] = [datetime(2020, 1, 1)]
+        self.assertEqual(get_json_refresh_result.refresh("a"), [datetime(2020, 1, 1)])
+        cache_key_hashed, _ = get_json_refresh_result.get_cache_keys("a")
+        self.assertIsNone(cache.get(cache_key_hashed))
+        self.assertEqual(get_json_refresh_result("a"), [datetime(2020, 1, 1)])
+
+    def test_refresh_async(self):
+        incrementer = Incrementer(100)
+        self.assertEqual(incrementer.instance_increment_by(1), 101)
+
+        future = incrementer.instance_increment_by.refresh_async(1)
+        self.assertEqual(future.result(timeout=5), 102)
+        self.assertEqual(incrementer.instance_increment_by(1), 102)
+
+        future = Incrementer.class_increment_by.refresh_async(Incrementer, 1)
+        self.assertEqual(future.result(timeout=5), 501)
+        self.assertEqual(Incrementer.class_increment_by(1), 501)
+
+    def test_refresh_async_keeps_bypass(self):
+        initial_datetime = Incrementer.get_datetime(1)
+        with bypass(writes=True, reads=False):
+            future = Incrementer.get_datetime.refresh_async(1)
+        self.assertNotEqual(future.result(timeout=5), initial_datetime)
+        self.assertEqual(Incrementer.get_datetime(1), initial_datetime)
+
+    def test_refresh_async_closes_old_connections(self):
+        with patch("cache_helper.refresh.close_old_connections") as close:
+            future = Incrementer.get_datetime.refresh_async(1)
+            future.result(timeout=5)
+            # Before and after the refresh
+            self.assertEqual(close.call_count, 2)
+
+            REFRESH_RESULTS.clear()
+            future = get_admitted_refresh_result.refresh_async("missing")
+            with self.assertRaises(KeyError):
+                future.result(timeout=5)
+            # Even when the refresh fails
+            self.assertEqual(close.call_count, 4)
+
+
+class Portfolio:
+    def __init__(self, name, holdings):
+        self.name = name
+        self.holdings = holdings
+        self.computations = 0
+
+    def __str__(self):
+        return f"Portfolio {self.name}"
+
+    @cached_instance_property(60 * 60)
+    def total(self):
+        """The sum of the holdings."""
+        self.computations += 1
+        return sum(self.holdings)
+
+
+class SlottedPortfolio:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    @cached_instance_property(60 * 60)
+    def total(self):
+        return 0
+
+
+class CachedInstancePropertyTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_value_is_memoized_on_the_instance(self):
+        portfolio = Portfolio("growth", [1, 2, 3])
+        self.assertEqual(portfolio.total, 6)
+
+        with patch("django.core.cache.cache.get") as cache_get:
+            self.assertEqual(portfolio.total, 6)
+        cache_get.assert_not_called()
+        self.assertEqual(portfolio.computations, 1)
+        self.assertEqual(Portfolio.total.__doc__, "The sum of the holdings.")
+
+    def test_value_is_shared_through_the_cache(self):
+        self.assertEqual(Portfolio("growth", [1, 2, 3]).total, 6)
+
+        portfolio = Portfolio("growth", [1, 2, 3, 4])
+        self.assertEqual(portfolio.total, 6)
+        self.assertEqual(portfolio.computations, 0)
+
+    def test_same_key_as_instance_method(self):
+        portfolio = Portfolio("growth", [1, 2, 3])
+        _, cache_key_string = Portfolio.total.get_cache_keys(portfolio)
+        self.assertEqual(
+            cache_key_string, "test_project.tests.Portfolio.total;Portfolio growth,;"
+        )
+
+    def test_delete_clears_both_layers(self):
+        portfolio = Portfolio("growth", [1, 2, 3])
+        other_portfolio = Portfolio("growth", [1, 2, 3])
+        self.assertEqual(portfolio.total, 6)
+
+        portfolio.holdings.append(4)
+        del portfolio.total
+        self.assertEqual(portfolio.total, 10)
+        self.assertEqual(portfolio.computations, 2)
+        self.assertEqual(other_portfolio.total, 10)
+
+        portfolio.holdings.append(5)
+        Portfolio.total.invalidate(portfolio)
+        self.assertEqual(portfolio.total, 15)
+        self.assertEqual(portfolio.computations, 3)
+
+        # Deleting a value that isn't memoized is fine
+        del Portfolio("value", []).total
+
+    def test_refresh(self):
+        portfolio = Portfolio("growth", [1, 2, 3])
+        self.assertEqual(portfolio.total, 6)
+
+        portfolio.holdings.append(4)
+        self.assertEqual(Portfolio.total.refresh(portfolio), 10)
+        self.assertEqual(portfolio.total, 10)
+        self.assertEqual(Portfolio("growth", []).total, 10)
+
+    def test_bypass(self):
+        portfolio = Portfolio("growth", [1, 2, 3])
+        with bypass():
+            self.assertEqual(portfolio.total, 6)
+            self.assertEqual(portfolio.total, 6)
+        self.assertEqual(portfolio.computations, 2)
+        self.assertNotIn("total", portfolio.__dict__)
+
+    def test_instances_without_dict(self):
+        with self.assertRaises(TypeError):
+            SlottedPortfolio("growth").total
+
+    def test_setting_is_not_allowed(self):
+        with self.assertRaises(AttributeError):
+            Portfolio("growth", []).total = 1
+
+
+@cached(60, sliding=True, max_age=600)
+def get_sliding_datetime(useless_arg):
+    return datetime.utcnow()
+
+
+class SlidingExpirationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        sliding._instance = None
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_hits_extend_the_timeout(self):
+        now = time.time()
+        with patch("time.time", return_value=now):
+            initial_datetime = get_sliding_datetime(1)
+        with patch("time.time", return_value=now + 50):
+            self.assertEqual(get_sliding_datetime(1), initial_datetime)
+        # Without the touch, the entry would have expired after 60 seconds
+        with patch("time.time", return_value=now + 100):
+            self.assertEqual(get_sliding_datetime(1), initial_datetime)
+
+    def test_touches_are_rate_limited(self):
+        cache_key_hashed, _ = get_sliding_datetime.get_cache_keys(1)
+        get_sliding_datetime(1)
+        now = time.monotonic()
+
+        with patch("django.core.cache.cache.touch") as cache_touch:
+            with patch("time.monotonic", return_value=now):
+                get_sliding_datetime(1)
+                get_sliding_datetime(1)
+            self.assertEqual(cache_touch.call_count, 1)
+            cache_touch.assert_called_with(cache_key_hashed, 60)
+
+            # Half the timeout later, the key is touched again
+            with patch("time.monotonic", return_value=now + 31):
+                get_sliding_datetime(1)
+            self.assertEqual(cache_touch.call_count, 2)
+
+    def test_max_age(self):
+        cache_key_hashed, _ = get_sliding_datetime.get_cache_keys(1)
+        initial_datetime = datetime.utcnow()
+
+        # Touches never extend the entry past its maximum age
+        cache.set(cache_key_hashed, SlidingEntry(initial_datetime, time.time() - 590))
+        with patch("django.core.cache.cache.touch") as cache_touch:
+            self.assertEqual(get_sliding_datetime(1), initial_datetime)
+        cache_touch.assert_called_once()
+        self.assertLessEqual(cache_touch.call_args[0][1], 10)
+
+        # An entry older than its maximum age is recomputed, even if it is still in the cache
+        cache.set(cache_key_hashed, SlidingEntry(initial_datetime, time.time() - 601))
+        self.assertNotEqual(get_sliding_datetime(1), initial_datetime)
+        self.assertGreater(cache.get(cache_key_hashed).created_at, time.time() - 5)
+
+    def test_values_saved_without_envelope_are_read_through(self):
+        cache_key_hashed, _ = get_sliding_datetime.get_cache_keys(1)
+        cache.set(cache_key_hashed, "saved before")
+        self.assertEqual(get_sliding_datetime(1), "saved before")
+
+        # And envelopes are unwrapped for functions that no longer slide
+        cache_key_hashed, _ = Incrementer.get_datetime.get_cache_keys(1)
+        cache.set(cache_key_hashed, SlidingEntry("saved with sliding", time.time()))
+        self.assertEqual(Incrementer.get_datetime(1), "saved with sliding")
+
+
+class FakeMemcachedClient:
+    def __init__(self, server):
+        self.connection = socket.create_connection(server.address, timeout=5)
+        self.file = self.connection.makefile("rb")
+
+    def send(self, command, data=None):
+        self.connection.sendall(
+            command + b"\r\n" + (b"" if data is None else data + b"\r\n")
+        )
+
+    def command(self, command, data=None):
+        self.send(command, data)
+        return self.file.readline()
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+class LoadTestTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = FakeMemcachedServer().start()
+        self.client = FakeMemcachedClient(self.server)
+
+    def tearDown(self):
+        super().tearDown()
+        self.client.close()
+        self.server.stop()
+        cache.clear()
+
+    def test_server_protocol(self):
+        self.assertEqual(self.client.command(b"set a 5 0 5", b"hello"), b"STORED\r\n")
+        self.assertEqual(self.client.command(b"add a 0 0 1", b"x"), b"NOT_STORED\r\n")
+        self.assertEqual(self.client.command(b"append a 0 0 1", b"!"), b"STORED\r\n")
+        self.assertEqual(self.client.command(b"get a b"), b"VALUE a 5 6\r\n")
+        self.assertEqual(self.client.file.readline(), b"hello!\r\n")
+        self.assertEqual(self.client.file.readline(), b"END\r\n")
+
+        self.assertEqual(self.client.command(b"set counter 0 0 1", b"9"), b"STORED\r\n")
+        self.assertEqual(self.client.command(b"incr counter 2"), b"11\r\n")
+        self.assertEqual(self.client.command(b"decr counter 20"), b"0\r\n")
+        self.assertTrue(self.client.command(b"incr a 1").startswith(b"CLIENT_ERROR"))
+
+        self.assertEqual(self.client.command(b"touch a -1"), b"TOUCHED\r\n")
+        self.assertEqual(self.client.command(b"get a"), b"END\r\n")
+        self.assertEqual(self.client.command(b"delete counter"), b"DELETED\r\n")
+        self.assertEqual(self.client.command(b"delete counter"), b"NOT_FOUND\r\n")
+
+        self.client.send(b"set quiet 0 0 1 noreply", b"q")
+        self.assertEqual(self.client.command(b"gets quiet")[:13], b"VALUE quiet 0")
+        self.assertEqual(self.client.file.readline(), b"q\r\n")
+        self.assertEqual(self.client.file.readline(), b"END\r\n")
+        self.assertEqual(self.client.command(b"bogus"), b"ERROR\r\n")
+
+        stats = get_server_stats(self.server.location)
+        self.assertEqual(stats["cmd_set"], 3)
+        self.assertEqual(stats["curr_items"], 1)
+
+    def test_injected_errors_and_evictions(self):
+        self.client.command(b"set a 0 0 1", b"1")
+        self.server.error_rate = 1
+        self.assertEqual(
+            self.client.command(b"get a"), b"SERVER_ERROR injected error\r\n"
+        )
+        self.server.error_rate = 0
+
+        self.server.eviction_rate = 1
+        self.assertEqual(self.client.command(b"get a"), b"END\r\n")
+        self.server.eviction_rate = 0
+        self.assertEqual(self.client.command(b"get a"), b"END\r\n")
+
+        stats = get_server_stats(self.server.location)
+        self.assertEqual(stats["injected_errors"], 1)
+        self.assertEqual(stats["injected_evictions"], 1)
+
+        self.server.latency = 0.05
+        start = time.perf_counter()
+        self.client.command(b"get a")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_run_load_test_in_process(self):
+        config = LoadTestConfig(
+            threads=4, calls=50, key_count=10, compute_seconds=0, seed=1
+        )
+        report = run_load_test(config)
+
+        self.assertEqual(report.calls, 200)
+        self.assertGreaterEqual(len(report.computations), 1)
+        self.assertLessEqual(len(report.computations), 10)
+        self.assertEqual(
+            report.duplicate_computations,
+            sum(report.computations.values()) - len(report.computations),
+        )
+        self.assertEqual(report.errors, {})
+        self.assertLessEqual(report.get_percentile(50), report.get_percentile(99))
+        self.assertIn("p99.9", report.as_dict()["latency"])
+        self.assertIn("Calls:        200", report.format())
+
+        # Every load test starts with a cold cache
+        self.assertGreaterEqual(len(run_load_test(config).computations), 1)
+
+    def test_run_load_test_in_worker_process(self):
+        report = run_load_test(
+            LoadTestConfig(
+                backend="django.core.cache.backends.locmem.LocMemCache",
+                processes=1,
+                threads=2,
+                calls=20,
+                key_count=5,
+                compute_seconds=0,
+                seed=1,
+            )
+        )
+
+        self.assertEqual(report.calls, 40)
+        self.assertGreaterEqual(len(report.computations), 1)
+        self.assertEqual(report.errors, {})
+        self.assertEqual(report.server_stats, {})
+
+    @skipUnless(importlib.util.find_spec("pymemcache"), "pymemcache is not installed")
+    def test_run_load_test_against_server(self):
+        self.server.error_rate = 0.2
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+                "LOCATION": self.server.location,
+            }
+        }
+        with override_settings(CACHES=caches):
+            report = run_load_test(
+                LoadTestConfig(
+                    location=self.server.location,
+                    threads=4,
+                    calls=50,
+                    key_count=10,
+                    compute_seconds=0,
+                )
+            )
+
+        self.assertEqual(report.calls, 200)
+        self.assertGreater(report.server_stats["injected_errors"], 0)
+        self.assertGreater(sum(report.warnings.values()), 0)
+
+
+SHARDED_RESULT_COMPUTATIONS = []
+
+
+@cached(60 * 60)
+def get_sharded_result(value):
+    SHARDED_RESULT_COMPUTATIONS.append(value)
+    return value, len(SHARDED_RESULT_COMPUTATIONS)
+
+
+SHARDED_CACHES = {
+    "default": {
+        "BACKEND": "cache_helper.backends.ShardedLocMemCache",
+        "LOCATION": "sharded-tests",
+        "OPTIONS": {"SHARDS": 4, "STORE_IMMUTABLE_VALUES": True},
+    }
+}
+
+
+class ShardedLocMemCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sharded_cache = self.get_sharded_cache()
+
+    def tearDown(self):
+        super().tearDown()
+        self.sharded_cache.clear()
+
+    @staticmethod
+    def get_sharded_cache(**options):
+        return ShardedLocMemCache(
+            "sharded-tests", {"OPTIONS": {"SHARDS": 4, **options}}
+        )
+
+    def test_get_set_add_delete(self):
+        self.assertIsNone(self.sharded_cache.get("a"))
+        self.assertEqual(self.sharded_cache.get("a", "default"), "default")
+        self.sharded_cache.set("a", {"b": 1})
+        self.assertEqual(self.sharded_cache.get("a"), {"b": 1})
+        self.assertTrue(self.sharded_cache.has_key("a"))
+
+        self.assertFalse(self.sharded_cache.add("a", 2))
+        self.assertTrue(self.sharded_cache.add("c", 2))
+        self.assertEqual(self.sharded_cache.get("c"), 2)
+
+        self.assertTrue(self.sharded_cache.delete("a"))
+        self.assertFalse(self.sharded_cache.delete("a"))
+        self.assertIsNone(self.sharded_cache.get("a"))
+
+    def test_many(self):
+        keys = [f"key-{index}" for index in range(20)]
+        self.assertEqual(
+            self.sharded_cache.set_many({key: key.upper() for key in keys}), []
+        )
+        self.assertEqual(
+            self.sharded_cache.get_many(keys + ["missing"]),
+            {key: key.upper() for key in keys},
+        )
+
+        self.sharded_cache.delete_many(keys[:10])
+        self.assertEqual(list(self.sharded_cache.get_many(keys)), keys[10:])
+
+        self.sharded_cache.clear()
+        self.assertEqual(self.sharded_cache.get_many(keys), {})
+
+    def test_expiry_and_touch(self):
+        self.sharded_cache.set("a", 1, 60)
+        self.sharded_cache.set("b", 1, None)
+        with patch("cache_helper.backends.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.sharded_cache.get("a"))
+            self.assertEqual(self.sharded_cache.get("b"), 1)
+
+        self.sharded_cache.set("a", 1, 60)
+        self.assertTrue(self.sharded_cache.touch("a", 120))
+        self.assertFalse(self.sharded_cache.touch("missing", 120))
+        with patch("cache_helper.backends.time.time", return_value=time.time() + 61):
+            self.assertEqual(self.sharded_cache.get("a"), 1)
+
+    def test_incr(self):
+        self.sharded_cache.set("a", 1)
+        self.assertEqual(self.sharded_cache.incr("a"), 2)
+        self.assertEqual(self.sharded_cache.incr("a", 10), 12)
+        self.assertEqual(self.sharded_cache.get("a"), 12)
+        with self.assertRaises(ValueError):
+            self.sharded_cache.incr("missing")
+
+    def test_shared_across_instances(self):
+        self.sharded_cache.set("a", 1)
+        self.assertEqual(self.get_sharded_cache().get("a"), 1)
+        self.assertIsNone(ShardedLocMemCache("other-sharded-tests", {}).get("a"))
+
+    def test_instances_with_other_options_get_their_own_shards(self):
+        self.sharded_cache.set("a", 1)
+        for options in ({"SHARDS": 2}, {"MAX_ENTRIES": 10}, {"EVICTION_SAMPLES": 2}):
+            other_cache = self.get_sharded_cache(**options)
+            self.assertIsNone(other_cache.get("a"))
+            other_cache.clear()
+        self.assertEqual(len(self.get_sharded_cache(SHARDS=2)._shards), 2)
+        self.assertEqual(self.get_sharded_cache().get("a"), 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        sharded_cache = ShardedLocMemCache(
+            "evicted-sharded-tests",
+            {"OPTIONS": {"MAX_ENTRIES": 3, "SHARDS": 1, "EVICTION_SAMPLES": 100}},
+        )
+        sharded_cache.set("a", 1)
+        sharded_cache.set("b", 2)
+        sharded_cache.set("c", 3)
+        # Reading "a" makes "b" the least recently used entry
+        sharded_cache.get("a")
+        sharded_cache.set("d", 4)
+
+        self.assertEqual(
+            sharded_cache.get_many(["a", "b", "c", "d"]), {"a": 1, "c": 3, "d": 4}
+        )
+        sharded_cache.clear()
+
+    def test_expired_entries_are_evicted_first(self):
+        sharded_cache = ShardedLocMemCache(
+            "expired-sharded-tests",
+            {"OPTIONS": {"MAX_ENTRIES": 2, "SHARDS": 1, "EVICTION_SAMPLES": 100}},
+        )
+        sharded_cache.set("a", 1, None)
+        sharded_cache.set("b", 2, 60)
+        with patch("cache_helper.backends.time.time", return_value=time.time() + 61):
+            sharded_cache.set("c", 3)
+            self.assertEqual(sharded_cache.get_many(["a", "b", "c"]), {"a": 1, "c": 3})
+        sharded_cache.clear()
+
+    def test_is_immutable(self):
+        self.assertTrue(is_immutable(None))
+        self.assertTrue(is_immutable((1, "a", b"b", 1.5, frozenset((True,)), (None,))))
+        self.assertFalse(is_immutable([1]))
+        self.assertFalse(is_immutable((1, [2])))
+        self.assertFalse(is_immutable(HTTPStatus.OK))
+
+    def test_store_immutable_values(self):
+        value = ("a", 1)
+        self.sharded_cache.set("a", value)
+        # Pickled by default
+        self.assertIsNot(self.sharded_cache.get("a"), value)
+
+        sharded_cache = self.get_sharded_cache(STORE_IMMUTABLE_VALUES=True)
+        sharded_cache.set("a", value)
+        self.assertIs(sharded_cache.get("a"), value)
+        self.assertIs(sharded_cache.get_many(["a"])["a"], value)
+
+        # Mutable values are still pickled, so that changing them doesn't change the cache
+        mutable_value = {"b": [1]}
+        sharded_cache.set("b", mutable_value)
+        mutable_value["b"].append(2)
+        sharded_cache.get("b")["b"].append(3)
+        self.assertEqual(sharded_cache.get("b"), {"b": [1]})
+
+    @override_settings(CACHES=SHARDED_CACHES)
+    def test_decorator(self):
+        self.addCleanup(cache.clear)
+        self.assertEqual(get_sharded_result(1), (1, 1))
+        self.assertEqual(get_sharded_result(1), (1, 1))
+        self.assertEqual(get_sharded_result(2), (2, 2))
+
+        cache_key_hashed, _ = get_sharded_result.get_cache_keys(1)
+        self.assertEqual(cache.get(cache_key_hashed), (1, 1))
+
+        get_sharded_result.invalidate(1)
+        self.assertIsNone(cache.get(cache_key_hashed))
+        self.assertEqual(get_sharded_result(1), (1, 3))
+
+
+MIGRATED_RESULT_COMPUTATIONS = []
+
+
+@cached(
+    60 * 60,
+    key_name="test_project.migrated_result",
+    legacy_key_names=["test_project.tests.get_original_result"],
+)
+def get_migrated_result(value):
+    MIGRATED_RESULT_COMPUTATIONS.append(value)
+    return value, len(MIGRATED_RESULT_COMPUTATIONS)
+
+
+def get_original_cache_key(value, key_format_version=1):
+    return utils.get_hashed_cache_key(
+        utils.get_function_cache_key(
+            "test_project.tests.get_original_result", (value,), {}, key_format_version
+        )
+    )
+
+
+class KeyMigrationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_key_name(self):
+        _, cache_key_string = get_migrated_result.get_cache_keys(1)
+        self.assertEqual(cache_key_string, "test_project.migrated_result;1,;")
+
+    def test_key_format_versions(self):
+        self.assertEqual(
+            utils.get_function_cache_key("f", (1, "a"), {"b": [2]}), "f;a,1,;,,2,b,"
+        )
+
+        def get_key(*args):
+            return utils.get_function_cache_key("f", args, {}, key_format_version=2)
+
+        self.assertEqual(get_key(1, "a"), "f:v2;a,int:1,;")
+        # Arguments that share a key in version 1 get different keys in version 2
+        self.assertNotEqual(get_key(1), get_key("1"))
+        self.assertNotEqual(get_key(None), get_key("None"))
+        self.assertNotEqual(get_key(1), get_key("int:1"))
+        self.assertNotEqual(get_key("a,b"), get_key("b", "a"))
+        self.assertNotEqual(get_key(2, [1]), get_key([2, 1]))
+        self.assertNotEqual(get_key(b"x"), get_key([120]))
+
+        with self.assertRaises(CacheKeyCreationError):
+            utils.get_function_cache_key("f", (), {}, key_format_version=3)
+
+    def test_legacy_key_name_is_copied_forward(self):
+        cache.set(get_original_cache_key(1), ("legacy", 0))
+        computations = len(MIGRATED_RESULT_COMPUTATIONS)
+
+        self.assertEqual(get_migrated_result(1), ("legacy", 0))
+        self.assertEqual(len(MIGRATED_RESULT_COMPUTATIONS), computations)
+        cache_key_hashed, _ = get_migrated_result.get_cache_keys(1)
+        self.assertEqual(cache.get(cache_key_hashed), ("legacy", 0))
+        self.assertEqual(
+            get_function_stats("test_project.tests.get_migrated_result").counters[
+                "migrated_keys"
+            ],
+            1,
+        )
+
+        # Keys missing everywhere are computed
+        self.assertEqual(get_migrated_result(2), (2, computations + 1))
+
+    def test_value_saved_meanwhile_is_kept(self):
+        cache.set(get_original_cache_key(1), ("legacy", 0))
+        cache_key_hashed, _ = get_migrated_result.get_cache_keys(1)
+        # Another process saves a value after this one missed
+        cache.set(cache_key_hashed, ("new", 0))
+        with patch(
+            "cache_helper.decorators._CachedFunction.get_cached_value",
+            side_effect=lambda cache_key_hashed, cache_key_string, default: (
+                default,
+                None,
+            ),
+        ):
+            self.assertEqual(get_migrated_result(1), ("legacy", 0))
+
+        self.assertEqual(cache.get(cache_key_hashed), ("new", 0))
+
+    def test_legacy_key_format_version_is_copied_forward(self):
+        get_migrated_result(1)
+        computations = len(MIGRATED_RESULT_COMPUTATIONS)
+
+        with patch("cache_helper.settings.KEY_FORMAT_VERSION", 2):
+            # Without dual reads, every key is new
+            cache_key_hashed, cache_key_string = get_migrated_result.get_cache_keys(1)
+            self.assertEqual(
+                cache_key_string, "test_project.migrated_result:v2;int:1,;"
+            )
+            self.assertIsNone(cache.get(cache_key_hashed))
+
+            with patch("cache_helper.settings.LEGACY_KEY_FORMAT_VERSIONS", (1,)):
+                self.assertEqual(get_migrated_result(1), (1, computations))
+                self.assertEqual(cache.get(cache_key_hashed), (1, computations))
+        self.assertEqual(len(MIGRATED_RESULT_COMPUTATIONS), computations)
+
+    def test_invalidate_deletes_legacy_keys(self):
+        cache.set(get_original_cache_key(1), ("legacy", 0))
+        cache.set(get_original_cache_key(1, key_format_version=2), ("legacy", 0))
+        get_migrated_result(1)
+
+        with patch("cache_helper.settings.LEGACY_KEY_FORMAT_VERSIONS", (2,)):
+            get_migrated_result.invalidate(1)
+        self.assertIsNone(cache.get(get_original_cache_key(1)))
+        self.assertIsNone(cache.get(get_original_cache_key(1, key_format_version=2)))
+        self.assertEqual(get_migrated_result(1)[0], 1)
+
+
+DEPENDENCY_PRICES = {}
+
+
+@cached(60 * 60)
+def get_dependency_price(symbol):
+    return DEPENDENCY_PRICES[symbol]
+
+
+@cached(60 * 60)
+def get_dependency_total(symbols):
+    return sum(get_dependency_price(symbol) for symbol in symbols)
+
+
+@cached(60 * 60)
+def get_dependency_report(symbols):
+    return f"Total: {get_dependency_total(symbols)}"
+
+
+@patch("cache_helper.settings.TRACK_DEPENDENCIES", True)
+class DependencyTrackingTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        DEPENDENCY_PRICES.update({"A": 1, "B": 2, "C": 3})
+
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_invalidate_cascades_to_dependents(self):
+        self.assertEqual(get_dependency_report(("A", "B")), "Total: 3")
+        self.assertEqual(get_dependency_report(("B", "C")), "Total: 5")
+
+        DEPENDENCY_PRICES["A"] = 10
+        get_dependency_price.invalidate("A")
+        self.assertEqual(get_dependency_report(("A", "B")), "Total: 12")
+        # Results that didn't depend on the invalidated one are kept
+        DEPENDENCY_PRICES["C"] = 30
+        self.assertEqual(get_dependency_report(("B", "C")), "Total: 5")
+
+    def test_only_direct_dependencies_are_recorded(self):
+        get_dependency_report(("A",))
+
+        price_key, _ = get_dependency_price.get_cache_keys("A")
+        total_key, _ = get_dependency_total.get_cache_keys(("A",))
+        report_key, _ = get_dependency_report.get_cache_keys(("A",))
+        self.assertEqual(list(cache.get(get_dependents_key(price_key))), [total_key])
+        self.assertEqual(list(cache.get(get_dependents_key(total_key))), [report_key])
+        self.assertIsNone(cache.get(get_dependents_key(report_key)))
+
+    def test_hits_are_dependencies(self):
+        get_dependency_price("A")
+        get_dependency_total(("A",))
+
+        DEPENDENCY_PRICES["A"] = 10
+        get_dependency_price.invalidate("A")
+        self.assertEqual(get_dependency_total(("A",)), 10)
+
+    def test_dependencies_are_saved_in_one_batch(self):
+        with patch(
+            "cache_helper.dependencies.cache", wraps=cache
+        ) as dependencies_cache:
+            get_dependency_total(("A", "B", "C"))
+
+        dependencies_cache.get_many.assert_called_once()
+        dependencies_cache.set_many.assert_called_once()
+        self.assertEqual(len(dependencies_cache.set_many.call_args[0][0]), 3)
+
+    def test_refresh_invalidates_dependents(self):
+        get_dependency_total(("A", "B"))
+
+        DEPENDENCY_PRICES["A"] = 10
+        self.assertEqual(get_dependency_price.refresh("A"), 10)
+        self.assertEqual(get_dependency_total(("A", "B")), 12)
+
+    def test_disabled_by_default(self):
+        with patch("cache_helper.settings.TRACK_DEPENDENCIES", False):
+            get_dependency_total(("A", "B"))
+
+            DEPENDENCY_PRICES["A"] = 10
+            get_dependency_price.invalidate("A")
+            self.assertEqual(get_dependency_total(("A", "B")), 3)
+
+        price_key, _ = get_dependency_price.get_cache_keys("A")
+        self.assertIsNone(cache.get(get_dependents_key(price_key)))
+
+
+SELECTED_ARGS_COMPUTATIONS = []
+
+
+class UnprintableRequest:
+    def __str__(self):
+        raise AssertionError(
+            "Arguments left out of the key must not be turned into strings"
+        )
+
+
+@cached(60 * 60, ignore_args=["request", "logger"])
+def get_ignored_args_result(company_id, request=None, logger=None):
+    SELECTED_ARGS_COMPUTATIONS.append(company_id)
+    return company_id, len(SELECTED_ARGS_COMPUTATIONS)
+
+
+@cached(60 * 60, key_args="company_id")
+def get_key_args_result(config, company_id, *args, **kwargs):
+    SELECTED_ARGS_COMPUTATIONS.append(company_id)
+    return company_id, len(SELECTED_ARGS_COMPUTATIONS)
+
+
+@cached(60 * 60, key=lambda arguments: ",".join(sorted(arguments["symbols"])))
+def get_key_function_result(symbols, request=None):
+    SELECTED_ARGS_COMPUTATIONS.append(symbols)
+    return len(SELECTED_ARGS_COMPUTATIONS)
+
+
+class SelectedArgsQueries:
+    @classmethod
+    @cached_class_method(60 * 60, ignore_args=["request"])
+    def get_class_result(cls, company_id, request):
+        SELECTED_ARGS_COMPUTATIONS.append(company_id)
+        return company_id, len(SELECTED_ARGS_COMPUTATIONS)
+
+
+class KeyArgumentSelectionTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_ignore_args(self):
+        result = get_ignored_args_result(
+            1, UnprintableRequest(), logger=logging.getLogger(__name__)
+        )
+        self.assertEqual(get_ignored_args_result(1), result)
+        self.assertNotEqual(get_ignored_args_result(2, UnprintableRequest()), result)
+        _, cache_key_string = get_ignored_args_result.get_cache_keys(1)
+        self.assertEqual(
+            cache_key_string,
+            "test_project.tests.get_ignored_args_result;;,1,company_id,",
+        )
+
+        get_ignored_args_result.invalidate(1, request=UnprintableRequest())
+        self.assertNotEqual(get_ignored_args_result(1), result)
+
+    def test_key_args(self):
+        result = get_key_args_result(
+            {"a": UnprintableRequest()}, 1, UnprintableRequest(), b=UnprintableRequest()
+        )
+        self.assertEqual(get_key_args_result(None, 1), result)
+        self.assertEqual(get_key_args_result(None, company_id=1), result)
+
+        # Arguments left out of the key can be left out when invalidating, even without a default
+        get_key_args_result.invalidate(company_id=1)
+        self.assertNotEqual(get_key_args_result(None, 1), result)
+        with self.assertRaises(TypeError):
+            get_key_args_result.invalidate(config=None)
+
+    def test_key_function(self):
+        with patch(
+            "cache_helper.utils.build_cache_key_using_dfs"
+        ) as build_cache_key_using_dfs:
+            result = get_key_function_result(["B", "A"], UnprintableRequest())
+            self.assertEqual(get_key_function_result(("A", "B")), result)
+            build_cache_key_using_dfs.assert_not_called()
+        self.assertEqual(
+            get_key_function_result.get_cache_keys(["A", "B"])[1],
+            "test_project.tests.get_key_function_result;key=A,B",
+        )
+
+        get_key_function_result.invalidate({"A", "B"})
+        self.assertNotEqual(get_key_function_result(["A", "B"]), result)
+
+    def test_class_method(self):
+        result = SelectedArgsQueries.get_class_result(1, UnprintableRequest())
+        self.assertEqual(SelectedArgsQueries.get_class_result(1, None), result)
+
+        SelectedArgsQueries.get_class_result.invalidate(1, UnprintableRequest())
+        self.assertNotEqual(SelectedArgsQueries.get_class_result(1, None), result)
+
+    def test_invalid_options(self):
+        def func(a, b):
+            pass
+
+        with self.assertRaises(ValueError):
+            cached(60, key_args=["a"], ignore_args=["b"])(func)
+        with self.assertRaises(ValueError):
+            cached(60, ignore_args=["b"], key=lambda arguments: arguments["a"])(func)
+        with self.assertRaises(ValueError):
+            cached(60, ignore_args=["c"])(func)
+
+
+SHARD_ALIASES = ["shard_a", "shard_b", "shard_c"]
+
+SHARDED_ALIAS_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "default",
+    },
+    **{
+        alias: {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": alias,
+        }
+        for alias in SHARD_ALIASES
+    },
+}
+
+SHARDED_ALIAS_COMPUTATIONS = []
+
+
+@cached(60 * 60, shards=SHARD_ALIASES)
+def get_shard_result(value):
+    SHARDED_ALIAS_COMPUTATIONS.append(value)
+    return value, len(SHARDED_ALIAS_COMPUTATIONS)
+
+
+@cached(60 * 60, shards=SHARD_ALIASES)
+def get_shard_total(values):
+    return sum(get_shard_result(value)[0] for value in values)
+
+
+@cached(60 * 60, shards=SHARD_ALIASES, disk=True)
+def get_sharded_result_on_disk(value):
+    SHARDED_ALIAS_COMPUTATIONS.append(value)
+    return value, len(SHARDED_ALIAS_COMPUTATIONS)
+
+
+@override_settings(CACHES=SHARDED_ALIAS_CACHES)
+class ShardingTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        for alias in SHARDED_ALIAS_CACHES:
+            caches[alias].clear()
+
+    def test_keys_are_spread_evenly(self):
+        ring = HashRing(SHARD_ALIASES)
+        keys = [utils.get_hashed_cache_key(str(index)) for index in range(3000)]
+        keys_by_alias = ring.group_by_alias(keys)
+
+        self.assertEqual(sorted(keys_by_alias), SHARD_ALIASES)
+        for alias_keys in keys_by_alias.values():
+            self.assertGreater(len(alias_keys), 800)
+        self.assertEqual(ring.get_alias(keys[0]), ring.get_alias(keys[0]))
+
+    def test_keys_can_be_routed_with_another_key(self):
+        ring = HashRing(SHARD_ALIASES)
+        keys = [utils.get_hashed_cache_key(str(index)) for index in range(100)]
+        keys_by_alias = ring.group_by_alias(
+            [get_marker_key(key) for key in keys], get_marked_key
+        )
+
+        for alias, alias_keys in keys_by_alias.items():
+            for marker_key in alias_keys:
+                self.assertEqual(ring.get_alias(get_marked_key(marker_key)), alias)
+
+    def test_adding_a_shard_remaps_few_keys(self):
+        ring = HashRing(SHARD_ALIASES)
+        larger_ring = HashRing([*SHARD_ALIASES, "shard_d"])
+        keys = [utils.get_hashed_cache_key(str(index)) for index in range(3000)]
+
+        moved_keys = [
+            key for key in keys if ring.get_alias(key) != larger_ring.get_alias(key)
+        ]
+        # About a quarter of the keys move, and only to the new shard
+        self.assertLess(len(moved_keys), 3000 * 0.35)
+        self.assertEqual(
+            {larger_ring.get_alias(key) for key in moved_keys}, {"shard_d"}
+        )
+
+    def test_decorator_spreads_keys(self):
+        results = {value: get_shard_result(value) for value in range(30)}
+        self.assertEqual(
+            {value: get_shard_result(value) for value in range(30)}, results
+        )
+
+        used_aliases = set()
+        for value in range(30):
+            cache_key_hashed, _ = get_shard_result.get_cache_keys(value)
+            alias = get_shard_result.cached_function.get_cache_alias(cache_key_hashed)
+            used_aliases.add(alias)
+            self.assertEqual(caches[alias].get(cache_key_hashed), results[value])
+            self.assertIsNone(cache.get(cache_key_hashed))
+        self.assertEqual(used_aliases, set(SHARD_ALIASES))
+
+        get_shard_result.invalidate(1)
+        self.assertNotEqual(get_shard_result(1), results[1])
+        self.assertEqual(get_shard_result(2), results[2])
+
+    def test_prefetch_groups_keys_by_shard(self):
+        for value in range(30):
+            get_shard_result(value)
+
+        with contextlib.ExitStack() as stack:
+            get_manys = {
+                alias: stack.enter_context(
+                    patch.object(
+                        caches[alias], "get_many", wraps=caches[alias].get_many
+                    )
+                )
+                for alias in SHARDED_ALIAS_CACHES
+            }
+            with prefetch() as batch:
+                for value in range(30):
+                    batch.add(get_shard_result, value)
+                batch.fetch()
+
+        for alias in SHARD_ALIASES:
+            get_manys[alias].assert_called_once()
+        get_manys["default"].assert_not_called()
+
+    @patch("cache_helper.settings.TRACK_DEPENDENCIES", True)
+    def test_dependents_are_invalidated_on_their_shard(self):
+        get_shard_total((1, 2))
+        cache_key_hashed, _ = get_shard_total.get_cache_keys((1, 2))
+        shard = get_shard_total.cached_function.get_cache(cache_key_hashed)
+        self.assertEqual(shard.get(cache_key_hashed), 3)
+
+        get_shard_result.invalidate(2)
+        self.assertIsNone(shard.get(cache_key_hashed))
+
+    def test_disk_markers_are_invalidated_on_the_shard_of_their_entry(self):
+        cached_function = get_sharded_result_on_disk.cached_function
+        ring = HashRing(SHARD_ALIASES)
+        # A value whose marker key would belong to another shard than its entry if it was routed by its own hash
+        cache_keys = {
+            value: get_sharded_result_on_disk.get_cache_keys(value)[0]
+            for value in range(100)
+        }
+        value, cache_key_hashed = next(
+            (value, cache_key_hashed)
+            for value, cache_key_hashed in cache_keys.items()
+            if ring.get_alias(get_marker_key(cache_key_hashed))
+            != ring.get_alias(cache_key_hashed)
+        )
+        marker_key = get_marker_key(cache_key_hashed)
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch(
+            "cache_helper.settings.DISK",
+            {"PATH": os.path.join(temp_dir, "cache_helper.sqlite3")},
+        ), patch("cache_helper.disk._instance", None):
+            result = get_sharded_result_on_disk(value)
+            self.assertIsNotNone(
+                cached_function.get_cache(cache_key_hashed).get(marker_key)
+            )
+
+            # Another host only reaches the Django caches
+            cached_function.delete_many(
+                cached_function.get_invalidation_keys((value,), {})
+            )
+            self.assertIsNone(
+                cached_function.get_cache(cache_key_hashed).get(marker_key)
+            )
+            self.assertNotEqual(get_sharded_result_on_disk(value), result)
+
+
+REPLICATED_COMPUTATIONS = []
+
+
+@cached(60 * 60, replicas=3)
+def get_replicated_result(value):
+    REPLICATED_COMPUTATIONS.append(value)
+    return value, len(REPLICATED_COMPUTATIONS)
+
+
+@cached(60 * 60, replicas=3, shards=SHARD_ALIASES)
+def get_sharded_replicated_result(value):
+    return value
+
+
+@cached(60 * 60, replicas=3, sliding=True)
+def get_sliding_replicated_result(value):
+    return value
+
+
+@cached(
+    60 * 60,
+    replicas=3,
+    key_name="test_project.migrated_replicated_result",
+    legacy_key_names=["test_project.tests.get_original_result"],
+)
+def get_migrated_replicated_result(value):
+    return value
+
+
+class ReplicaTests(TestCase):
+    def tearDown(self):
+        super().tearDown()
+        cache.clear()
+
+    def test_writes_every_replica_at_once(self):
+        with patch(
+            "django.core.cache.cache.set_many", wraps=cache.set_many
+        ) as set_many:
+            result = get_replicated_result(1)
+        set_many.assert_called_once()
+
+        cache_key_hashed, _ = get_replicated_result.get_cache_keys(1)
+        entry_keys = get_replicated_result.cached_function.get_entry_keys(
+            cache_key_hashed
+        )
+        self.assertEqual(len(set(entry_keys)), 3)
+        self.assertEqual(cache.get_many(entry_keys), dict.fromkeys(entry_keys, result))
+        self.assertIsNone(cache.get(cache_key_hashed))
+
+    def test_reads_spread_across_replicas(self):
+        cache_key_hashed, _ = get_replicated_result.get_cache_keys(1)
+        cached_function = get_replicated_result.cached_function
+        read_keys = {
+            cached_function.get_replica_key(cache_key_hashed) for _ in range(100)
+        }
+        self.assertEqual(
+            read_keys, set(cached_function.get_entry_keys(cache_key_hashed))
+        )
+
+    def test_reads_fall_back_to_other_replicas(self):
+        result = get_replicated_result(2)
+        cache_key_hashed, _ = get_replicated_result.get_cache_keys(2)
+        cache.delete_many(
+            get_replicated_result.cached_function.get_entry_keys(cache_key_hashed)[:2]
+        )
+
+        for _ in range(10):
+            self.assertEqual(get_replicated_result(2), result)
+
+    def test_invalidate_deletes_every_replica_at_once(self):
+        result = get_replicated_result(3)
+        cache_key_hashed, _ = get_replicated_result.get_cache_keys(3)
+
+        with patch(
+            "django.core.cache.cache.delete_many", wraps=cache.delete_many
+        ) as delete_many:
+            get_replicated_result.invalidate(3)
+        delete_many.assert_called_once()
+        self.assertEqual(
+            cache.get_many(
+                get_replicated_result.cached_function.get_entry_keys(cache_key_hashed)
+            ),
+            {},
+        )
+        self.assertNotEqual(get_replicated_result(3), result)
+
+    def test_prefetch_reads_a_replica(self):
+        result = get_replicated_result(4)
+        cache_key_hashed, _ = get_replicated_result.get_cache_keys(4)
+        entry_keys = get_replicated_result.cached_function.get_entry_keys(
+            cache_key_hashed
+        )
+
+        with prefetch() as batch:
+            batch.add(get_replicated_result, 4)
+            self.assertEqual(get_replicated_result(4), result)
+
+        # A missing replica isn't a miss, the call reads the others
+        cache.delete_many(entry_keys[:2])
+        for _ in range(10):
+            with prefetch() as batch:
+                batch.add(get_replicated_result, 4)
+                self.assertEqual(get_replicated_result(4), result)
+
+    def test_hits_touch_a_single_replica(self):
+        sliding._instance = None
+        get_sliding_replicated_result(1)
+        cache_key_hashed, _ = get_sliding_replicated_result.get_cache_keys(1)
+        entry_keys = get_sliding_replicated_result.cached_function.get_entry_keys(
+            cache_key_hashed
+        )
+
+        with patch("django.core.cache.cache.touch") as cache_touch:
+            get_sliding_replicated_result(1)
+        cache_touch.assert_called_once()
+        self.assertIn(cache_touch.call_args[0][0], entry_keys)
+
+    def test_legacy_values_are_copied_to_every_replica_at_once(self):
+        cache.set(get_original_cache_key(1), "legacy")
+        cache_key_hashed, _ = get_migrated_replicated_result.get_cache_keys(1)
+        entry_keys = get_migrated_replicated_result.cached_function.get_entry_keys(
+            cache_key_hashed
+        )
+
+        with patch("django.core.cache.cache.add", wraps=cache.add) as cache_add, patch(
+            "django.core.cache.cache.set_many", wraps=cache.set_many
+        ) as cache_set_many:
+            self.assertEqual(get_migrated_replicated_result(1), "legacy")
+        cache_add.assert_called_once()
+        cache_set_many.assert_called_once()
+        self.assertEqual(
+            cache.get_many(entry_keys), dict.fromkeys(entry_keys, "legacy")
+        )
+
+        # A value saved meanwhile is kept on every replica
+        cache.set_many(dict.fromkeys(entry_keys, "new"))
+        get_migrated_replicated_result.cached_function.migrate_legacy_value(
+            (1,), {}, cache_key_hashed, "", None
+        )
+        self.assertEqual(cache.get_many(entry_keys), dict.fromkeys(entry_keys, "new"))
+
+    @override_settings(CACHES=SHARDED_ALIAS_CACHES)
+    def test_replicas_are_spread_across_shards(self):
+        cached_function = get_sharded_replicated_result.cached_function
+        used_aliases = set()
+        for value in range(10):
+            self.assertEqual(get_sharded_replicated_result(value), value)
+            cache_key_hashed, _ = get_sharded_replicated_result.get_cache_keys(value)
+            for entry_key in cached_function.get_entry_keys(cache_key_hashed):
+                alias = cached_function.get_cache_alias(entry_key)
+                used_aliases.add(alias)
+                self.assertEqual(caches[alias].get(entry_key), value)
+        self.assertEqual(used_aliases, set(SHARD_ALIASES))
+
+        for alias in SHARD_ALIASES:
+            caches[alias].clear()